@@ -2,7 +2,7 @@
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from app.models.chat import ChatRequest, ChatResponse
-from app.services.langchain_service import LangChainService
+from app.services.langchain_service import LangChainService, get_langchain_service
 from app.services.user_log_service import user_log_service
 from app.models.user_log import LogSource, LogStatus
 from typing import AsyncGenerator
@@ -14,11 +14,11 @@ import time
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
-# 서비스 인스턴스 (실제로는 의존성 주입 사용 권장)
-langchain_service = LangChainService()
-
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    langchain_service: LangChainService = Depends(get_langchain_service)
+):
     """일반 채팅 엔드포인트"""
     start_time = time.time()
     log_id = None
@@ -69,7 +69,8 @@ async def chat(request: ChatRequest):
             vector_scores=vector_scores,
             model_used=result["metadata"].get("model"),
             tokens_used=result["metadata"].get("tokens_used"),
-            context=request.context
+            context=request.context,
+            stage_timings_ms=result["metadata"].get("timings_ms")
         )
         
         # 응답에 log_id 추가
@@ -106,39 +107,87 @@ async def chat(request: ChatRequest):
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    """Server-Sent Events 형식의 이벤트 한 건"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/stream")
-async def chat_stream(request: ChatRequest):
-    """스트리밍 채팅 엔드포인트"""
+async def chat_stream(
+    request: ChatRequest,
+    langchain_service: LangChainService = Depends(get_langchain_service)
+):
+    """스트리밍 채팅 엔드포인트
+    
+    이벤트 순서: session → retrieval(출처/점수) → token(답변 조각) → usage(답변 LLM 토큰) → done(최종 응답, TTFT/총 지연)
+    오류가 나면 error 이벤트로 종료합니다.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    user_id = request.context.get("user_id", "unknown") if request.context else "unknown"
+    platform_str = request.context.get("platform", "api") if request.context else "api"
+    platform = LogSource.DISCORD if platform_str == "discord" else LogSource.API
+    
     async def generate() -> AsyncGenerator[str, None]:
+        start_time = time.time()
+        sources = []
         try:
-            session_id = request.session_id or str(uuid.uuid4())
-            
-            # 초기 응답
-            yield f"data: {json.dumps({'session_id': session_id})}\n\n"
+            yield _sse("session", {"session_id": session_id})
             
-            # 스트리밍 응답
-            async for token in langchain_service.chat(
+            async for event in langchain_service.stream_chat(
                 message=request.message,
                 session_id=session_id,
-                context=request.context,
-                stream=True
+                context=request.context
             ):
-                yield f"data: {json.dumps({'chunk': token})}\n\n"
-            
-            # 완료 신호
-            yield f"data: {json.dumps({'done': True})}\n\n"
+                yield _sse(event["event"], event["data"])
+                
+                if event["event"] == "retrieval":
+                    sources = event["data"]["sources"]
+                elif event["event"] == "done":
+                    metadata = event["data"]["metadata"]
+                    await user_log_service.log_interaction(
+                        user_id=user_id,
+                        session_id=session_id,
+                        platform=platform,
+                        user_message=request.message,
+                        bot_response=event["data"]["response"],
+                        response_time_ms=int((time.time() - start_time) * 1000),
+                        status=LogStatus.SUCCESS,
+                        sources_used=[
+                            {"title": s.get("title"), "content_preview": s.get("preview", "")[:200], "score": s.get("relevance_score", 0.0)}
+                            for s in sources
+                        ],
+                        vector_scores=[s.get("relevance_score", 0.0) for s in sources],
+                        model_used=metadata.get("model"),
+                        tokens_used=metadata.get("tokens_used"),
+                        context=request.context,
+                        stage_timings_ms=metadata.get("timings_ms")
+                    )
             
         except Exception as e:
             logger.error(f"Stream error: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            await user_log_service.log_interaction(
+                user_id=user_id,
+                session_id=session_id,
+                platform=platform,
+                user_message=request.message,
+                bot_response=None,
+                response_time_ms=int((time.time() - start_time) * 1000),
+                status=LogStatus.ERROR,
+                error_message=str(e),
+                context=request.context
+            )
+            yield _sse("error", {"message": str(e)})
     
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.delete("/session/{session_id}")
-async def clear_session(session_id: str):
+async def clear_session(
+    session_id: str,
+    langchain_service: LangChainService = Depends(get_langchain_service)
+):
     """세션 메모리 초기화"""
     langchain_service.clear_memory(session_id)
     return {"message": "Session cleared"} 
\ No newline at end of file
@@ -1,8 +1,9 @@
 # app/api/documents.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
 from app.models.document import DocumentUploadResponse
 from app.services.document_processor import DocumentProcessor
-from app.services.langchain_service import LangChainService
+from app.services.langchain_service import LangChainService, get_langchain_service
+from app.services.ingestion_manifest import make_chunk_id
 import logging
 import os
 import uuid
@@ -11,12 +12,12 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 document_processor = DocumentProcessor()
-langchain_service = LangChainService()
 
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    langchain_service: LangChainService = Depends(get_langchain_service)
 ):
     """문서 업로드 및 처리"""
     try:
@@ -38,7 +39,7 @@ async def upload_document(
             buffer.write(content)
         
         # 백그라운드 작업으로 문서 처리
-        background_tasks.add_task(process_document_background, file_path, document_id)
+        background_tasks.add_task(process_document_background, langchain_service, file_path, document_id)
         
         return DocumentUploadResponse(
             document_id=document_id,
@@ -52,14 +53,19 @@ async def upload_document(
         logger.error(f"Document upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_document_background(file_path: str, document_id: str):
+async def process_document_background(langchain_service: LangChainService, file_path: str, document_id: str):
     """백그라운드에서 문서 처리"""
     try:
         # 문서 처리
         documents = await document_processor.process_pdf(file_path)
         
-        # 벡터 스토어에 추가
-        await langchain_service.add_documents(documents)
+        # 벡터 스토어에 추가 (결정적 ID로 재업로드 시 중복 방지)
+        file_key = f"pdf/{os.path.basename(file_path)}"
+        ids = [
+            make_chunk_id(file_key, doc.metadata.get("chunk_index", 0), doc.page_content)
+            for doc in documents
+        ]
+        await langchain_service.add_documents(documents, ids=ids)
         
         logger.info(f"Document {document_id} processed: {len(documents)} chunks")
         
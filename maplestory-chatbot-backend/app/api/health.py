@@ -1,5 +1,5 @@
 # app/api/health.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from app.config import settings
 import logging
 
@@ -16,13 +16,16 @@ async def health_check():
     }
 
 @router.get("/status")
-async def detailed_status():
+async def detailed_status(request: Request):
     """상세 상태 확인"""
+    # 서비스가 이미 초기화된 경우에만 캐시 통계 포함 (헬스체크가 초기화를 유발하지 않도록)
+    service = getattr(request.app.state, "langchain_service", None)
     return {
         "status": "healthy",
         "service": settings.app_name,
         "version": settings.app_version,
         "debug_mode": settings.debug_mode,
         "vector_store": settings.vector_store_type,
-        "model": settings.claude_model
+        "model": settings.claude_model,
+        "caches": service.cache_stats() if service is not None else None
     } 
\ No newline at end of file
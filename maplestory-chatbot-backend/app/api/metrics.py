@@ -0,0 +1,17 @@
+# app/api/metrics.py
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.utils.metrics import metrics_registry
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus 텍스트 노출 형식
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 스크랩용 메트릭"""
+    # 게이지 수집이 Redis/SQLite를 조회할 수 있으므로 스레드에서 생성
+    body = await asyncio.to_thread(metrics_registry.render)
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+import hashlib
+import threading
+import logging
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from app.chains.prompts import HISTORY_SUMMARY_PROMPT
+
+logger = logging.getLogger(__name__)
+
+# 메시지마다 붙는 역할/구분자 토큰 근사치
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "[이전 대화 요약]"
+SUMMARY_ACK = "네, 이전 대화 내용을 참고해 답변하겠습니다."
+
+def estimate_tokens(text: str) -> int:
+    """토큰 수 근사치 (한글 1글자 ≈ 1토큰, UTF-8 3바이트)"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+def _message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return estimate_tokens(content) + _MESSAGE_OVERHEAD_TOKENS
+
+def _format_conversation(messages: List[BaseMessage]) -> str:
+    """요약 프롬프트용 대화 텍스트"""
+    lines = []
+    for message in messages:
+        speaker = "사용자" if message.type == "human" else "도우미"
+        lines.append(f"{speaker}: {message.content}")
+    return "\n".join(lines)
+
+class CompactedHistory(NamedTuple):
+    messages: List[BaseMessage]
+    original_tokens: int
+    compacted_tokens: int
+    summarized_messages: int  # 요약(또는 생략)으로 대체된 메시지 수
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.compacted_tokens, 0)
+
+class HistoryCompactor:
+    """토큰 예산 기반 대화 기록 압축 - 최근 턴은 원문 유지, 오래된 턴은 누적 요약으로 대체
+
+    요약은 (앞부분 메시지 해시) 키로 캐시해 같은 구간을 다시 요약하지 않고,
+    새 구간이 밀려나면 직전 요약에 이어서(rolling) 요약합니다.
+    """
+
+    def __init__(self, llm=None, token_budget: int = 2000, keep_turns: int = 6, cache_size: int = 1000):
+        self.summary_chain = HISTORY_SUMMARY_PROMPT | llm | StrOutputParser() if llm is not None else None
+        self.token_budget = token_budget
+        self.max_messages = keep_turns * 2
+        self.cache_size = cache_size
+
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prefix_hashes(messages: List[BaseMessage]) -> List[str]:
+        """hashes[i] = messages[:i]의 누적 해시"""
+        hashes = [hashlib.sha1(b"").hexdigest()]
+        for message in messages:
+            digest = hashlib.sha1(hashes[-1].encode("utf-8"))
+            digest.update(f"\x00{message.type}\x00{message.content}".encode("utf-8"))
+            hashes.append(digest.hexdigest())
+        return hashes
+
+    def _get_summary(self, prefix_hash: str) -> Optional[str]:
+        with self._lock:
+            summary = self._summaries.get(prefix_hash)
+            if summary is not None:
+                self._summaries.move_to_end(prefix_hash)
+            return summary
+
+    def _put_summary(self, prefix_hash: str, summary: str) -> None:
+        with self._lock:
+            self._summaries[prefix_hash] = summary
+            self._summaries.move_to_end(prefix_hash)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def _summary_messages(self, summary: str) -> List[BaseMessage]:
+        """요약을 사용자/도우미 메시지 한 쌍으로 표현 (역할 교대 유지)"""
+        return [HumanMessage(content=f"{SUMMARY_PREFIX}\n{summary}"), AIMessage(content=SUMMARY_ACK)]
+
+    def _fits(self, tail_tokens: int, tail_count: int, summary: str) -> bool:
+        summary_tokens = sum(_message_tokens(m) for m in self._summary_messages(summary))
+        return tail_count <= self.max_messages and summary_tokens + tail_tokens <= self.token_budget
+
+    def _plan(self, messages: List[BaseMessage]) -> Tuple[Optional[CompactedHistory], int, int, List[str]]:
+        """압축 계획 - (캐시로 바로 만든 결과, 자를 위치, 이어서 요약할 시작 위치, 누적 해시)"""
+        token_counts = [_message_tokens(m) for m in messages]
+        original_tokens = sum(token_counts)
+        if original_tokens <= self.token_budget and len(messages) <= self.max_messages:
+            return CompactedHistory(list(messages), original_tokens, original_tokens, 0), 0, 0, []
+
+        # 턴 경계(사용자 메시지 위치)에서만 자름
+        boundaries = [i for i in range(1, len(messages)) if messages[i].type == "human"]
+        if not boundaries:
+            boundaries = [len(messages) - 1]
+        suffix_tokens = [0] * (len(messages) + 1)
+        for i in range(len(messages) - 1, -1, -1):
+            suffix_tokens[i] = suffix_tokens[i + 1] + token_counts[i]
+
+        hashes = self._prefix_hashes(messages)
+
+        # 1. 캐시된 요약 중 예산에 맞는 가장 짧은 구간 재사용 (LLM 호출 없음)
+        for cut in boundaries:
+            summary = self._get_summary(hashes[cut])
+            if summary is not None and self._fits(suffix_tokens[cut], len(messages) - cut, summary):
+                compacted = self._summary_messages(summary) + list(messages[cut:])
+                return CompactedHistory(
+                    compacted, original_tokens, sum(_message_tokens(m) for m in compacted), cut
+                ), cut, cut, hashes
+
+        # 2. 새로 자를 위치 - 예산의 절반만 원문으로 남겨 다음 몇 턴은 캐시된 요약 재사용
+        tail_limit = max(self.max_messages // 2, 2)
+        cut = boundaries[-1]
+        for boundary in boundaries:
+            if suffix_tokens[boundary] <= self.token_budget // 2 and len(messages) - boundary <= tail_limit:
+                cut = boundary
+                break
+
+        # 이어서 요약할 직전 요약 구간
+        base = 0
+        for boundary in reversed(boundaries):
+            if boundary < cut and self._get_summary(hashes[boundary]) is not None:
+                base = boundary
+                break
+
+        return None, cut, base, hashes
+
+    def _finish(self, messages: List[BaseMessage], cut: int, summary: Optional[str]) -> CompactedHistory:
+        original_tokens = sum(_message_tokens(m) for m in messages)
+        compacted = (self._summary_messages(summary) if summary else []) + list(messages[cut:])
+        return CompactedHistory(compacted, original_tokens, sum(_message_tokens(m) for m in compacted), cut)
+
+    def _summary_inputs(self, messages: List[BaseMessage], cut: int, base: int, hashes: List[str]) -> dict:
+        return {
+            "summary": self._get_summary(hashes[base]) if base else "(없음)",
+            "conversation": _format_conversation(messages[base:cut]),
+        }
+
+    def compact(self, messages: List[BaseMessage]) -> CompactedHistory:
+        """대화 기록을 토큰 예산 안으로 압축"""
+        result, cut, base, hashes = self._plan(messages)
+        if result is not None:
+            return result
+
+        summary = None
+        if self.summary_chain is not None:
+            try:
+                summary = self.summary_chain.invoke(self._summary_inputs(messages, cut, base, hashes))
+                self._put_summary(hashes[cut], summary)
+            except Exception as e:
+                logger.warning(f"History summarization failed, dropping older turns: {e}")
+        return self._finish(messages, cut, summary)
+
+    async def acompact(self, messages: List[BaseMessage]) -> CompactedHistory:
+        """비동기 버전"""
+        result, cut, base, hashes = self._plan(messages)
+        if result is not None:
+            return result
+
+        summary = None
+        if self.summary_chain is not None:
+            try:
+                summary = await self.summary_chain.ainvoke(self._summary_inputs(messages, cut, base, hashes))
+                self._put_summary(hashes[cut], summary)
+            except Exception as e:
+                logger.warning(f"History summarization failed, dropping older turns: {e}")
+        return self._finish(messages, cut, summary)
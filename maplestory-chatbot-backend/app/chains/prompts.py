@@ -85,4 +85,18 @@ CONDENSE_PROMPT = PromptTemplate(
 
 독립적인 질문:""",
     input_variables=["chat_history", "question"]
-) 
\ No newline at end of file
+) 
+HISTORY_SUMMARY_PROMPT = PromptTemplate(
+    template="""다음은 메이플스토리 도우미와 사용자의 이전 대화 요약과 그 이후의 대화입니다.
+두 내용을 합쳐 이후 질문에 답할 때 필요한 정보만 남긴 짧은 요약을 작성하세요.
+사용자의 직업, 레벨, 서버, 관심 있는 보스/시스템 등 구체적인 정보는 반드시 유지하세요.
+
+이전 요약:
+{summary}
+
+이후 대화:
+{conversation}
+
+새 요약:""",
+    input_variables=["summary", "conversation"]
+)
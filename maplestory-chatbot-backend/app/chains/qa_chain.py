@@ -1,24 +1,21 @@
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
 from app.chains.prompts import MAPLESTORY_QA_PROMPT, CONDENSE_PROMPT, MAPLESTORY_SYSTEM_PROMPT
 from app.config.settings import settings
 
-def create_qa_chain(llm, retriever):
-    """메이플스토리 특화 QA 체인 생성 - 설정 기반 시스템 프롬프트 적용"""
-    
-    # 채팅 기록을 고려한 검색 프롬프트 생성
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+def _build_contextualize_prompt() -> ChatPromptTemplate:
+    """채팅 기록을 고려한 검색 질문 재작성 프롬프트"""
+    return ChatPromptTemplate.from_messages([
         ("system", "Given a chat history and the latest user question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, just reformulate it if needed and otherwise return it as is."),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
-    
-    # 기록을 고려한 리트리버 생성
-    history_aware_retriever = create_history_aware_retriever(
-        llm, retriever, contextualize_q_prompt
-    )
-    
+
+def _build_qa_prompt() -> ChatPromptTemplate:
+    """설정 기반 시스템 프롬프트가 적용된 QA 프롬프트"""
     # 설정에 따라 시스템 프롬프트 선택
     if settings.use_system_prompt:
         # 새로운 전문 시스템 프롬프트 사용
@@ -54,16 +51,35 @@ def create_qa_chain(llm, retriever):
 {context}"""
     
     # QA 프롬프트 생성
-    qa_prompt = ChatPromptTemplate.from_messages([
+    return ChatPromptTemplate.from_messages([
         ("system", system_message),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
+
+def create_condense_question_chain(llm):
+    """채팅 기록을 반영해 독립적인 검색 질문을 만드는 체인"""
+    return _build_contextualize_prompt() | llm | StrOutputParser()
+
+def create_qa_chain(llm, retriever=None):
+    """메이플스토리 특화 QA 체인 생성 - 설정 기반 시스템 프롬프트 적용
     
+    retriever가 없으면 검색 단계 없이 입력의 `context`로 전달된 문서를 그대로
+    stuff-documents 단계에 넣는 체인을 반환합니다. 출력 형식({"answer": ...})은 동일합니다.
+    """
     # 문서 결합 체인 생성
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    question_answer_chain = create_stuff_documents_chain(llm, _build_qa_prompt())
+    
+    # 검증된 문서를 직접 받는 모드 (검색은 호출자가 한 번만 수행)
+    if retriever is None:
+        return RunnablePassthrough.assign(answer=question_answer_chain)
+    
+    # 기록을 고려한 리트리버 생성
+    history_aware_retriever = create_history_aware_retriever(
+        llm, retriever, _build_contextualize_prompt()
+    )
     
     # 최종 RAG 체인 생성
     rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
     
-    return rag_chain 
\ No newline at end of file
+    return rag_chain 
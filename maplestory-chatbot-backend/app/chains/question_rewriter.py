@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import hashlib
+import re
+import threading
+import logging
+
+from langchain_core.messages import BaseMessage
+
+from app.chains.qa_chain import create_condense_question_chain
+from app.utils.embedding_cache import normalize_query
+from app.utils.relevance import extract_keywords
+
+logger = logging.getLogger(__name__)
+
+# 이전 대화를 가리키는 지시어/대명사/접속 표현 - 있으면 재작성 필요
+DEICTIC_PATTERN = re.compile(
+    r'(?:^|\s)(?:그|이|저)\s'                                  # 그 보스, 이 직업, 저 스킬
+    r'|그거|그것|그건|그게|그걸|이거|이것|이건|이게|이걸|저거|저것|저건'
+    r'|거기|여기|그럼|그러면|그래서|그리고|그중|그 중|아까|방금|위에서|앞에서|말한|말씀하신'
+    r'|나머지|다른\s*(?:건|거|것)|또\s|더\s*자세히|자세히|추가로|이어서|다음은|계속'
+)
+
+# 독립적인 질문으로 보기 위한 최소 조건
+_MIN_KEYWORDS = 2
+_MIN_LENGTH = 6
+
+def is_self_contained(question: str) -> bool:
+    """지시어가 없고 핵심 키워드가 충분한 질문은 대화 기록 없이도 이해 가능"""
+    normalized = normalize_query(question)
+    if len(normalized) < _MIN_LENGTH or DEICTIC_PATTERN.search(normalized):
+        return False
+    return len(extract_keywords(normalized)) >= _MIN_KEYWORDS
+
+class QuestionRewriter:
+    """대화 기록을 반영한 검색 질문 재작성 - 불필요한 LLM 호출 생략 + 결과 캐시"""
+
+    def __init__(self, llm, cache_size: int = 1000, enable_fast_path: bool = True):
+        self.condense_chain = create_condense_question_chain(llm)
+        self.cache_size = cache_size
+        self.enable_fast_path = enable_fast_path
+
+        self._rewrites: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 통계
+        self.skipped = 0
+        self.cache_hits = 0
+        self.rewritten = 0
+
+    @staticmethod
+    def _cache_key(question: str, chat_history: List[BaseMessage]) -> str:
+        """(대화 기록 해시, 정규화된 질문) 키"""
+        digest = hashlib.sha1()
+        for message in chat_history:
+            digest.update(f"{message.type}\x00{message.content}\x00".encode("utf-8"))
+        digest.update(normalize_query(question).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _fast_path(self, question: str, chat_history: List[BaseMessage]) -> Optional[str]:
+        """재작성 없이 원문 질문을 쓸 수 있으면 반환"""
+        if not chat_history or (self.enable_fast_path and is_self_contained(question)):
+            with self._lock:
+                self.skipped += 1
+            return question
+        return None
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            rewritten = self._rewrites.get(key)
+            if rewritten is not None:
+                self._rewrites.move_to_end(key)
+                self.cache_hits += 1
+            return rewritten
+
+    def _put(self, key: str, rewritten: str) -> None:
+        with self._lock:
+            self.rewritten += 1
+            self._rewrites[key] = rewritten
+            self._rewrites.move_to_end(key)
+            while len(self._rewrites) > self.cache_size:
+                self._rewrites.popitem(last=False)
+
+    async def arewrite(self, question: str, chat_history: List[BaseMessage]) -> str:
+        """독립적인 검색 질문 반환 (지시어 없는 질문은 그대로, 재작성 결과는 캐시)"""
+        fast = self._fast_path(question, chat_history)
+        if fast is not None:
+            return fast
+
+        key = self._cache_key(question, chat_history)
+        rewritten = self._get_cached(key)
+        if rewritten is None:
+            rewritten = await self.condense_chain.ainvoke({"input": question, "chat_history": chat_history})
+            self._put(key, rewritten)
+        return rewritten
+
+    def stats(self) -> Dict:
+        """재작성 통계 반환"""
+        with self._lock:
+            return {
+                "skipped": self.skipped,
+                "cache_hits": self.cache_hits,
+                "rewritten": self.rewritten,
+                "cached_entries": len(self._rewrites),
+            }
@@ -73,6 +73,20 @@ class MetadataConfig(BaseModel):
     # 서버 타입
     server_types: List[str] = ["리부트", "일반", "both"]
     
+    # 질문에서 서버 타입을 찾을 때 쓰는 표현 ("일반"은 흔한 단어라 서버를 명시한 경우만)
+    server_type_aliases: Dict[str, str] = {
+        "리부트": "리부트",
+        "리섭": "리부트",
+        "일반 서버": "일반",
+        "일반서버": "일반",
+        "일반섭": "일반",
+        "본섭": "일반"
+    }
+    
+    # Qdrant payload 색인을 만드는 메타데이터 필드
+    # (class/server_type은 질문에서 자동 추출한 필터, category는 search()의 filter로 명시한 경우에만 사용)
+    filter_fields: List[str] = ["category", "class", "server_type"]
+    
     # 난이도 레벨
     difficulty_levels: List[str] = ["beginner", "intermediate", "advanced"]
 
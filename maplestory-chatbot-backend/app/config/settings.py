@@ -26,9 +26,12 @@ class Settings(BaseSettings):
     strict_document_matching: bool = True  # 엄격한 문서 매칭 모드
     
     # 검색 최적화 설정
-    search_type: str = "similarity_score_threshold"  # similarity, mmr, similarity_score_threshold
+    search_type: str = "similarity_score_threshold"  # similarity, mmr, similarity_score_threshold, hybrid
     max_retrieval_docs: int = 5  # 검색할 최대 문서 수 (8 -> 5로 줄임)
+    hybrid_fetch_multiplier: int = 4  # 하이브리드 검색 시 밀집/BM25 각각 k배수만큼 후보 확보
+    hybrid_rrf_k: int = 60  # Reciprocal Rank Fusion 상수
     enable_document_filtering: bool = True  # 문서 관련성 사전 필터링 활성화
+    enable_metadata_filtering: bool = True  # 질문의 직업/서버를 검색 필터로 사용 (맞는 문서가 없으면 필터 없이 검색)
     enable_response_validation: bool = True  # 답변 후처리 검증 활성화
     
     # FastAPI 설정
@@ -37,15 +40,26 @@ class Settings(BaseSettings):
     debug_mode: bool = False
     
     # Vector Store 설정
-    vector_store_type: str = "qdrant"  # qdrant, chroma, faiss
+    vector_store_type: str = "qdrant"  # qdrant, local, chroma, faiss
     qdrant_url: Optional[str] = "http://localhost:6333"
     qdrant_api_key: Optional[str] = None
     collection_name: str = "maplestory_docs"
+    qdrant_pool_size: int = 20  # AsyncQdrantClient 연결 풀 크기
+    qdrant_upsert_batch_size: int = 64  # 업서트 요청당 포인트 수
+    local_index_path: str = "./data/local_index"  # local 벡터 스토어의 .npy / payload 파일 위치
+    vector_quantization: str = "none"  # none, scalar (int8, 메모리 4배 절감), binary (1비트, 32배 절감) - qdrant/local 공통
+    quantization_oversampling: float = 3.0  # 양자화 검색 시 top-k의 몇 배 후보를 뽑아 원본 벡터로 재점수
     
     # 임베딩 설정 - Voyage AI 우선 사용
     embedding_provider: str = "auto"  # auto, voyage, openai, local
     embedding_model: str = "text-embedding-ada-002"  # OpenAI 모델
     voyage_model: str = "voyage-3.5-lite"  # Voyage AI 모델
+    voyage_output_dimension: Optional[int] = None  # Matryoshka 출력 차원 (256, 512, 1024, 2048 / None이면 모델 기본값)
+    voyage_output_dtype: str = "float"  # float, int8, binary (binary는 유사도 점수가 낮게 나오므로 MIN_RELEVANCE_SCORE 재조정 필요)
+    voyage_batch_max_texts: int = 128  # 배치당 최대 청크 수 (API 한도 1,000)
+    voyage_batch_max_tokens: int = 100000  # 배치당 최대 토큰 수 (추정치 기준, 모델별 API 한도보다 낮게)
+    voyage_embed_concurrency: int = 4  # 동시에 전송할 배치 수
+    voyage_embed_max_retries: int = 5  # 배치별 재시도 횟수 (지수 백오프)
     local_embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # 안정적인 다국어 모델 (420MB)
     # 대안 모델들 (문제 발생 시 사용):
     # "sentence-transformers/all-MiniLM-L6-v2"  # 초경량 (90MB) - 영어 중심
@@ -56,6 +70,36 @@ class Settings(BaseSettings):
     # 캐싱 설정
     redis_url: Optional[str] = "redis://localhost:6379"
     cache_ttl: int = 3600  # 1시간
+    cache_l1_max_entries: int = 10000  # 프로세스 내 L1 캐시 최대 항목 수 (LRU)
+    cache_l1_ttl: int = 60  # L1 최대 TTL (다른 워커의 변경이 이 시간 안에 반영)
+    cache_negative_ttl: int = 10  # Redis에 없는 키를 L1에 기억하는 시간
+    redis_max_connections: int = 50  # 비동기 Redis 커넥션 풀 크기
+    enable_query_embedding_cache: bool = True  # 질문 임베딩 캐시 (반복 질문 시 임베딩 API 호출 생략)
+    query_embedding_cache_max_bytes: int = 32 * 1024 * 1024  # 메모리 캐시 최대 크기 (32MB)
+    query_embedding_cache_ttl: int = 86400  # 24시간
+    query_embedding_cache_use_redis: bool = True  # Redis를 2차 캐시로 사용
+    enable_document_embedding_cache: bool = True  # 문서 청크 임베딩 영구 캐시 (재수집 시 변경된 청크만 임베딩)
+    document_embedding_cache_path: str = "./data/embedding_cache.sqlite3"
+    enable_semantic_cache: bool = True  # 의미 기반 답변 캐시 (유사한 질문은 Claude 호출 없이 응답)
+    semantic_cache_threshold: float = 0.95  # 캐시 적중으로 볼 최소 코사인 유사도
+    semantic_cache_max_entries: int = 2000  # 메모리에 보관할 최대 답변 수 (LRU)
+    semantic_cache_ttl: int = 86400  # 24시간
+    semantic_cache_use_redis: bool = True  # Redis에 저장해 재시작 후 복원
+    corpus_version_refresh_interval: float = 2.0  # 공유 코퍼스 버전 재조회 간격 (초)
+    enable_request_coalescing: bool = True  # 대화 기록 없는 동일 질문이 동시에 들어오면 한 번만 처리해 결과 공유
+    
+    # 대화 기록 설정
+    session_history_backend: str = "redis"  # memory, redis, sqlite (redis 연결 실패 시 memory)
+    session_history_max_turns: int = 20  # 세션당 보관할 최대 턴 수 (질문 + 답변)
+    session_history_ttl: int = 7 * 86400  # 마지막 대화 후 7일간 보관
+    session_history_max_sessions: int = 10000  # memory 저장소의 최대 세션 수 (LRU)
+    session_history_sqlite_path: str = "./data/chat_history.sqlite3"
+    history_token_budget: int = 2000  # 프롬프트에 넣을 대화 기록 최대 토큰 수
+    history_keep_turns: int = 6  # 원문 그대로 유지할 최근 턴 수
+    enable_history_summary: bool = True  # 예산을 넘는 오래된 턴은 요약으로 대체 (false면 잘라냄)
+    history_summary_cache_size: int = 1000  # 누적 요약 캐시 항목 수
+    enable_condense_fast_path: bool = True  # 지시어 없는 독립 질문은 검색 질문 재작성(LLM 호출) 생략
+    condense_cache_size: int = 1000  # (대화 기록, 질문)별 재작성 결과 캐시 항목 수
     
     # 보안 설정
     cors_origins: list = ["http://localhost:3000", "https://yourdomain.com"]
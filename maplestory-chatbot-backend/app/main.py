@@ -6,7 +6,10 @@ from contextlib import asynccontextmanager
 import logging
 import time
 from app.config import settings
-from app.api import chat, documents, health, logs
+from app.api import chat, documents, health, logs, metrics
+from app.services.langchain_service import get_langchain_service
+from app.utils.cache import cache_service
+from app.utils.metrics import HTTP_REQUEST_SECONDS
 
 # 로깅 설정
 logging.basicConfig(
@@ -20,10 +23,19 @@ async def lifespan(app: FastAPI):
     """애플리케이션 생명주기 관리"""
     # 시작 시
     logger.info("Starting MapleStory Chatbot Backend...")
-    # 여기서 벡터 스토어 초기화 등 수행 가능
+    # LLM, 임베딩, 벡터 스토어를 한 번만 초기화해 모든 라우터가 공유
+    try:
+        app.state.langchain_service = get_langchain_service()
+    except Exception as e:
+        # 백엔드가 준비되지 않아도 서버는 뜨도록 하고, 첫 요청 시 다시 시도
+        logger.error(f"LangChain service initialization failed: {str(e)}")
     yield
     # 종료 시
     logger.info("Shutting down...")
+    service = getattr(app.state, "langchain_service", None)
+    if service is not None:
+        await service.aclose()
+    await cache_service.aclose()
 
 # FastAPI 앱 생성
 app = FastAPI(
@@ -48,6 +60,12 @@ async def add_process_time_header(request: Request, call_next):
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    
+    # 라우트 템플릿 기준으로 집계 (경로 파라미터별로 시계열이 늘어나지 않도록)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        process_time, request.method, getattr(route, "path", "unmatched"), str(response.status_code)
+    )
     return response
 
 # 에러 핸들러
@@ -64,6 +82,7 @@ app.include_router(chat.router)
 app.include_router(documents.router)
 app.include_router(health.router)
 app.include_router(logs.router)
+app.include_router(metrics.router)
 
 # 루트 엔드포인트
 @app.get("/")
@@ -43,6 +43,7 @@ class UserInteractionLog(BaseModel):
     # LLM 관련 정보
     model_used: Optional[str] = Field(None, description="사용된 모델명")
     tokens_used: Optional[int] = Field(None, description="사용된 토큰 수")
+    stage_timings_ms: Optional[Dict[str, float]] = Field(default={}, description="RAG 단계별 소요 시간 (밀리초)")
     
     # 추가 컨텍스트
     context: Optional[Dict[str, Any]] = Field(default={}, description="추가 컨텍스트 정보")
@@ -0,0 +1,104 @@
+# app/services/corpus_version.py
+from typing import Callable, Optional
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Qdrant 컬렉션 메타데이터에 저장하는 키
+CORPUS_VERSION_METADATA_KEY = "corpus_version"
+
+class CorpusVersionStore:
+    """단조 증가하는 코퍼스 버전 - 모든 워커/수집 스크립트가 공유
+
+    로컬 벡터 색인이면 색인 파일의 버전, Redis가 있으면 INCR, 없으면 Qdrant 컬렉션 메타데이터,
+    모두 없으면 프로세스 내 카운터를 사용합니다.
+    캐시 키에 버전을 포함하면 문서가 바뀔 때 버전만 올려 O(1)로 무효화할 수 있습니다.
+    조회 결과는 refresh_interval 동안 재사용해 요청마다 왕복하지 않습니다.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        redis_client=None,
+        qdrant_client=None,
+        local_index=None,
+        refresh_interval: float = 2.0,
+        redis_provider: Optional[Callable] = None
+    ):
+        self.collection_name = collection_name
+        self._redis_client = redis_client  # redis.asyncio 클라이언트
+        self.redis_provider = redis_provider  # 실행 중인 루프용 클라이언트를 반환하는 함수 (redis_client 대신)
+        self.qdrant_client = qdrant_client  # AsyncQdrantClient
+        self.local_index = local_index  # LocalVectorIndex (쓰기마다 버전 증가)
+        self.refresh_interval = refresh_interval
+
+        self._value = 0
+        self._fetched_at = float("-inf")
+
+    @property
+    def redis_client(self):
+        """Redis 클라이언트 - provider가 있으면 사용 시점의 이벤트 루프 기준으로 조회"""
+        if self.redis_provider is not None:
+            return self.redis_provider()
+        return self._redis_client
+
+    @property
+    def _redis_key(self) -> str:
+        return f"corpus_version:{self.collection_name}"
+
+    @property
+    def current(self) -> str:
+        """마지막으로 조회한 버전 (동기 코드용, 왕복 없음)"""
+        return str(self._value)
+
+    def _remember(self, value: int) -> str:
+        self._value = value
+        self._fetched_at = time.monotonic()
+        return str(value)
+
+    async def _read_qdrant(self) -> int:
+        info = await self.qdrant_client.get_collection(self.collection_name)
+        metadata = info.config.metadata or {}
+        return int(metadata.get(CORPUS_VERSION_METADATA_KEY, 0))
+
+    async def get(self) -> str:
+        """현재 코퍼스 버전"""
+        if time.monotonic() - self._fetched_at < self.refresh_interval:
+            return str(self._value)
+
+        try:
+            if self.local_index is not None:
+                # 색인 파일이 바뀌었으면 다시 로드 - 다른 프로세스의 수집도 반영
+                return self._remember(self.local_index.refresh().version)
+            redis_client = self.redis_client
+            if redis_client is not None:
+                raw = await redis_client.get(self._redis_key)
+                return self._remember(int(raw or 0))
+            if self.qdrant_client is not None:
+                return self._remember(await self._read_qdrant())
+        except Exception as e:
+            # 조회 실패 시 마지막 값 유지 (다음 요청에서 재시도)
+            logger.warning(f"Failed to read corpus version: {e}")
+        return str(self._value)
+
+    async def bump(self) -> str:
+        """문서 추가/삭제 후 버전 증가"""
+        try:
+            if self.local_index is not None:
+                # 색인 쓰기에서 이미 증가
+                return self._remember(self.local_index.version)
+            redis_client = self.redis_client
+            if redis_client is not None:
+                return self._remember(int(await redis_client.incr(self._redis_key)))
+            if self.qdrant_client is not None:
+                # 원자적 증가가 없으므로 시각(ms)과 비교해 동시 수집에서도 값이 되돌아가지 않도록 함
+                value = max(await self._read_qdrant() + 1, int(time.time() * 1000))
+                await self.qdrant_client.update_collection(
+                    collection_name=self.collection_name,
+                    metadata={CORPUS_VERSION_METADATA_KEY: value}
+                )
+                return self._remember(value)
+        except Exception as e:
+            logger.warning(f"Failed to bump shared corpus version, bumping locally: {e}")
+        return self._remember(self._value + 1)
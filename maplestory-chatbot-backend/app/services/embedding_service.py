@@ -1,43 +1,257 @@
-from typing import Union, List
+from typing import Union, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from app.config import settings
+from app.utils.embedding_cache import QueryEmbeddingCache, DocumentEmbeddingCache, CachedDocumentEmbeddings
+from app.utils.metrics import EMBEDDING_API_CALLS
 import logging
 import os
+import time
+import random
+import asyncio
+import numpy as np
 from langchain.embeddings.base import Embeddings
 import voyageai
 
 logger = logging.getLogger(__name__)
 
+VOYAGE_OUTPUT_DTYPES = ("float", "int8", "binary")
+
+def decode_voyage_embeddings(embeddings: List[List[int]], output_dtype: str) -> List[List[float]]:
+    """Voyage 응답을 float 벡터로 변환 - binary는 비트를 풀어 ±1 벡터로 (코사인 = 해밍 유사도)"""
+    if output_dtype == "float":
+        return embeddings
+    if output_dtype == "int8":
+        return np.asarray(embeddings, dtype=np.float32).tolist()
+    # binary: 8차원이 int8 하나로 묶여 오며 offset binary 방식 (uint8 - 128)
+    packed = (np.asarray(embeddings, dtype=np.int16) + 128).astype(np.uint8)
+    bits = np.unpackbits(packed, axis=1)
+    return (bits.astype(np.float32) * 2 - 1).tolist()
+
+def reproject_embeddings(vectors: np.ndarray, dimension: int, output_dtype: str = "float") -> np.ndarray:
+    """저장된 벡터를 Matryoshka 방식으로 앞 dimension개만 남기고 재정규화 (재임베딩 없이 차원 축소)
+
+    int8은 코사인 기준으로 float와 같으므로 float 그대로 두고, binary는 부호만 남깁니다.
+    차원을 늘리거나 binary 벡터를 되돌리는 것은 불가능하므로 재수집해야 합니다.
+    """
+    if output_dtype not in VOYAGE_OUTPUT_DTYPES:
+        raise ValueError(f"Unknown output dtype: {output_dtype}")
+    if dimension > vectors.shape[1]:
+        raise ValueError(
+            f"Cannot re-project {vectors.shape[1]}-dim vectors to {dimension} dimensions; re-ingest documents instead"
+        )
+    truncated = np.asarray(vectors[:, :dimension], dtype=np.float32)
+    if output_dtype == "binary":
+        return np.where(truncated > 0, 1.0, -1.0).astype(np.float32)
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
 class VoyageEmbeddings(Embeddings):
     """Voyage AI 임베딩을 위한 LangChain 호환 클래스"""
     
-    def __init__(self, api_key: str = None, model: str = "voyage-3.5-lite"):
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = "voyage-3.5-lite",
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        batch_max_texts: int = 128,
+        batch_max_tokens: int = 100000,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        output_dimension: Optional[int] = None,
+        output_dtype: str = "float"
+    ):
+        if output_dtype not in VOYAGE_OUTPUT_DTYPES:
+            raise ValueError(f"Unknown Voyage output dtype: {output_dtype}")
         self.client = voyageai.Client(api_key=api_key)
+        self.async_client = voyageai.AsyncClient(api_key=api_key)
         self.model = model
-        logger.info(f"Initialized Voyage AI embeddings with model: {model}")
+        self.query_cache = query_cache  # 질문 임베딩 캐시 (선택사항)
+        self.output_dimension = output_dimension  # None이면 모델 기본 차원
+        self.output_dtype = output_dtype
+        
+        # 문서 임베딩 배치 설정
+        self.batch_max_texts = batch_max_texts
+        self.batch_max_tokens = batch_max_tokens
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.last_throughput = 0.0  # 마지막 문서 임베딩 처리량 (chunks/sec)
+        logger.info(f"Initialized Voyage AI embeddings with model: {self.cache_model}")
+    
+    @property
+    def cache_model(self) -> str:
+        """캐시 키용 모델 이름 - 차원/타입이 다르면 벡터가 다르므로 구분 (기본 설정이면 모델명 그대로)"""
+        if self.output_dimension is None and self.output_dtype == "float":
+            return self.model
+        return f"{self.model}:{self.output_dimension or 'default'}:{self.output_dtype}"
+    
+    def _embed_kwargs(self, input_type: str) -> dict:
+        """embed 호출 인자 - 출력 차원/타입은 설정된 경우에만 전달"""
+        kwargs = {"model": self.model, "input_type": input_type}
+        if self.output_dimension is not None:
+            kwargs["output_dimension"] = self.output_dimension
+        if self.output_dtype != "float":
+            kwargs["output_dtype"] = self.output_dtype
+        return kwargs
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """토큰 수 보수적 추정 (한글은 글자당 약 1토큰, UTF-8로 3바이트)"""
+        return len(text.encode("utf-8")) // 3 + 1
+    
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """청크 수와 토큰 한도를 넘지 않도록 인덱스 배치 구성"""
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for i, text in enumerate(texts):
+            tokens = self._estimate_tokens(text)
+            if current and (len(current) >= self.batch_max_texts or current_tokens + tokens > self.batch_max_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _backoff(self, attempt: int) -> float:
+        """지수 백오프 + 지터 (초)"""
+        return min(2 ** attempt, 30) + random.uniform(0, 1)
+    
+    def _embed_batch(self, batch_texts: List[str]) -> List[List[float]]:
+        """배치 하나 임베딩 - 일시적 실패는 재시도"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                EMBEDDING_API_CALLS.inc("voyage", "document")
+                response = self.client.embed(
+                    texts=batch_texts,
+                    **self._embed_kwargs("document")  # 문서용으로 최적화
+                )
+                return decode_voyage_embeddings(response.embeddings, self.output_dtype)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Voyage AI batch failed ({e}), retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+    
+    async def _aembed_batch(self, batch_texts: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """배치 하나 비동기 임베딩 - 일시적 실패는 재시도"""
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    EMBEDDING_API_CALLS.inc("voyage", "document")
+                    response = await self.async_client.embed(
+                        texts=batch_texts,
+                        **self._embed_kwargs("document")
+                    )
+                    return decode_voyage_embeddings(response.embeddings, self.output_dtype)
+                except Exception as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    logger.warning(f"Voyage AI batch failed ({e}), retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+    
+    def _log_throughput(self, count: int, batch_count: int, started: float):
+        """처리량 기록"""
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        self.last_throughput = count / elapsed
+        logger.info(
+            f"Voyage AI embedded {count} chunks in {batch_count} batches "
+            f"({elapsed:.1f}s, {self.last_throughput:.1f} chunks/sec)"
+        )
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """문서 임베딩 생성"""
+        """문서 임베딩 생성 - 토큰 한도 기준 배치를 여러 스레드로 동시 전송"""
+        if not texts:
+            return []
+        
+        started = time.perf_counter()
+        batches = self._make_batches(texts)
         try:
-            # Voyage AI는 배치 처리를 지원하므로 한 번에 처리
-            response = self.client.embed(
-                texts=texts,
-                model=self.model,
-                input_type="document"  # 문서용으로 최적화
-            )
-            return response.embeddings
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+                results = list(executor.map(
+                    lambda batch: self._embed_batch([texts[i] for i in batch]),
+                    batches
+                ))
         except Exception as e:
             logger.error(f"Error in Voyage AI document embedding: {e}")
             raise
+        
+        self._log_throughput(len(texts), len(batches), started)
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """비동기 문서 임베딩 - 최대 concurrency개 배치를 동시에 전송"""
+        if not texts:
+            return []
+        
+        started = time.perf_counter()
+        batches = self._make_batches(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            results = await asyncio.gather(*[
+                self._aembed_batch([texts[i] for i in batch], semaphore)
+                for batch in batches
+            ])
+        except Exception as e:
+            logger.error(f"Error in Voyage AI document embedding: {e}")
+            raise
+        
+        self._log_throughput(len(texts), len(batches), started)
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
     
     def embed_query(self, text: str) -> List[float]:
-        """쿼리 임베딩 생성"""
+        """쿼리 임베딩 생성 - 캐시에 있으면 API 호출 생략"""
+        if self.query_cache is not None:
+            # 모델이 바뀌었으면 이전 모델의 벡터는 무효
+            if self.query_cache.model != self.cache_model:
+                self.query_cache.reset(self.cache_model)
+            
+            cached = self.query_cache.get(text)
+            if cached is not None:
+                return cached
+        
         try:
+            EMBEDDING_API_CALLS.inc("voyage", "query")
             response = self.client.embed(
                 texts=[text],
-                model=self.model,
-                input_type="query"  # 쿼리용으로 최적화
+                **self._embed_kwargs("query")  # 쿼리용으로 최적화
+            )
+            embedding = decode_voyage_embeddings(response.embeddings, self.output_dtype)[0]
+            
+            if self.query_cache is not None:
+                self.query_cache.set(text, embedding)
+            return embedding
+        except Exception as e:
+            logger.error(f"Error in Voyage AI query embedding: {e}")
+            raise
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """비동기 쿼리 임베딩 - 캐시 확인 후 비동기 클라이언트 사용"""
+        if self.query_cache is not None:
+            if self.query_cache.model != self.cache_model:
+                self.query_cache.reset(self.cache_model)
+            
+            cached = await self.query_cache.aget(text)
+            if cached is not None:
+                return cached
+        
+        try:
+            EMBEDDING_API_CALLS.inc("voyage", "query")
+            response = await self.async_client.embed(
+                texts=[text],
+                **self._embed_kwargs("query")
             )
-            return response.embeddings[0]
+            embedding = decode_voyage_embeddings(response.embeddings, self.output_dtype)[0]
+            
+            if self.query_cache is not None:
+                await self.query_cache.aset(text, embedding)
+            return embedding
         except Exception as e:
             logger.error(f"Error in Voyage AI query embedding: {e}")
             raise
@@ -71,15 +285,42 @@ class EmbeddingService:
                 logger.info("Falling back to OpenAI embeddings")
                 return EmbeddingService._get_openai_embeddings()
             
-            return VoyageEmbeddings(
+            embeddings = VoyageEmbeddings(
                 api_key=api_key,
-                model=settings.voyage_model
+                model=settings.voyage_model,
+                batch_max_texts=settings.voyage_batch_max_texts,
+                batch_max_tokens=settings.voyage_batch_max_tokens,
+                concurrency=settings.voyage_embed_concurrency,
+                max_retries=settings.voyage_embed_max_retries,
+                output_dimension=settings.voyage_output_dimension,
+                output_dtype=settings.voyage_output_dtype
             )
+            embeddings.query_cache = EmbeddingService._get_query_cache(embeddings.cache_model)
+            return embeddings
         except Exception as e:
             logger.error(f"Failed to initialize Voyage AI embeddings: {e}")
             logger.info("Falling back to OpenAI embeddings")
             return EmbeddingService._get_openai_embeddings()
     
+    @staticmethod
+    def _get_query_cache(model: str) -> Optional[QueryEmbeddingCache]:
+        """설정에 따라 질문 임베딩 캐시 생성"""
+        if not settings.enable_query_embedding_cache:
+            return None
+        
+        cache_service = None
+        if settings.query_embedding_cache_use_redis:
+            from app.utils.cache import cache_service as redis_cache
+            if redis_cache.redis_client is not None:
+                cache_service = redis_cache
+        
+        return QueryEmbeddingCache(
+            model=model,
+            max_bytes=settings.query_embedding_cache_max_bytes,
+            ttl=settings.query_embedding_cache_ttl,
+            cache_service=cache_service
+        )
+    
     @staticmethod
     def _get_openai_embeddings():
         """OpenAI 임베딩 모델"""
@@ -159,7 +400,25 @@ class EmbeddingService:
             logger.error("Please check your internet connection or provide API keys")
             raise RuntimeError("No embedding model available. Please provide Voyage AI, OpenAI API key or install sentence-transformers.")
 
+    @staticmethod
+    def with_document_cache(embeddings, cache_path: Optional[str] = None):
+        """문서 임베딩 캐시 래퍼 적용 - (provider, model, 청크 해시) 단위로 재사용"""
+        provider = settings.get_embedding_provider()
+        model = (
+            getattr(embeddings, "cache_model", None) or getattr(embeddings, "model", None)
+            or getattr(embeddings, "model_name", None) or "unknown"
+        )
+        cache = DocumentEmbeddingCache(cache_path or settings.document_embedding_cache_path)
+        logger.info(f"Document embedding cache enabled: {cache.path} ({provider}/{model})")
+        return CachedDocumentEmbeddings(embeddings, cache, provider=provider, model=model)
+
 # 편의를 위한 함수
 def get_embeddings():
     """임베딩 서비스 인스턴스 반환"""
-    return EmbeddingService.get_embeddings() 
\ No newline at end of file
+    embeddings = EmbeddingService.get_embeddings()
+    if settings.enable_document_embedding_cache:
+        try:
+            embeddings = EmbeddingService.with_document_cache(embeddings)
+        except Exception as e:
+            logger.warning(f"Document embedding cache unavailable: {e}")
+    return embeddings 
\ No newline at end of file
@@ -0,0 +1,109 @@
+# app/services/ingestion_manifest.py
+from typing import Dict, List, Optional
+from pathlib import Path
+from datetime import datetime
+import hashlib
+import json
+import os
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 청크 ID 생성용 고정 네임스페이스 (값이 바뀌면 모든 ID가 바뀌므로 변경 금지)
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1f3c52-5b3e-4c1e-9a57-6d0a8e3b9c21")
+
+def content_hash(text: str) -> str:
+    """텍스트 내용 해시"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_chunk_id(file_key: str, chunk_index: int, text: str) -> str:
+    """(파일 경로, 청크 번호, 내용 해시)로 결정적 포인트 ID 생성"""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{file_key}:{chunk_index}:{content_hash(text)}"))
+
+def file_hash(file_path: str) -> str:
+    """파일 내용 해시"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def manifest_path(vector_store_type: str, collection_name: str, directory: str = "./data") -> str:
+    """백엔드/컬렉션별 매니페스트 경로 - 다른 컬렉션의 수집 기록으로 파일을 건너뛰지 않도록 분리"""
+    return os.path.join(directory, f"ingest_manifest.{vector_store_type}.{collection_name}.json")
+
+class IngestionManifest:
+    """수집된 파일의 mtime, 해시, 청크 ID 기록 - 변경된 파일만 다시 수집"""
+
+    def __init__(self, path: str = "./data/ingest_manifest.json"):
+        self.path = Path(path)
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        """매니페스트 로드 (없으면 빈 상태)"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Failed to load ingestion manifest, starting fresh: {e}")
+            self.files = {}
+
+    def save(self):
+        """매니페스트 저장 (임시 파일에 쓴 뒤 교체)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """기록 전체 삭제 (컬렉션을 비우거나 삭제했을 때)"""
+        self.files = {}
+        if self.path.exists():
+            self.path.unlink()
+
+    def is_unchanged(self, file_key: str, file_path: str) -> bool:
+        """파일이 마지막 수집 이후 바뀌지 않았는지 확인 (mtime이 같으면 해시 생략)"""
+        entry = self.files.get(file_key)
+        if not entry:
+            return False
+
+        mtime = os.path.getmtime(file_path)
+        if entry.get("mtime") == mtime:
+            return True
+
+        # mtime만 바뀐 경우 (git checkout 등) 내용 해시로 재확인
+        if entry.get("hash") == file_hash(file_path):
+            entry["mtime"] = mtime
+            return True
+        return False
+
+    def get_chunk_ids(self, file_key: str) -> List[str]:
+        """파일에 속한 기존 청크 ID"""
+        return self.files.get(file_key, {}).get("chunk_ids", [])
+
+    def update(self, file_key: str, file_path: str, chunk_ids: List[str]):
+        """파일 수집 결과 기록"""
+        self.files[file_key] = {
+            "mtime": os.path.getmtime(file_path),
+            "hash": file_hash(file_path),
+            "chunk_ids": chunk_ids,
+            "ingested_at": datetime.now().isoformat()
+        }
+
+    def remove(self, file_key: str) -> List[str]:
+        """삭제된 파일 기록 제거 후 청크 ID 반환"""
+        entry = self.files.pop(file_key, None)
+        return entry.get("chunk_ids", []) if entry else []
+
+    def stale_files(self, current_keys: List[str], prefix: Optional[str] = None) -> List[str]:
+        """디스크에서 사라진 파일 목록"""
+        current = set(current_keys)
+        return [
+            key for key in self.files
+            if key not in current and (prefix is None or key.startswith(prefix))
+        ]
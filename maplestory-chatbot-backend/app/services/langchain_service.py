@@ -1,44 +1,93 @@
 from langchain_anthropic import ChatAnthropic
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.callbacks.base import AsyncCallbackHandler
 from langchain.schema import Document
-from typing import Dict, List, Optional, AsyncGenerator
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from typing import Dict, List, Optional, AsyncGenerator, NamedTuple, Any
 import asyncio
+import copy
+import threading
+import time
 from app.config import settings
 from app.chains.qa_chain import create_qa_chain
-from app.services.vector_store import VectorStoreService
+from app.chains.question_rewriter import QuestionRewriter
+from app.chains.history_compactor import CompactedHistory, HistoryCompactor
+from app.services.vector_store import VectorStoreService, VectorStoreRetriever
 from app.services.embedding_service import get_embeddings
+from app.services.session_history import SessionChatMessageHistory, create_history_backend
 from app.chains.prompts import MAPLESTORY_ANSWER_TEMPLATE
+from app.utils.relevance import extract_keywords, score_documents
+from app.utils.semantic_cache import SemanticAnswerCache
+from app.utils.cache import cache_service
+from app.utils.embedding_cache import normalize_query
+from app.utils.metrics import metrics_registry
+from app.utils.tracing import (
+    LLMTimingCallback, LLMUsageMetricsCallback, stage_span, trace_stages,
+    STAGE_QUERY_EMBEDDING, STAGE_CONDENSE_REWRITE, STAGE_RELEVANCE_FILTER, STAGE_RESPONSE_VALIDATION,
+)
 import logging
 import re
 import os
 import json
-from difflib import SequenceMatcher
 import yaml
 
 logger = logging.getLogger(__name__)
 
-class StreamingCallbackHandler(AsyncCallbackHandler):
-    """스트리밍 응답을 위한 커스텀 콜백 핸들러"""
-    def __init__(self, queue: asyncio.Queue):
-        self.queue = queue
-    
-    async def on_llm_new_token(self, token: str, **kwargs):
-        await self.queue.put(token)
-    
-    async def on_llm_end(self, response, **kwargs):
-        await self.queue.put(None)  # 종료 신호
+# 답변 검증용 의심 패턴 (모듈 로드 시 한 번만 컴파일)
+SUSPICIOUS_PATTERNS = [
+    (re.compile(r'\d+개(?:\s*(?:의|를|을|이|가))?', re.IGNORECASE), '구체적 수량'),
+    (re.compile(r'[가-힣]+\s*큐브', re.IGNORECASE), '큐브 아이템'),
+    (re.compile(r'[가-힣]+\s*스킬', re.IGNORECASE), '스킬명'),
+    (re.compile(r'\d+(?:,\d{3})*\s*(?:메소|포인트|점수)', re.IGNORECASE), '수치 정보'),
+    (re.compile(r'(?:대략|약|수십억|다수|여러|일반적으로|보통)', re.IGNORECASE), '모호한 표현'),
+]
+
+# 답변 생성 LLM 호출에만 붙는 태그 - 스트리밍 시 질문 재작성/기록 요약 호출의 토큰과 구분
+ANSWER_LLM_TAG = "answer_llm"
+
+NO_RELEVANT_DOCUMENTS_MESSAGE = "죄송합니다. 제공된 문서에서는 해당 질문에 대한 관련 정보를 찾을 수 없습니다. 다른 질문을 해보시거나 더 구체적으로 질문해 주세요."
+
+class ChainBundle(NamedTuple):
+    """한 번 빌드해 재사용하는 체인 묶음 (통째로 교체되어 요청 간 일관성 보장)"""
+    settings_key: tuple
+    retriever: Any
+    qa_chain: Any
 
 class LangChainService:
     def __init__(self):
         self.llm = self._initialize_llm()
         self.embeddings = self._initialize_embeddings()
-        self.vector_store = VectorStoreService(self.embeddings)
-        self.chat_histories: Dict[str, BaseChatMessageHistory] = {}  # 새로운 메모리 시스템
-        self.retriever = None  # retriever를 별도로 저장
+        self.vector_store = self._initialize_vector_store()
+        self.history_backend = create_history_backend()  # 세션 수/턴 수가 제한된 대화 기록 저장소
+        self.history_compactor = HistoryCompactor(
+            llm=self.llm if settings.enable_history_summary else None,
+            token_budget=settings.history_token_budget,
+            keep_turns=settings.history_keep_turns,
+            cache_size=settings.history_summary_cache_size,
+        )
+        self.question_rewriter = QuestionRewriter(
+            self.llm,
+            cache_size=settings.condense_cache_size,
+            enable_fast_path=settings.enable_condense_fast_path,
+        )
+        self.answer_cache = self._initialize_answer_cache()
+        self._chains: Optional[ChainBundle] = None  # 요청마다 재생성하지 않는 체인 캐시
+        self._retriever_override = None  # 외부에서 지정한 retriever (설정 변경으로 재빌드해도 유지)
+        self._chains_lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}  # 처리 중인 (코퍼스 버전, 정규화된 질문) → 파이프라인 태스크
+        self.coalesced_requests = 0
+        self._register_metrics()
+    
+    @property
+    def retriever(self):
+        """현재 체인 묶음이 사용하는 retriever"""
+        return self._get_chains().retriever
+    
+    @retriever.setter
+    def retriever(self, retriever):
+        """retriever 교체 시 체인도 함께 다시 빌드 (None이면 설정 기반 기본 retriever로 복귀)"""
+        with self._chains_lock:
+            self._retriever_override = retriever
+            self._chains = self._build_chains(self._chain_settings_key())
         
     def _initialize_llm(self):
         """Claude LLM 초기화"""
@@ -48,6 +97,7 @@ class LangChainService:
             max_tokens=settings.max_tokens,
             temperature=settings.temperature,
             streaming=True,
+            callbacks=[LLMUsageMetricsCallback(settings.claude_model)],  # 모든 호출의 토큰 사용량 집계
         )
     
     def _initialize_embeddings(self):
@@ -55,11 +105,88 @@ class LangChainService:
         logger.info(f"Initializing embeddings with provider: {settings.get_embedding_provider()}")
         return get_embeddings()
     
+    def _initialize_vector_store(self):
+        """벡터 스토어 초기화 (설정된 백엔드)"""
+        return VectorStoreService(self.embeddings)
+    
+    def _initialize_answer_cache(self) -> Optional[SemanticAnswerCache]:
+        """의미 기반 답변 캐시 초기화 (Redis에 저장된 항목 복원)"""
+        if not settings.enable_semantic_cache:
+            return None
+        
+        redis_client = None
+        if settings.semantic_cache_use_redis:
+            redis_client = cache_service.redis_client
+        
+        # 답변 모델과 임베딩 모델이 같을 때만 캐시 공유
+        embedding_model = getattr(self.embeddings, "model", None) or getattr(self.embeddings, "model_name", "default")
+        answer_cache = SemanticAnswerCache(
+            namespace=f"{settings.claude_model}:{embedding_model}",
+            threshold=settings.semantic_cache_threshold,
+            max_entries=settings.semantic_cache_max_entries,
+            ttl=settings.semantic_cache_ttl,
+            redis_client=redis_client,
+        )
+        answer_cache.load()
+        return answer_cache
+    
     def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
-        """세션별 채팅 히스토리 관리 - 새로운 메모리 시스템"""
-        if session_id not in self.chat_histories:
-            self.chat_histories[session_id] = ChatMessageHistory()
-        return self.chat_histories[session_id]
+        """세션별 채팅 히스토리 관리 - 저장소에 위임 (워커 간 공유 가능)"""
+        return SessionChatMessageHistory(session_id, self.history_backend)
+    
+    def _chain_settings_key(self) -> tuple:
+        """체인 구성에 영향을 주는 설정값 (바뀌면 체인을 다시 빌드)"""
+        return (
+            settings.use_system_prompt,
+            settings.search_type,
+            settings.max_retrieval_docs,
+            settings.min_relevance_score,
+            settings.enable_metadata_filtering,
+        )
+    
+    def _build_chains(self, settings_key: tuple) -> ChainBundle:
+        """retriever, 질문 재작성 체인, QA 체인을 한 번에 빌드"""
+        retriever = self._retriever_override
+        if retriever is None:
+            retriever = self.vector_store.get_retriever(
+                k=settings.max_retrieval_docs,
+                search_type=settings.search_type,
+                metadata_filtering=settings.enable_metadata_filtering
+            )
+        
+        # 검증된 문서와 대화 기록을 직접 받는 QA 체인 (검색/기록 조회는 요청당 한 번만 수행, 일반/스트리밍 공용)
+        # 대화 기록은 토큰 예산 안으로 압축한 뒤 프롬프트에 넣고, 이번 턴은 호출자가 기록에 추가
+        answer_llm = self.llm.with_config(tags=[ANSWER_LLM_TAG])
+        qa_chain = create_qa_chain(llm=answer_llm)
+        
+        logger.info(f"Built RAG chains (settings: {settings_key})")
+        return ChainBundle(
+            settings_key=settings_key,
+            retriever=retriever,
+            qa_chain=qa_chain,
+        )
+    
+    def _get_chains(self) -> ChainBundle:
+        """캐시된 체인 반환 - 설정이 바뀐 경우에만 다시 빌드"""
+        chains = self._chains
+        settings_key = self._chain_settings_key()
+        if chains is not None and chains.settings_key == settings_key:
+            return chains
+        
+        with self._chains_lock:
+            # 다른 요청이 먼저 빌드했는지 재확인
+            chains = self._chains
+            if chains is None or chains.settings_key != settings_key:
+                chains = self._build_chains(settings_key)
+                self._chains = chains  # 단일 대입으로 원자적 교체
+            return chains
+    
+    def refresh_chains(self, retriever=None) -> None:
+        """체인을 다시 빌드해 교체 (retriever를 주면 이후 재빌드에도 그 retriever 사용)"""
+        with self._chains_lock:
+            if retriever is not None:
+                self._retriever_override = retriever
+            self._chains = self._build_chains(self._chain_settings_key())
     
     def _apply_answer_template(self, answer: str) -> str:
         """답변 템플릿 적용"""
@@ -104,81 +231,304 @@ class LangChainService:
         context: Optional[Dict] = None,
         stream: bool = False
     ) -> Dict:
-        """채팅 처리 메인 메서드 - 개선된 문서 검증 적용"""
+        """채팅 처리 메인 메서드 - 개선된 문서 검증 적용
+        
+        stream=True이면 stream_chat의 이벤트 제너레이터를 반환합니다.
+        """
         try:
-            # retriever 초기화 (매번 새로 생성하지 않고 재사용)
-            if not self.retriever:
-                self.retriever = self.vector_store.get_retriever(
-                    k=settings.max_retrieval_docs,
-                    search_type=settings.search_type
-                )
+            if stream:
+                return self.stream_chat(message, session_id, context)
             
-            # QA 체인 생성 (메모리 히스토리와 함께)
-            qa_chain = create_qa_chain(
-                llm=self.llm,
-                retriever=self.retriever
-            )
+            # 캐시된 체인 사용 (요청마다 새로 생성하지 않음)
+            chains = self._get_chains()
+            # 대화 기록은 요청당 한 번만 읽어 모든 단계가 공유
+            chat_history = await self.get_session_history(session_id).aget_messages()
             
-            # 메모리가 있는 체인으로 래핑
-            chain_with_history = RunnableWithMessageHistory(
-                qa_chain,
-                self.get_session_history,
-                input_messages_key="input",
-                history_messages_key="chat_history",
-            )
+            with trace_stages() as timings:
+                # 대화 기록이 없으면 답변은 질문과 코퍼스에만 의존하므로 동시 요청끼리 공유 가능
+                if settings.enable_request_coalescing and not chat_history:
+                    result = await self._coalesced_chat(chains, message, session_id, context, chat_history)
+                else:
+                    result = await self._enhanced_regular_chat(chains, message, session_id, context, chat_history)
             
-            if stream:
-                return await self._stream_chat(chain_with_history, message, session_id, context)
-            else:
-                return await self._enhanced_regular_chat(chain_with_history, message, session_id, context)
+            # 이번 요청에서 실제로 실행된 단계만 기록 (캐시 적중/공유 시 생략된 단계는 없음)
+            result["metadata"]["timings_ms"] = timings.as_dict()
+            return result
                 
         except Exception as e:
             logger.error(f"Chat error: {str(e)}")
             raise
     
-    async def _enhanced_regular_chat(self, qa_chain, message: str, session_id: str, context: Optional[Dict]) -> Dict:
-        """개선된 일반 채팅 처리 - 문서 검증 및 답변 후처리 포함"""
-        
-        # 1. 먼저 문서 검색 (retriever를 직접 사용)
-        raw_documents = await self.retriever.aget_relevant_documents(message)
-        
-        # 2. 문서 관련성 검증
-        validated_documents = self._validate_document_relevance(raw_documents, message)
-        
-        logger.info(f"Documents: {len(raw_documents)} -> {len(validated_documents)} (after validation)")
+    async def _enhanced_regular_chat(
+        self,
+        chains: ChainBundle,
+        message: str,
+        session_id: str,
+        context: Optional[Dict],
+        chat_history: Optional[List[BaseMessage]] = None
+    ) -> Dict:
+        """개선된 일반 채팅 처리 - 문서 검증 및 답변 후처리 포함 (chat_history가 없으면 직접 조회)"""
+        if chat_history is None:
+            chat_history = await self.get_session_history(session_id).aget_messages()
+        
+        # 0. 의미 기반 답변 캐시 조회 (대화 맥락과 무관한 질문만)
+        corpus_version = await self.vector_store.get_corpus_version()
+        cache_vector, cached = await self._lookup_answer_cache(message, chat_history, corpus_version)
+        if cached is not None:
+            return await self._cached_chat_response(cached, message, session_id)
+        
+        # 1~2. 기록 압축(턴당 한 번), 문서 검색 및 관련성 검증
+        history = await self._compact_history(chat_history)
+        raw_documents, validated_documents = await self._retrieve_documents(
+            chains, message, history.messages, cache_vector
+        )
         
         if not validated_documents:
             # 관련 문서가 없는 경우
-            return {
-                "response": "죄송합니다. 제공된 문서에서는 해당 질문에 대한 관련 정보를 찾을 수 없습니다. 다른 질문을 해보시거나 더 구체적으로 질문해 주세요.",
-                "sources": [],
-                "metadata": {
-                    "model": settings.claude_model,
-                    "tokens_used": 0,
-                    "sources_count": 0,
-                    "valid_sources_count": 0,
-                    "system_prompt_used": settings.use_system_prompt,
-                    "template_applied": settings.enable_answer_template,
-                    "documents_filtered": len(raw_documents),
-                    "relevance_check": "no_relevant_documents"
-                }
-            }
+            return self._no_documents_response(raw_documents)
         
-        # 3. 검증된 문서로 QA 수행 (세션 히스토리와 함께)
-        response = await qa_chain.ainvoke(
-            {"input": message},
-            config={"configurable": {"session_id": session_id}}
+        # 3. 검증된 문서로 QA 수행 (세션 히스토리와 함께) - 재검색 없이 context로 직접 전달
+        llm_timing = LLMTimingCallback(ANSWER_LLM_TAG)
+        response = await chains.qa_chain.ainvoke(
+            {"input": message, "context": validated_documents, "chat_history": history.messages},
+            config={"callbacks": [llm_timing]}
         )
+        await self._record_turn(session_id, message, response["answer"])
         
-        # 4. 답변 후처리 검증
-        raw_answer = response["answer"]
-        validated_answer = self._validate_response(raw_answer, validated_documents, message)
+        # 4~7. 답변 후처리
+        result = self._build_chat_response(
+            response["answer"], message, raw_documents, validated_documents,
+            tokens_used=llm_timing.usage.get("total_tokens", 0),
+            history_tokens_saved=history.tokens_saved,
+        )
         
-        # 5. 출처 정보 추출
-        sources = self._extract_sources(validated_documents)
+        # 8. 답변 캐시에 저장 (Redis 저장은 스레드에서 수행)
+        if cache_vector is not None:
+            await asyncio.to_thread(self.answer_cache.store, message, cache_vector, result, corpus_version)
         
-        # 6. 답변에 템플릿 적용
-        formatted_response = self._apply_answer_template(validated_answer)
+        return result
+    
+    async def _coalesced_chat(
+        self,
+        chains: ChainBundle,
+        message: str,
+        session_id: str,
+        context: Optional[Dict],
+        chat_history: List[BaseMessage]
+    ) -> Dict:
+        """동일한 질문의 동시 요청은 처리 중인 파이프라인 하나의 결과를 공유 (single-flight)"""
+        corpus_version = await self.vector_store.get_corpus_version()
+        key = f"{corpus_version}:{normalize_query(message)}"
+        
+        task = self._inflight.get(key)
+        if task is None:
+            # 첫 요청이 취소(클라이언트 연결 종료)되어도 대기 중인 요청은 결과를 받도록 별도 태스크로 실행
+            task = asyncio.ensure_future(self._enhanced_regular_chat(chains, message, session_id, context, chat_history))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
+            return await asyncio.shield(task)
+        
+        # 검색/LLM 호출 없이 결과만 받고, 대화 기록에는 이번 턴을 추가
+        self.coalesced_requests += 1
+        result = copy.deepcopy(await asyncio.shield(task))
+        await self._record_turn(session_id, message, result["response"])
+        result["metadata"].update({"tokens_used": 0, "coalesced": True})
+        logger.info(f"Coalesced identical in-flight request (session: {session_id})")
+        return result
+    
+    def _finish_inflight(self, key: str, task: asyncio.Task) -> None:
+        """완료된 파이프라인 태스크 정리"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 대기자가 없어도 "exception was never retrieved" 경고가 나지 않도록 예외 확인
+        if not task.cancelled():
+            task.exception()
+    
+    async def stream_chat(
+        self,
+        message: str,
+        session_id: str,
+        context: Optional[Dict] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """스트리밍 채팅 처리 - 타입이 있는 이벤트를 순서대로 생성
+        
+        retrieval(출처/점수) → token(답변 조각, 여러 번) → usage(답변 LLM 토큰) → done(최종 응답, TTFT/총 지연)
+        일반 채팅과 같은 검색·문서 검증·후처리를 거치며, 토큰과 사용량은 답변 LLM 호출에서만 집계합니다.
+        """
+        with trace_stages() as timings:
+            start_time = time.perf_counter()
+            first_token_time = None
+            chains = self._get_chains()
+            
+            def elapsed_ms(since: Optional[float]) -> Optional[int]:
+                return int((since - start_time) * 1000) if since is not None else None
+            
+            def done_event(result: Dict) -> Dict:
+                metadata = result["metadata"]
+                metadata["ttft_ms"] = elapsed_ms(first_token_time)
+                metadata["total_ms"] = elapsed_ms(time.perf_counter())
+                metadata["timings_ms"] = timings.as_dict()
+                return {"event": "done", "data": {
+                    "response": result["response"],
+                    "metadata": metadata,
+                    "ttft_ms": metadata["ttft_ms"],
+                    "total_ms": metadata["total_ms"],
+                }}
+            
+            # 대화 기록은 요청당 한 번만 읽어 모든 단계가 공유
+            chat_history = await self.get_session_history(session_id).aget_messages()
+            
+            # 0. 의미 기반 답변 캐시 조회 - 적중하면 답변 전체를 한 번에 전송
+            corpus_version = await self.vector_store.get_corpus_version()
+            cache_vector, cached = await self._lookup_answer_cache(message, chat_history, corpus_version)
+            if cached is not None:
+                result = await self._cached_chat_response(cached, message, session_id)
+                yield self._retrieval_event(result["sources"])
+                first_token_time = time.perf_counter()
+                yield {"event": "token", "data": {"text": result["response"]}}
+                yield {"event": "usage", "data": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
+                yield done_event(result)
+                return
+            
+            # 1~2. 기록 압축(턴당 한 번), 문서 검색 및 관련성 검증 후 출처 전송
+            history = await self._compact_history(chat_history)
+            raw_documents, validated_documents = await self._retrieve_documents(
+                chains, message, history.messages, cache_vector
+            )
+            yield self._retrieval_event(self._extract_sources(validated_documents))
+            
+            if not validated_documents:
+                result = self._no_documents_response(raw_documents)
+                first_token_time = time.perf_counter()
+                yield {"event": "token", "data": {"text": result["response"]}}
+                yield {"event": "usage", "data": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
+                yield done_event(result)
+                return
+            
+            # 3. 답변 LLM 토큰만 전달 (질문 재작성/기록 요약 LLM 호출은 태그로 제외)
+            answer_parts = []
+            llm_timing = LLMTimingCallback(ANSWER_LLM_TAG)
+            async for event in chains.qa_chain.astream_events(
+                {"input": message, "context": validated_documents, "chat_history": history.messages},
+                config={"callbacks": [llm_timing]},
+                version="v2",
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream" and ANSWER_LLM_TAG in event.get("tags", []):
+                    text = event["data"]["chunk"].text()
+                    if text:
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter()
+                        answer_parts.append(text)
+                        yield {"event": "token", "data": {"text": text}}
+            
+            usage = {
+                "input_tokens": llm_timing.usage.get("input_tokens", 0),
+                "output_tokens": llm_timing.usage.get("output_tokens", 0),
+                "total_tokens": llm_timing.usage.get("total_tokens", 0),
+            }
+            yield {"event": "usage", "data": usage}
+            await self._record_turn(session_id, message, "".join(answer_parts))
+            
+            # 4~7. 일반 채팅과 같은 후처리 (최종 응답은 done 이벤트로 전달)
+            result = self._build_chat_response(
+                "".join(answer_parts), message, raw_documents, validated_documents,
+                tokens_used=usage["total_tokens"],
+                history_tokens_saved=history.tokens_saved,
+            )
+            if cache_vector is not None:
+                await asyncio.to_thread(self.answer_cache.store, message, cache_vector, result, corpus_version)
+            yield done_event(result)
+    
+    @staticmethod
+    def _retrieval_event(sources: List[Dict]) -> Dict:
+        """검색 결과 이벤트 - 출처와 관련성 점수"""
+        return {"event": "retrieval", "data": {
+            "sources": sources,
+            "scores": [source.get("relevance_score", 0) for source in sources],
+        }}
+    
+    async def _lookup_answer_cache(self, message: str, chat_history: List[BaseMessage], corpus_version: str) -> tuple:
+        """(저장용 질문 벡터, 캐시 적중 결과) - 캐시 대상이 아니면 (None, None)"""
+        if self.answer_cache is None or not self._is_cacheable(chat_history):
+            return None, None
+        # 검색 단계에서 이 벡터를 재사용 (질문 임베딩은 요청당 한 번)
+        with stage_span(STAGE_QUERY_EMBEDDING):
+            cache_vector = await self.embeddings.aembed_query(message)
+        return cache_vector, self.answer_cache.lookup(cache_vector, corpus_version)
+    
+    async def _compact_history(self, chat_history: List[BaseMessage]) -> CompactedHistory:
+        """대화 기록을 턴당 한 번 압축 - 질문 재작성과 QA 단계가 같은 결과 사용"""
+        with stage_span(STAGE_CONDENSE_REWRITE):
+            history = await self.history_compactor.acompact(chat_history)
+        if history.summarized_messages:
+            logger.info(
+                f"History compacted: {history.original_tokens} -> {history.compacted_tokens} tokens "
+                f"({history.summarized_messages} messages summarized)"
+            )
+        return history
+    
+    async def _retrieve_documents(
+        self,
+        chains: ChainBundle,
+        message: str,
+        chat_history: List[BaseMessage],
+        query_vector: Optional[List[float]] = None
+    ) -> tuple:
+        """검색 질문으로 한 번만 검색한 뒤 관련성 검증 - (검색 문서, 검증된 문서), chat_history는 압축된 기록
+
+        query_vector는 답변 캐시 조회에 쓴 질문 벡터로, 검색 질문이 원래 질문과 같으면 다시 임베딩하지 않습니다.
+        """
+        with stage_span(STAGE_CONDENSE_REWRITE):
+            search_query = await self._contextualize_question(message, chat_history)
+        # 질문 임베딩/벡터 검색 단계는 VectorStoreService.search에서 기록
+        if query_vector is not None and search_query == message and isinstance(chains.retriever, VectorStoreRetriever):
+            raw_documents = await chains.retriever.ainvoke(search_query, query_vector=query_vector)
+        else:
+            raw_documents = await chains.retriever.ainvoke(search_query)
+        
+        with stage_span(STAGE_RELEVANCE_FILTER):
+            validated_documents = self._validate_document_relevance(raw_documents, message)
+        
+        logger.info(f"Documents: {len(raw_documents)} -> {len(validated_documents)} (after validation)")
+        return raw_documents, validated_documents
+    
+    def _no_documents_response(self, raw_documents: List[Document]) -> Dict:
+        """관련 문서가 없을 때의 응답"""
+        return {
+            "response": NO_RELEVANT_DOCUMENTS_MESSAGE,
+            "sources": [],
+            "metadata": {
+                "model": settings.claude_model,
+                "tokens_used": 0,
+                "sources_count": 0,
+                "valid_sources_count": 0,
+                "system_prompt_used": settings.use_system_prompt,
+                "template_applied": settings.enable_answer_template,
+                "documents_filtered": len(raw_documents),
+                "relevance_check": "no_relevant_documents"
+            }
+        }
+    
+    def _build_chat_response(
+        self,
+        raw_answer: str,
+        message: str,
+        raw_documents: List[Document],
+        validated_documents: List[Document],
+        tokens_used: int = 0,
+        history_tokens_saved: int = 0
+    ) -> Dict:
+        """답변 후처리 검증, 출처 추출, 템플릿/참고자료 적용"""
+        with stage_span(STAGE_RESPONSE_VALIDATION):
+            # 4. 답변 후처리 검증
+            validated_answer = self._validate_response(raw_answer, validated_documents, message)
+            
+            # 5. 출처 정보 추출
+            sources = self._extract_sources(validated_documents)
+            
+            # 6. 답변에 템플릿 적용
+            formatted_response = self._apply_answer_template(validated_answer)
         
         # 7. 참고자료를 URL만 출력하도록 간소화
         sources_with_urls = [s for s in sources if s.get('has_url') and s.get('url')]
@@ -196,7 +546,7 @@ class LangChainService:
             "sources": sources,
             "metadata": {
                 "model": settings.claude_model,
-                "tokens_used": response.get("tokens_used", 0),
+                "tokens_used": tokens_used,
                 "sources_count": len(sources),
                 "valid_sources_count": len(sources_with_urls),
                 "system_prompt_used": settings.use_system_prompt,
@@ -205,55 +555,46 @@ class LangChainService:
                 "original_documents": len(raw_documents),
                 "validated_documents": len(validated_documents),
                 "relevance_check": "passed",
-                "response_length": len(formatted_response)
+                "response_length": len(formatted_response),
+                "history_tokens_saved": history_tokens_saved
             }
         }
     
-    async def _stream_chat(
-        self, 
-        qa_chain, 
-        message: str, 
-        session_id: str,
-        context: Optional[Dict]
-    ) -> AsyncGenerator[str, None]:
-        """스트리밍 채팅 처리"""
-        try:
-            # 스트리밍을 위한 큐 생성
-            queue = asyncio.Queue()
-            
-            # 스트리밍 콜백 핸들러 생성
-            streaming_handler = StreamingCallbackHandler(queue)
-            
-            # 스트리밍 응답 생성
-            async def stream_response():
-                try:
-                    response = await qa_chain.ainvoke(
-                        {"input": message},
-                        config={
-                            "configurable": {"session_id": session_id},
-                            "callbacks": [streaming_handler]
-                        }
-                    )
-                except Exception as e:
-                    await queue.put(f"오류가 발생했습니다: {str(e)}")
-                    await queue.put(None)
-            
-            # 백그라운드에서 응답 생성 시작
-            task = asyncio.create_task(stream_response())
-            
-            # 스트리밍 토큰을 순차적으로 yield
-            while True:
-                token = await queue.get()
-                if token is None:  # 종료 신호
-                    break
-                yield token
-            
-            # 태스크 완료 대기
-            await task
-            
-        except Exception as e:
-            logger.error(f"Streaming chat error: {str(e)}")
-            yield f"스트리밍 중 오류가 발생했습니다: {str(e)}"
+    @staticmethod
+    def _is_cacheable(chat_history: List[BaseMessage]) -> bool:
+        """대화 기록이 없는 세션만 캐시된 답변 사용 가능
+
+        캐시는 질문만으로 키가 정해지므로, 대화 중인 세션은 독립적으로 보이는 질문이라도
+        이전 맥락을 반영한 답변을 받아야 합니다 (다른 사용자 답변이 기록에 섞이지 않도록).
+        """
+        return not chat_history
+    
+    async def _cached_chat_response(self, cached: tuple, message: str, session_id: str) -> Dict:
+        """캐시된 답변 반환 - 대화 기록에도 이번 턴을 추가"""
+        result, similarity = cached
+        await self._record_turn(session_id, message, result["response"])
+        result["metadata"].update({
+            "tokens_used": 0,
+            "history_tokens_saved": 0,
+            "cache_hit": True,
+            "cache_similarity": similarity,
+        })
+        logger.info(f"Semantic cache hit (similarity: {similarity:.3f})")
+        return result
+    
+    async def _record_turn(self, session_id: str, message: str, response: str) -> None:
+        """이번 턴(질문, 답변)을 대화 기록에 추가"""
+        await self.get_session_history(session_id).aadd_messages([
+            HumanMessage(content=message),
+            AIMessage(content=response),
+        ])
+    
+    async def _contextualize_question(self, message: str, chat_history: List[BaseMessage]) -> str:
+        """채팅 기록(압축된 기록)이 있으면 독립적인 검색 질문으로 재작성"""
+        if not chat_history:
+            return message
+        
+        return await self.question_rewriter.arewrite(message, chat_history)
     
     def _extract_sources(self, documents: List[Document]) -> List[Dict]:
         """개선된 소스 문서 메타데이터 추출 - sources 메타데이터 파싱 포함"""
@@ -363,71 +704,63 @@ class LangChainService:
             logger.debug(f"Error parsing sources from document: {e}")
             return []
     
-    async def add_documents(self, documents: List[Document]):
+    async def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None):
         """문서 추가"""
-        await self.vector_store.add_documents(documents)
+        await self.vector_store.add_documents(documents, ids=ids)
+    
+    async def delete_documents(self, ids: List[str]):
+        """문서 삭제"""
+        await self.vector_store.delete_documents(ids)
+    
+    async def aclose(self):
+        """외부 연결 정리 (애플리케이션 종료 시)"""
+        await self.vector_store.aclose()
+    
+    def cache_stats(self) -> Dict:
+        """캐시별 적중률 통계"""
+        query_cache = getattr(self.embeddings, "query_cache", None)
+        return {
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "query_embedding_cache": query_cache.stats() if query_cache is not None else None,
+            "question_rewriter": self.question_rewriter.stats(),
+            "coalesced_requests": self.coalesced_requests,
+            "cache_service": cache_service.stats(),
+        }
+    
+    def _register_metrics(self) -> None:
+        """스크랩 시점에 값을 읽는 게이지 등록 (요청 경로에는 비용 없음)"""
+        metrics_registry.gauge(
+            "chat_active_sessions", "만료되지 않은 대화 세션 수",
+            collect=lambda: {(): self.history_backend.active_sessions()},
+        )
+        metrics_registry.gauge(
+            "cache_hit_ratio", "캐시별 적중률", labelnames=("cache",),
+            collect=self._cache_hit_ratios,
+        )
+    
+    def _cache_hit_ratios(self) -> Dict[tuple, float]:
+        """cache_stats()를 게이지 레이블별 적중률로 변환"""
+        stats = self.cache_stats()
+        ratios = {}
+        for name in ("answer_cache", "query_embedding_cache"):
+            if stats[name] is not None:
+                ratios[(name,)] = stats[name]["hit_rate"]
+        rewriter = stats["question_rewriter"]
+        lookups = rewriter["cache_hits"] + rewriter["rewritten"]
+        if lookups:
+            ratios[("question_rewriter",)] = rewriter["cache_hits"] / lookups
+        for namespace, counters in stats["cache_service"].items():
+            ratios[(f"cache_service:{namespace}",)] = counters["hit_rate"]
+        return ratios
     
     def clear_memory(self, session_id: str):
         """특정 세션의 메모리 초기화"""
-        if session_id in self.chat_histories:
-            self.chat_histories[session_id].clear()
-            logger.info(f"Cleared memory for session: {session_id}")
+        self.history_backend.clear(session_id)
+        logger.info(f"Cleared memory for session: {session_id}")
     
     def _extract_keywords(self, query: str) -> List[str]:
         """질문에서 핵심 키워드 추출"""
-        # 메이플스토리 특화 키워드 패턴
-        maple_patterns = [
-            r'[가-힣]+\s*(?:보스|스킬|큐브|코인|포인트|이벤트|직업|클래스)',
-            r'(?:하드|이지|헬|카오스)\s*[가-힣]+',
-            r'[가-힣]+\s*(?:샵|상점)',
-            r'챌린저스?\s*[가-힣]*',
-            r'[가-힣]{2,}(?:렌|제로|카데나|일리움|호영|아델|카인|라라|아크)',
-        ]
-        
-        keywords = []
-        
-        # 패턴 매칭으로 키워드 추출
-        for pattern in maple_patterns:
-            matches = re.findall(pattern, query, re.IGNORECASE)
-            keywords.extend(matches)
-        
-        # 일반 명사 추출 (2글자 이상 한글)
-        general_keywords = re.findall(r'[가-힣]{2,}', query)
-        keywords.extend(general_keywords)
-        
-        # 중복 제거 및 소문자 변환
-        unique_keywords = list(set([kw.strip().lower() for kw in keywords if len(kw.strip()) > 1]))
-        
-        return unique_keywords[:10]  # 최대 10개로 제한
-    
-    def _calculate_title_relevance(self, title: str, query: str) -> float:
-        """문서 제목과 질문의 관련성 점수 계산"""
-        if not title:
-            return 0.0
-            
-        title_lower = title.lower()
-        query_lower = query.lower()
-        
-        # 직접 매칭 점수
-        direct_match = SequenceMatcher(None, title_lower, query_lower).ratio()
-        
-        # 키워드 매칭 점수
-        query_keywords = self._extract_keywords(query)
-        title_keywords = self._extract_keywords(title)
-        
-        keyword_matches = 0
-        for q_kw in query_keywords:
-            for t_kw in title_keywords:
-                if q_kw in t_kw or t_kw in q_kw:
-                    keyword_matches += 1
-                    break
-        
-        keyword_score = keyword_matches / max(len(query_keywords), 1)
-        
-        # 최종 점수 (직접 매칭 70% + 키워드 매칭 30%)
-        final_score = (direct_match * 0.7) + (keyword_score * 0.3)
-        
-        return min(final_score, 1.0)
+        return extract_keywords(query)
     
     def _validate_document_relevance(self, documents: List[Document], query: str) -> List[Document]:
         """문서 관련성 검증 및 필터링"""
@@ -435,33 +768,23 @@ class LangChainService:
             logger.info(f"Document filtering disabled - returning {len(documents)} documents as-is")
             return documents[:settings.max_reference_sources]
         
-        validated_docs = []
+        if not documents:
+            return []
+        
         query_keywords = self._extract_keywords(query)
         
-        for doc in documents:
-            # 1. 제목 관련성 검사
+        # 1~2. 제목/내용 관련성 (청크별 사전 계산 n-gram으로 일괄 계산)
+        scores = score_documents(query, documents, query_keywords)
+        
+        # 직업/서버/카테고리 일치는 검색 단계의 메타데이터 필터가 보장
+        validated_docs = []
+        for i, doc in enumerate(documents):
             title = doc.metadata.get('title', '')
-            title_relevance = self._calculate_title_relevance(title, query)
-            
-            # 2. 내용 키워드 매칭 검사
-            content_lower = doc.page_content.lower()
-            keyword_matches = sum(1 for kw in query_keywords if kw in content_lower)
-            content_relevance = keyword_matches / max(len(query_keywords), 1)
-            
-            # 3. 메타데이터 기반 관련성 검사
-            category = doc.metadata.get('category', '')
-            class_name = doc.metadata.get('class', '')
-            
-            # 직업명이 질문에 있는 경우 해당 직업 문서 우선
-            metadata_bonus = 0.0
-            for keyword in query_keywords:
-                if keyword in class_name.lower():
-                    metadata_bonus += 0.3
-                if keyword in category.lower():
-                    metadata_bonus += 0.2
             
             # 최종 관련성 점수 계산
-            final_relevance = (title_relevance * 0.4) + (content_relevance * 0.4) + metadata_bonus
+            final_relevance = float(
+                scores["title_relevance"][i] * 0.4 + scores["content_relevance"][i] * 0.4
+            )
             
             # 임계값 이상인 문서만 포함
             if final_relevance >= 0.3:  # 30% 이상 관련성
@@ -483,29 +806,26 @@ class LangChainService:
             return response
         
         validated_response = response
-        
-        # 1. 의심스러운 패턴 검사
-        suspicious_patterns = [
-            (r'\d+개(?:\s*(?:의|를|을|이|가))?', '구체적 수량'),
-            (r'[가-힣]+\s*큐브', '큐브 아이템'),
-            (r'[가-힣]+\s*스킬', '스킬명'),
-            (r'\d+(?:,\d{3})*\s*(?:메소|포인트|점수)', '수치 정보'),
-            (r'(?:대략|약|수십억|다수|여러|일반적으로|보통)', '모호한 표현'),
-        ]
-        
         warnings = []
         
-        for pattern, description in suspicious_patterns:
-            matches = re.findall(pattern, validated_response, re.IGNORECASE)
-            for match in matches:
-                # 문서에서 해당 내용 확인
-                if not self._verify_in_documents(match, documents):
-                    # 모호한 표현은 제거
-                    if description == '모호한 표현':
-                        validated_response = re.sub(pattern, '', validated_response, flags=re.IGNORECASE)
-                        warnings.append(f"모호한 표현 '{match}' 제거됨")
-                    else:
-                        warnings.append(f"검증되지 않은 {description}: '{match}'")
+        # 참고 문서 텍스트를 한 번만 소문자로 합쳐 두고 재사용
+        haystack = self._build_document_haystack(documents)
+        
+        # 1. 의심스러운 패턴 검사
+        for pattern, description in SUSPICIOUS_PATTERNS:
+            unverified = [
+                match for match in pattern.findall(validated_response)
+                if not self._verify_in_documents(match, haystack)
+            ]
+            if not unverified:
+                continue
+            
+            # 모호한 표현은 제거
+            if description == '모호한 표현':
+                validated_response = pattern.sub('', validated_response)
+                warnings.extend(f"모호한 표현 '{match}' 제거됨" for match in unverified)
+            else:
+                warnings.extend(f"검증되지 않은 {description}: '{match}'" for match in unverified)
         
         # 2. 관련 없는 문서 기반 답변 검사
         query_keywords = self._extract_keywords(query)
@@ -522,17 +842,28 @@ class LangChainService:
         
         return validated_response.strip()
     
-    def _verify_in_documents(self, text: str, documents: List[Document]) -> bool:
-        """텍스트가 참고 문서에 포함되어 있는지 확인"""
-        text_lower = text.lower().strip()
-        
+    def _build_document_haystack(self, documents: List[Document]) -> str:
+        """문서 내용과 문자열 메타데이터를 소문자로 합친 검색 대상 텍스트"""
+        parts = []
         for doc in documents:
-            if text_lower in doc.page_content.lower():
-                return True
-            
-            # 메타데이터에서도 확인
-            for key, value in doc.metadata.items():
-                if isinstance(value, str) and text_lower in value.lower():
-                    return True
-        
-        return False 
\ No newline at end of file
+            parts.append(doc.page_content.lower())
+            parts.extend(value.lower() for value in doc.metadata.values() if isinstance(value, str))
+        # 구분자를 넣어 서로 다른 필드에 걸친 매칭 방지
+        return "\x00".join(parts)
+    
+    def _verify_in_documents(self, text: str, haystack: str) -> bool:
+        """텍스트가 참고 문서에 포함되어 있는지 확인"""
+        return text.lower().strip() in haystack
+
+# 프로세스 전역 서비스 인스턴스 (main.lifespan에서 생성, 의존성 주입으로 공유)
+_langchain_service: Optional[LangChainService] = None
+_langchain_service_lock = threading.Lock()
+
+def get_langchain_service() -> LangChainService:
+    """공유 LangChainService 반환 - 최초 호출 시 한 번만 생성"""
+    global _langchain_service
+    if _langchain_service is None:
+        with _langchain_service_lock:
+            if _langchain_service is None:
+                _langchain_service = LangChainService()
+    return _langchain_service
@@ -0,0 +1,354 @@
+# app/services/local_vector_index.py
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+import json
+import math
+import os
+import threading
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Qdrant payload와 같은 구조 - 필터는 payload["metadata"]의 필드에 적용
+METADATA_FIELD = "metadata"
+
+# none: float32 그대로, scalar: 성분별 int8 (4배 절감), binary: 부호 1비트 (32배 절감)
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+# 16비트 값별 1비트 개수 (NumPy 1.x에는 popcount가 없음, 바이트 단위보다 조회 횟수 절반)
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+# 양자화 점수를 계산할 때 한 번에 처리할 행 수 (임시 float32 블록이 캐시에 들어가도록)
+_BLOCK_ROWS = 512
+
+class LocalPoint(NamedTuple):
+    """검색 결과 포인트 (Qdrant ScoredPoint와 같은 속성)"""
+    id: str
+    score: float
+    payload: Dict[str, Any]
+    vector: Optional[List[float]] = None
+
+class _Snapshot(NamedTuple):
+    """한 시점의 색인 상태 - 통째로 교체되어 검색 중 쓰기가 섞이지 않음"""
+    version: int
+    ids: List[str]
+    payloads: List[Dict[str, Any]]
+    vectors: np.ndarray
+    row_by_id: Dict[str, int]
+    field_index: Dict[str, Dict[Any, np.ndarray]]  # 필터 필드 -> 값 -> 행 번호 (필요 시 생성)
+    codes: Optional[np.ndarray] = None  # 양자화된 벡터 (후보 선정용)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+def _quantize(vectors: np.ndarray, mode: str) -> np.ndarray:
+    """정규화된 벡터 양자화 - 후보 순위에만 쓰므로 scalar 배율은 저장하지 않음"""
+    if mode == "binary":
+        return np.packbits(vectors > 0, axis=1)
+    # 성분 절댓값의 99% 분위수를 127에 대응 (이상치 몇 개가 해상도를 낮추지 않도록)
+    flat = vectors.reshape(-1)
+    sample = np.abs(flat[::max(1, flat.size // 100000)])
+    scale = float(np.quantile(sample, 0.99)) if sample.size else 1.0
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, len(vectors), _BLOCK_ROWS):
+        block = vectors[start:start + _BLOCK_ROWS] * (127.0 / (scale or 1.0))
+        codes[start:start + _BLOCK_ROWS] = np.clip(np.rint(block), -127, 127)
+    return codes
+
+def _approximate_scores(codes: np.ndarray, query: np.ndarray, mode: str) -> np.ndarray:
+    """양자화 벡터로 근사 점수 계산 (클수록 가까움)"""
+    if mode == "binary":
+        query_bits = np.packbits(query > 0)
+        if codes.shape[1] % 2:
+            # 16비트로 묶을 수 있도록 0 바이트 추가 (차원이 16의 배수가 아닌 경우)
+            codes = np.pad(codes, ((0, 0), (0, 1)))
+            query_bits = np.pad(query_bits, (0, 1))
+        codes16 = np.ascontiguousarray(codes).view(np.uint16)
+        query16 = query_bits.view(np.uint16)
+        # 해밍 거리가 작을수록 가까우므로 부호를 바꿔 점수로 사용
+        return -np.concatenate([
+            _POPCOUNT16[np.bitwise_xor(codes16[start:start + _BLOCK_ROWS * 16], query16)].sum(axis=1, dtype=np.int32)
+            for start in range(0, len(codes16), _BLOCK_ROWS * 16)
+        ])
+    return np.concatenate([
+        codes[start:start + _BLOCK_ROWS].astype(np.float32) @ query
+        for start in range(0, len(codes), _BLOCK_ROWS)
+    ])
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """점수 상위 k개 위치 (전체 정렬 대신 상위 k개만 골라 정렬)"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+    return np.argsort(-scores)
+
+def _field_values(value: Any) -> Iterable:
+    """필터 색인에 넣을 값 (리스트 필드는 원소별로, 없거나 빈 값은 None)"""
+    if isinstance(value, (list, tuple, set)):
+        return value or (None,)
+    return (value,)
+
+class LocalVectorIndex:
+    """네트워크 없이 프로세스 안에서 검색하는 정확한 코사인 벡터 색인
+
+    정규화된 float32 벡터를 `{name}.npy`에 두고 메모리 맵으로 읽으며,
+    ID/payload는 `{name}.payloads.json` 사이드카에 저장합니다.
+    검색은 행렬-벡터 곱 한 번으로 전체 점수를 계산한 뒤 top-k를 고릅니다 (수천 청크 규모용).
+    양자화를 켜면 `{name}.{quantization}.npy`의 작은 벡터로 top-k × oversampling개 후보를 고르고,
+    디스크의 원본 벡터는 후보 행만 읽어 정확한 점수로 다시 정렬합니다.
+    다른 프로세스(수집 스크립트 등)가 파일을 바꾸면 refresh()에서 다시 읽습니다.
+    """
+
+    def __init__(self, directory: str, name: str, quantization: str = "none", oversampling: float = 3.0):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization: {quantization} (expected one of {QUANTIZATION_MODES})")
+        self.directory = Path(directory)
+        self.vectors_path = self.directory / f"{name}.npy"
+        self.payloads_path = self.directory / f"{name}.payloads.json"
+        self.codes_path = self.directory / f"{name}.{quantization}.npy"
+        self.quantization = quantization
+        self.oversampling = oversampling
+
+        self._snapshot = self._make_snapshot(0, [], [], np.zeros((0, 0), dtype=np.float32))
+        self._loaded_mtime: Optional[int] = None
+        self._write_lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.ids)
+
+    @property
+    def version(self) -> int:
+        """쓰기마다 증가하는 버전 (코퍼스 버전으로 사용)"""
+        return self._snapshot.version
+
+    @property
+    def dimension(self) -> int:
+        vectors = self._snapshot.vectors
+        return vectors.shape[1] if vectors.ndim == 2 else 0
+
+    @property
+    def vector_bytes(self) -> int:
+        """검색 시 전체를 읽는 벡터 크기 (양자화하면 원본은 후보 행만 읽음)"""
+        snapshot = self._snapshot
+        return (snapshot.codes if snapshot.codes is not None else snapshot.vectors).nbytes
+
+    @staticmethod
+    def _make_snapshot(
+        version: int, ids: List[str], payloads: List[Dict], vectors: np.ndarray, codes: Optional[np.ndarray] = None
+    ) -> _Snapshot:
+        return _Snapshot(version, ids, payloads, vectors, {point_id: row for row, point_id in enumerate(ids)}, {}, codes)
+
+    def _write_codes(self, vectors: np.ndarray) -> None:
+        """양자화 벡터 파일을 원자적으로 교체"""
+        tmp_codes = self.codes_path.with_suffix(".npy.tmp")
+        with open(tmp_codes, "wb") as f:
+            np.save(f, _quantize(vectors, self.quantization))
+        os.replace(tmp_codes, self.codes_path)
+
+    def _load_codes(self, vectors: np.ndarray) -> Optional[np.ndarray]:
+        """양자화 벡터 로드 - 없거나 원본보다 오래됐으면(설정 변경 등) 원본에서 다시 생성"""
+        if self.quantization == "none":
+            return None
+        try:
+            if os.stat(self.codes_path).st_mtime_ns >= os.stat(self.vectors_path).st_mtime_ns:
+                codes = np.load(self.codes_path, mmap_mode="r")
+                if codes.shape[0] == vectors.shape[0]:
+                    return codes
+        except (OSError, ValueError):
+            pass
+        logger.info(f"Building {self.quantization} quantized vectors for {len(vectors)} points")
+        self._write_codes(vectors)
+        return np.load(self.codes_path, mmap_mode="r")
+
+    def refresh(self) -> "LocalVectorIndex":
+        """파일이 바뀌었으면 다시 로드 (stat 한 번이라 요청마다 호출해도 됨)"""
+        try:
+            mtime = os.stat(self.payloads_path).st_mtime_ns
+        except FileNotFoundError:
+            return self
+        if mtime == self._loaded_mtime:
+            return self
+
+        try:
+            with open(self.payloads_path, encoding="utf-8") as f:
+                sidecar = json.load(f)
+            vectors = np.load(self.vectors_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load local vector index {self.payloads_path}: {e}")
+            return self
+
+        if vectors.shape[0] != len(sidecar["ids"]):
+            # 다른 프로세스가 쓰는 중 - 다음 refresh에서 다시 시도
+            logger.debug("Local vector index is being written, keeping previous state")
+            return self
+
+        self._snapshot = self._make_snapshot(
+            sidecar["version"], sidecar["ids"], sidecar["payloads"], vectors, self._load_codes(vectors)
+        )
+        self._loaded_mtime = mtime
+        logger.info(f"Loaded local vector index: {len(self)} vectors (version {self.version})")
+        return self
+
+    def _save(self, ids: List[str], payloads: List[Dict], vectors: np.ndarray) -> None:
+        """벡터 → 양자화 벡터 → 사이드카 순서로 원자적 교체 (사이드카 mtime이 다시 읽기 신호)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        version = self.version + 1
+
+        tmp_vectors = self.vectors_path.with_suffix(".npy.tmp")
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp_vectors, self.vectors_path)
+        if self.quantization != "none":
+            self._write_codes(vectors)
+
+        tmp_payloads = self.payloads_path.with_suffix(".json.tmp")
+        with open(tmp_payloads, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "ids": ids, "payloads": payloads}, f, ensure_ascii=False)
+        os.replace(tmp_payloads, self.payloads_path)
+
+        codes = np.load(self.codes_path, mmap_mode="r") if self.quantization != "none" else None
+        self._snapshot = self._make_snapshot(
+            version, ids, payloads, np.load(self.vectors_path, mmap_mode="r"), codes
+        )
+        self._loaded_mtime = os.stat(self.payloads_path).st_mtime_ns
+
+    def upsert(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> None:
+        """포인트 추가 - 같은 ID는 덮어씀"""
+        if not ids:
+            return
+        new_vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._write_lock:
+            self.refresh()
+            if len(self) and new_vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Vector dimension mismatch: index has {self.dimension}, got {new_vectors.shape[1]}"
+                )
+
+            snapshot = self._snapshot
+            all_ids = list(snapshot.ids)
+            all_payloads = list(snapshot.payloads)
+            matrix = np.array(snapshot.vectors) if all_ids else np.zeros((0, new_vectors.shape[1]), dtype=np.float32)
+            rows = dict(snapshot.row_by_id)
+            appended = []
+            for point_id, vector, payload in zip(ids, new_vectors, payloads):
+                point_id = str(point_id)
+                if point_id in rows:
+                    matrix[rows[point_id]] = vector
+                    all_payloads[rows[point_id]] = payload
+                else:
+                    rows[point_id] = len(all_ids)
+                    all_ids.append(point_id)
+                    all_payloads.append(payload)
+                    appended.append(vector)
+            if appended:
+                matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)])
+            self._save(all_ids, all_payloads, matrix)
+
+    def delete(self, ids: List[str]) -> None:
+        """ID로 포인트 삭제"""
+        with self._write_lock:
+            self.refresh()
+            snapshot = self._snapshot
+            removed = {str(point_id) for point_id in ids}
+            keep = [row for row, point_id in enumerate(snapshot.ids) if point_id not in removed]
+            if len(keep) == len(snapshot.ids):
+                return
+            self._save(
+                [snapshot.ids[row] for row in keep],
+                [snapshot.payloads[row] for row in keep],
+                np.array(snapshot.vectors[keep]) if keep else np.zeros((0, self.dimension), dtype=np.float32),
+            )
+
+    @staticmethod
+    def _rows_for_field(snapshot: _Snapshot, field: str) -> Dict[Any, np.ndarray]:
+        """메타데이터 필드의 값별 행 번호 (처음 필터링할 때 생성)"""
+        index = snapshot.field_index.get(field)
+        if index is None:
+            rows: Dict[Any, List[int]] = {}
+            for row, payload in enumerate(snapshot.payloads):
+                value = (payload.get(METADATA_FIELD) or {}).get(field)
+                for item in _field_values(value):
+                    try:
+                        rows.setdefault(item, []).append(row)
+                    except TypeError:
+                        continue  # dict 등 필터로 쓸 수 없는 값
+            index = {value: np.asarray(items, dtype=np.int64) for value, items in rows.items()}
+            snapshot.field_index[field] = index
+        return index
+
+    def _filter_rows(self, snapshot: _Snapshot, query_filter: Dict[str, Any]) -> np.ndarray:
+        """필터 조건을 만족하는 행 - 필드끼리는 AND, 리스트 값은 OR (None은 필드가 없는 행)"""
+        selected: Optional[np.ndarray] = None
+        empty = np.zeros(0, dtype=np.int64)
+        for field, expected in query_filter.items():
+            index = self._rows_for_field(snapshot, field)
+            matches = [index.get(value, empty) for value in _field_values(expected)]
+            rows = np.unique(np.concatenate(matches)) if matches else empty
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+            if not len(selected):
+                break
+        return selected if selected is not None else np.arange(len(snapshot.ids), dtype=np.int64)
+
+    def query(
+        self,
+        vector: List[float],
+        limit: int,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False
+    ) -> List[LocalPoint]:
+        """코사인 top-k 검색 (양자화 시 후보를 원본 벡터로 재점수)"""
+        snapshot = self._snapshot
+        vectors = snapshot.vectors
+        if not snapshot.ids or limit <= 0:
+            return []
+
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        rows = self._filter_rows(snapshot, query_filter) if query_filter else None
+        if snapshot.codes is not None:
+            rows = self._quantized_candidates(snapshot, query, rows, limit)
+        scores = (vectors[rows] if rows is not None else vectors) @ query
+        top = _top_k(scores, limit)
+
+        points = []
+        for position in top:
+            score = float(scores[position])
+            if score_threshold is not None and score < score_threshold:
+                break
+            row = int(rows[position]) if rows is not None else int(position)
+            points.append(LocalPoint(
+                id=snapshot.ids[row],
+                score=score,
+                payload=snapshot.payloads[row],
+                vector=vectors[row].tolist() if with_vectors else None,
+            ))
+        return points
+
+    def _quantized_candidates(
+        self, snapshot: _Snapshot, query: np.ndarray, rows: Optional[np.ndarray], limit: int
+    ) -> np.ndarray:
+        """양자화 벡터로 limit × oversampling개 후보 행 선정 (원본 파일 순서로 정렬해 읽기)"""
+        codes = snapshot.codes[rows] if rows is not None else snapshot.codes
+        if not len(codes):
+            return np.zeros(0, dtype=np.int64)
+        approximate = _approximate_scores(codes, query, self.quantization)
+        candidates = _top_k(approximate, max(limit, math.ceil(limit * self.oversampling)))
+        if rows is not None:
+            candidates = rows[candidates]
+        return np.sort(candidates)
+
+    def scroll(self, with_vectors: bool = False) -> List[LocalPoint]:
+        """모든 포인트 (BM25 색인 생성용은 벡터 제외, 마이그레이션은 포함)"""
+        snapshot = self._snapshot
+        return [
+            LocalPoint(
+                id=point_id, score=0.0, payload=payload,
+                vector=snapshot.vectors[row].tolist() if with_vectors else None
+            )
+            for row, (point_id, payload) in enumerate(zip(snapshot.ids, snapshot.payloads))
+        ]
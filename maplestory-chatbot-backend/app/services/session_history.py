@@ -0,0 +1,273 @@
+# app/services/session_history.py
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from pathlib import Path
+import json
+import sqlite3
+import threading
+import time
+import logging
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class HistoryBackend:
+    """세션별 대화 기록 저장소 인터페이스 - 세션당 최근 max_messages개만 보관"""
+
+    def __init__(self, max_turns: int = 20, ttl: int = 7 * 86400):
+        self.max_messages = max_turns * 2  # 1턴 = 질문 + 답변
+        self.ttl = ttl
+
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        raise NotImplementedError
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        raise NotImplementedError
+
+    def clear(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def active_sessions(self) -> int:
+        """만료되지 않은 세션 수 (메트릭용)"""
+        raise NotImplementedError
+
+class InMemoryHistoryBackend(HistoryBackend):
+    """프로세스 메모리 저장소 - 세션 수 LRU 한도 + 마지막 사용 기준 TTL"""
+
+    def __init__(self, max_sessions: int = 10000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Tuple[float, List[BaseMessage]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _get_entry(self, session_id: str) -> Optional[List[BaseMessage]]:
+        """만료되지 않은 세션 기록 반환 (lock을 잡은 상태에서 호출)"""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, messages = entry
+        if expires_at <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        return messages
+
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            messages = self._get_entry(session_id)
+            if messages is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(messages)
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            stored = (self._get_entry(session_id) or []) + list(messages)
+            self._sessions[session_id] = (time.monotonic() + self.ttl, stored[-self.max_messages:])
+            self._sessions.move_to_end(session_id)
+
+            # 가장 오래 사용하지 않은 세션부터 제거
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def active_sessions(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for expires_at, _ in self._sessions.values() if expires_at > now)
+
+class RedisHistoryBackend(HistoryBackend):
+    """Redis 리스트 저장소 - 워커 간 공유, RPUSH + LTRIM + EXPIRE를 한 번에 실행
+
+    활성 세션은 (세션 ID → 만료 시각) 정렬 집합으로 따로 관리해 키 공간을 훑지 않고 셉니다.
+    """
+
+    def __init__(self, redis_client, key_prefix: str = "chat_history", **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}:{session_id}"
+
+    @property
+    def _sessions_key(self) -> str:
+        # 세션 키(prefix:ID)와 겹치지 않는 이름
+        return f"{self.key_prefix}_sessions"
+
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        raw_messages = self.redis_client.lrange(self._key(session_id), 0, -1)
+        return messages_from_dict([json.loads(raw) for raw in raw_messages])
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        key = self._key(session_id)
+        pipe = self.redis_client.pipeline()
+        pipe.rpush(key, *[json.dumps(item, ensure_ascii=False) for item in messages_to_dict(messages)])
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        pipe.zadd(self._sessions_key, {session_id: time.time() + self.ttl})
+        pipe.expire(self._sessions_key, self.ttl)
+        pipe.execute()
+
+    def clear(self, session_id: str) -> None:
+        pipe = self.redis_client.pipeline()
+        pipe.delete(self._key(session_id))
+        pipe.zrem(self._sessions_key, session_id)
+        pipe.execute()
+
+    def active_sessions(self) -> int:
+        # 만료 시각이 지난 세션을 정렬 집합에서 지운 뒤 개수 조회 (O(log N), 키 스캔 없음)
+        pipe = self.redis_client.pipeline()
+        pipe.zremrangebyscore(self._sessions_key, "-inf", time.time())
+        pipe.zcard(self._sessions_key)
+        return pipe.execute()[-1]
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """SQLite 저장소 - 같은 호스트의 워커 간 공유 (Redis가 없는 단일 서버 배포용)"""
+
+    # 이 횟수만큼 쓸 때마다 만료된 세션 정리
+    _PURGE_INTERVAL = 500
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id);
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions (updated_at);
+            """
+        )
+        self._conn.commit()
+
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[0] + self.ttl <= time.time():
+                return []
+            rows = self._conn.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return messages_from_dict([json.loads(message) for (message,) in rows])
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        rows = [(session_id, json.dumps(item, ensure_ascii=False)) for item in messages_to_dict(messages)]
+        now = time.time()
+
+        with self._lock:
+            # 만료된 세션이면 이전 기록을 버리고 새로 시작
+            row = self._conn.execute(
+                "SELECT updated_at FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and row[0] + self.ttl <= now:
+                self._conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+
+            self._conn.executemany("INSERT INTO chat_messages (session_id, message) VALUES (?, ?)", rows)
+            # 최근 max_messages개만 남김
+            self._conn.execute(
+                "DELETE FROM chat_messages WHERE session_id = ? AND id NOT IN ("
+                "SELECT id FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, updated_at) VALUES (?, ?)",
+                (session_id, now)
+            )
+
+            self._writes += 1
+            if self._writes % self._PURGE_INTERVAL == 0:
+                self._purge_expired(now)
+            self._conn.commit()
+
+    def _purge_expired(self, now: float) -> None:
+        """만료된 세션 일괄 삭제 (lock을 잡은 상태에서 호출)"""
+        cutoff = now - self.ttl
+        self._conn.execute(
+            "DELETE FROM chat_messages WHERE session_id IN "
+            "(SELECT session_id FROM chat_sessions WHERE updated_at <= ?)", (cutoff,)
+        )
+        self._conn.execute("DELETE FROM chat_sessions WHERE updated_at <= ?", (cutoff,))
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def active_sessions(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM chat_sessions WHERE updated_at > ?", (time.time() - self.ttl,)
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        """DB 연결 종료"""
+        with self._lock:
+            self._conn.close()
+
+class SessionChatMessageHistory(BaseChatMessageHistory):
+    """저장소에 위임하는 세션 대화 기록 - LangChainService가 요청마다 한 번 조회하고 턴을 추가"""
+
+    def __init__(self, session_id: str, backend: HistoryBackend):
+        self.session_id = session_id
+        self.backend = backend
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.backend.get_messages(self.session_id)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.backend.add_messages(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.backend.clear(self.session_id)
+
+def create_history_backend() -> HistoryBackend:
+    """설정에 따라 대화 기록 저장소 생성 (Redis 연결 실패 시 메모리로 대체)"""
+    backend_type = settings.session_history_backend
+    common = {
+        "max_turns": settings.session_history_max_turns,
+        "ttl": settings.session_history_ttl,
+    }
+
+    if backend_type == "redis":
+        from app.utils.cache import cache_service
+        if cache_service.redis_client is not None:
+            logger.info("Using Redis session history backend")
+            return RedisHistoryBackend(cache_service.redis_client, **common)
+        logger.warning("Redis unavailable for session history - falling back to in-memory backend")
+    elif backend_type == "sqlite":
+        logger.info(f"Using SQLite session history backend: {settings.session_history_sqlite_path}")
+        return SQLiteHistoryBackend(settings.session_history_sqlite_path, **common)
+
+    return InMemoryHistoryBackend(max_sessions=settings.session_history_max_sessions, **common)
@@ -38,7 +38,8 @@ class UserLogService:
         vector_scores: Optional[List[float]] = None,
         model_used: Optional[str] = None,
         tokens_used: Optional[int] = None,
-        context: Optional[Dict[str, Any]] = None
+        context: Optional[Dict[str, Any]] = None,
+        stage_timings_ms: Optional[Dict[str, float]] = None
     ) -> str:
         """사용자 상호작용 로그 기록"""
         try:
@@ -59,6 +60,7 @@ class UserLogService:
                 sources_count=len(sources_used) if sources_used else 0,
                 model_used=model_used,
                 tokens_used=tokens_used,
+                stage_timings_ms=stage_timings_ms or {},
                 context=context or {}
             )
             
@@ -1,24 +1,99 @@
 # app/services/vector_store.py
-try:
-    from langchain_qdrant import Qdrant
-except ImportError:
-    from langchain_community.vectorstores import Qdrant
-
 from langchain_community.vectorstores import Chroma, FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from langchain.schema import Document
-from typing import List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from typing import List, Optional, Tuple, Any, Dict
 from app.config import settings
+from app.config.metadata_config import metadata_config
+from app.utils.sparse_index import BM25Index, reciprocal_rank_fusion
+from app.utils.relevance import build_ngram_features, CONTENT_NGRAMS_KEY, TITLE_NGRAMS_KEY
+from app.utils.query_filters import extract_metadata_filter, matches_metadata_filter
+from app.utils.cache import cache_service
+from app.services.corpus_version import CorpusVersionStore
+from app.services.local_vector_index import LocalVectorIndex, QUANTIZATION_MODES
+from app.services.embedding_service import reproject_embeddings
+from app.utils.tracing import stage_span, STAGE_QUERY_EMBEDDING, STAGE_VECTOR_SEARCH
+from app.utils.metrics import QDRANT_SECONDS
+import asyncio
 import logging
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+import os
+import uuid
+import numpy as np
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList, Filter, FieldCondition, MatchValue, MatchAny,
+    IsEmptyCondition, PayloadField, PayloadSchemaType, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, Disabled, SearchParams, QuantizationSearchParams, Datatype
+)
 
 logger = logging.getLogger(__name__)
 
+# LangChain Qdrant 래퍼와 같은 payload 키 (기존 컬렉션과 호환)
+CONTENT_PAYLOAD_KEY = "page_content"
+METADATA_PAYLOAD_KEY = "metadata"
+NGRAM_PAYLOAD_KEYS = (CONTENT_NGRAMS_KEY, TITLE_NGRAMS_KEY)
+
+FAISS_INDEX_PATH = "./data/faiss"
+
+class VectorStoreRetriever(BaseRetriever):
+    """VectorStoreService.search 기반 리트리버 (Qdrant/로컬 색인) - as_retriever()와 같은 search_type/search_kwargs 사용"""
+    vector_store_service: Any
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = {}
+    metadata_filtering: bool = False  # 질문의 직업/서버를 검색 필터로 사용
+    
+    def _filter_kwargs(self, query: str) -> Dict[str, Any]:
+        """질문에서 추출한 메타데이터 필터 (맞는 문서가 없으면 필터 없이 검색)"""
+        if not self.metadata_filtering:
+            return {}
+        query_filter = extract_metadata_filter(query)
+        if not query_filter:
+            return {}
+        logger.debug(f"Metadata filter for '{query}': {query_filter}")
+        return {"filter": query_filter, "relax_filter": True}
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """동기 검색 (스크립트용)"""
+        return self.vector_store_service.search_sync(
+            query, search_type=self.search_type, query_vector=query_vector,
+            **self.search_kwargs, **self._filter_kwargs(query)
+        )
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """비동기 검색 - 이벤트 루프를 막지 않음 (query_vector가 있으면 질문 임베딩 생략)"""
+        return await self.vector_store_service.search(
+            query, search_type=self.search_type, query_vector=query_vector,
+            **self.search_kwargs, **self._filter_kwargs(query)
+        )
+
 class VectorStoreService:
-    def __init__(self, embeddings):
+    def __init__(self, embeddings, verify_vector_size: bool = True):
         self.embeddings = embeddings
+        # 기존 컬렉션 차원 검사 (이전 차원 컬렉션을 읽는 마이그레이션에서는 끔)
+        self.verify_vector_size = verify_vector_size
         self.client = None
+        self.async_client = None
+        self.local_index: Optional[LocalVectorIndex] = None  # vector_store_type == "local"
+        self.sparse_index: Optional[BM25Index] = None  # 하이브리드 검색용 BM25 색인 (필요 시 생성)
+        self._sparse_index_version: Optional[str] = None  # 색인을 만든 시점의 코퍼스 버전
+        self._sparse_index_lock = asyncio.Lock()
         self.vector_store = self._initialize_vector_store()
+        # 문서 추가/삭제 시 증가 - 캐시 키와 BM25 색인 갱신에 사용 (워커 간 공유)
+        self.corpus_version = CorpusVersionStore(
+            settings.collection_name,
+            redis_provider=cache_service.get_async_client,
+            qdrant_client=self.async_client,
+            local_index=self.local_index,
+            refresh_interval=settings.corpus_version_refresh_interval
+        )
     
     def _initialize_vector_store(self):
         """벡터 스토어 초기화"""
@@ -36,17 +111,30 @@ class VectorStoreService:
             if "localhost" in settings.qdrant_url or "127.0.0.1" in settings.qdrant_url:
                 client_kwargs["verify"] = False
                 
+            # 관리 작업(컬렉션 생성 등)용 동기 클라이언트
             self.client = QdrantClient(**client_kwargs)
             
+            # 검색/업서트용 비동기 클라이언트 (연결 풀 공유)
+            self.async_client = AsyncQdrantClient(
+                pool_size=settings.qdrant_pool_size,
+                **client_kwargs
+            )
+            
             # 컬렉션 존재 여부 확인 및 생성
             self._ensure_collection_exists()
             
-            # LangChain Qdrant 래퍼 반환
-            return Qdrant(
-                client=self.client,
-                collection_name=settings.collection_name,
-                embeddings=self.embeddings
+            # Qdrant는 LangChain 래퍼 없이 클라이언트를 직접 사용
+            return None
+        
+        elif settings.vector_store_type == "local":
+            # 프로세스 내 NumPy 색인 - Qdrant와 같은 payload 구조로 네트워크 없이 검색
+            self.local_index = LocalVectorIndex(
+                settings.local_index_path,
+                settings.collection_name,
+                quantization=settings.vector_quantization,
+                oversampling=settings.quantization_oversampling
             )
+            return None
         
         elif settings.vector_store_type == "chroma":
             return Chroma(
@@ -56,21 +144,48 @@ class VectorStoreService:
             )
         
         elif settings.vector_store_type == "faiss":
-            # FAISS는 로컬에서만 사용
+            # FAISS는 로컬에서만 사용 - 저장된 색인이 없을 때만 새로 생성
+            if not os.path.exists(os.path.join(FAISS_INDEX_PATH, "index.faiss")):
+                logger.info(f"No FAISS index at {FAISS_INDEX_PATH}, creating an empty index")
+                return self._create_empty_faiss()
             try:
+                # 직접 저장한 색인이므로 pickle 역직렬화 허용
                 return FAISS.load_local(
-                    "./data/faiss", 
-                    self.embeddings
-                )
-            except:
-                return FAISS.from_texts(
-                    ["초기화"], 
-                    self.embeddings
+                    FAISS_INDEX_PATH,
+                    self.embeddings,
+                    allow_dangerous_deserialization=True
                 )
+            except Exception as e:
+                # 빈 색인으로 대체하면 다음 저장 때 기존 색인을 덮어쓰므로 그대로 실패
+                logger.error(f"Failed to load FAISS index from {FAISS_INDEX_PATH}: {e}")
+                raise
         
         else:
             raise ValueError(f"Unknown vector store type: {settings.vector_store_type}")
     
+    def _create_empty_faiss(self):
+        """문서 없는 FAISS 색인 생성"""
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        
+        dimension = len(self.embeddings.embed_query("test"))
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=faiss.IndexFlatL2(dimension),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+    
+    def _save_faiss(self):
+        """FAISS 색인을 디스크에 저장 (재시작 후 로드)"""
+        if settings.vector_store_type == "faiss":
+            self.vector_store.save_local(FAISS_INDEX_PATH)
+    
+    @property
+    def _uses_points(self) -> bool:
+        """Qdrant/로컬 색인처럼 payload 포인트를 직접 검색하는지 (LangChain 래퍼가 아닌지)"""
+        return self.async_client is not None or self.local_index is not None
+    
     def _ensure_collection_exists(self):
         """컬렉션이 없으면 생성"""
         try:
@@ -91,23 +206,20 @@ class VectorStoreService:
                     # 기본 차원 설정
                     provider = settings.get_embedding_provider()
                     if provider == "voyage":
-                        vector_size = 1024  # voyage-3.5-lite 기본 차원
+                        vector_size = settings.voyage_output_dimension or 1024  # voyage-3.5-lite 기본 차원
                     elif provider == "openai":
                         vector_size = 1536  # text-embedding-ada-002 기본 차원
                     else:
                         vector_size = 384   # 대부분의 HuggingFace 모델 기본 차원
                 
                 # 컬렉션 생성
-                self.client.create_collection(
-                    collection_name=settings.collection_name,
-                    vectors_config=VectorParams(
-                        size=vector_size,
-                        distance=Distance.COSINE
-                    )
-                )
-                logger.info(f"Created collection: {settings.collection_name} with dimension {vector_size}")
+                self._create_collection(settings.collection_name, vector_size)
             else:
                 logger.info(f"Collection already exists: {settings.collection_name}")
+                if self.verify_vector_size:
+                    self._check_vector_size()
+                self._ensure_quantization()
+                self._ensure_payload_indexes()
                 
         except Exception as e:
             logger.error(f"Error ensuring collection exists: {str(e)}")
@@ -123,7 +235,95 @@ class VectorStoreService:
             else:
                 raise
     
-    def get_retriever(self, k: int = 5, search_type: str = "similarity_score_threshold"):
+    def _create_collection(self, collection_name: str, vector_size: int, output_dtype: Optional[str] = None):
+        """컬렉션 생성 (양자화/저장 타입 설정과 payload 색인 포함) - output_dtype은 저장할 벡터의 Voyage 출력 타입"""
+        # 양자화 시 원본 벡터는 디스크에 두고 양자화 벡터만 메모리에 유지
+        quantization_config = self._quantization_config()
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(
+                size=vector_size,
+                distance=Distance.COSINE,
+                on_disk=quantization_config is not None,
+                datatype=self._vector_datatype(output_dtype)
+            ),
+            quantization_config=quantization_config
+        )
+        logger.info(f"Created collection: {collection_name} with dimension {vector_size}")
+        self._ensure_payload_indexes(collection_name)
+    
+    @staticmethod
+    def _vector_datatype(output_dtype: Optional[str] = None) -> Optional[Datatype]:
+        """Voyage가 int8/binary로 반환하면 float16으로 저장 (8비트 값이라 정밀도 손실이 거의 없음)
+
+        output_dtype이 없으면 현재 임베딩 설정(VOYAGE_OUTPUT_DTYPE)을 따릅니다.
+        """
+        if output_dtype is None:
+            if settings.get_embedding_provider() != "voyage":
+                return None
+            output_dtype = settings.voyage_output_dtype
+        return Datatype.FLOAT16 if output_dtype != "float" else None
+    
+    def _check_vector_size(self):
+        """기존 컬렉션 차원이 설정된 Voyage 출력 차원과 다르면 시작 시 실패 (그대로 두면 모든 검색이 실패)"""
+        if settings.get_embedding_provider() != "voyage" or settings.voyage_output_dimension is None:
+            return
+        vectors_config = self.client.get_collection(settings.collection_name).config.params.vectors
+        current = getattr(vectors_config, "size", None)
+        if current is not None and current != settings.voyage_output_dimension:
+            raise ValueError(
+                f"Collection {settings.collection_name} has dimension {current} but "
+                f"VOYAGE_OUTPUT_DIMENSION={settings.voyage_output_dimension}; "
+                f"run scripts/migrate_embeddings.py or re-ingest documents"
+            )
+    
+    @staticmethod
+    def _quantization_config():
+        """설정된 양자화 방식의 Qdrant 설정 (none이면 None)"""
+        if settings.vector_quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown vector_quantization: {settings.vector_quantization}")
+        if settings.vector_quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if settings.vector_quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+    
+    def _ensure_quantization(self):
+        """기존 컬렉션의 양자화 방식이 설정과 다르면 변경 (Qdrant가 백그라운드에서 다시 생성)"""
+        current = self.client.get_collection(settings.collection_name).config.quantization_config
+        current_mode = (
+            "scalar" if isinstance(current, ScalarQuantization)
+            else "binary" if isinstance(current, BinaryQuantization)
+            else "none"
+        )
+        if current_mode == settings.vector_quantization:
+            return
+        quantization_config = self._quantization_config()
+        self.client.update_collection(
+            collection_name=settings.collection_name,
+            quantization_config=quantization_config if quantization_config is not None else Disabled.DISABLED
+        )
+        logger.info(f"Changed collection quantization: {current_mode} -> {settings.vector_quantization}")
+    
+    def _ensure_payload_indexes(self, collection_name: Optional[str] = None):
+        """필터 필드의 keyword payload 색인 생성 - 필터 검색이 전체 스캔 없이 후보만 확인"""
+        collection_name = collection_name or settings.collection_name
+        collection_info = self.client.get_collection(collection_name)
+        existing = set((collection_info.payload_schema or {}).keys())
+        for field in metadata_config.filter_fields:
+            key = f"{METADATA_PAYLOAD_KEY}.{field}"
+            if key in existing:
+                continue
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=key,
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+            logger.info(f"Created payload index: {key}")
+    
+    def get_retriever(self, k: int = 5, search_type: str = "similarity_score_threshold", metadata_filtering: bool = False):
         """리트리버 반환 - 관련성 강화된 검색 설정"""
         search_kwargs = {"k": k}
         
@@ -140,33 +340,476 @@ class VectorStoreService:
                 "lambda_mult": 0.9  # 관련성을 최대한 중시 (0.8 -> 0.9)
             })
         
+        # 하이브리드 검색 - 밀집 벡터 + BM25 후보를 넉넉히 가져와 RRF로 결합
+        elif search_type == "hybrid":
+            if not self._uses_points:
+                logger.warning(f"Hybrid search requires qdrant or local, falling back to similarity ({settings.vector_store_type})")
+                search_type = "similarity"
+            else:
+                search_kwargs.update({
+                    "fetch_k": k * settings.hybrid_fetch_multiplier
+                })
+        
         # 기본 유사도 검색 - 가장 관련성 높은 문서 우선
         elif search_type == "similarity":
             # 추가 설정 없이 순수 유사도 기반 검색
             pass
         
+        if self._uses_points:
+            return VectorStoreRetriever(
+                vector_store_service=self,
+                search_type=search_type,
+                search_kwargs=search_kwargs,
+                metadata_filtering=metadata_filtering
+            )
+        
         return self.vector_store.as_retriever(
             search_type=search_type,
             search_kwargs=search_kwargs
         )
     
-    async def add_documents(self, documents: List[Document]):
-        """문서 추가"""
+    @staticmethod
+    def _payload_metadata(payload: Dict) -> Dict:
+        """payload의 메타데이터 (관련성 검증용 사전 계산 n-gram 포함)"""
+        metadata = dict(payload.get(METADATA_PAYLOAD_KEY) or {})
+        for key in NGRAM_PAYLOAD_KEYS:
+            if key in payload:
+                metadata[key] = payload[key]
+        return metadata
+    
+    @staticmethod
+    def _to_document(point) -> Document:
+        """Qdrant 포인트를 Document로 변환 (유사도 점수는 metadata['score'])"""
+        payload = point.payload or {}
+        metadata = VectorStoreService._payload_metadata(payload)
+        metadata["_id"] = point.id
+        metadata["score"] = point.score
+        return Document(page_content=payload.get(CONTENT_PAYLOAD_KEY, ""), metadata=metadata)
+    
+    def _query_kwargs(
+        self,
+        embedding: List[float],
+        search_type: str,
+        k: int,
+        score_threshold: Optional[float],
+        fetch_k: int,
+        query_filter
+    ) -> Dict:
+        """query_points 인자 구성"""
+        is_mmr = search_type == "mmr"
+        kwargs = {
+            "collection_name": settings.collection_name,
+            "query": embedding,
+            "limit": fetch_k if is_mmr else k,
+            "query_filter": query_filter,
+            "score_threshold": score_threshold if search_type == "similarity_score_threshold" else None,
+            "with_payload": True,
+            "with_vectors": is_mmr,
+        }
+        if settings.vector_quantization != "none":
+            # 양자화 벡터로 limit × oversampling개 후보를 뽑고 원본 벡터로 재점수 (로컬 색인은 자체 처리)
+            kwargs["search_params"] = SearchParams(
+                quantization=QuantizationSearchParams(rescore=True, oversampling=settings.quantization_oversampling)
+            )
+        return kwargs
+    
+    def _select_results(
+        self, embedding: List[float], points: List, search_type: str, k: int, lambda_mult: float
+    ) -> List[Document]:
+        """검색 결과 선택 (MMR이면 다양성 재정렬)"""
+        if search_type == "mmr" and points:
+            selected = maximal_marginal_relevance(
+                np.array(embedding, dtype=np.float32),
+                [point.vector for point in points],
+                k=k,
+                lambda_mult=lambda_mult
+            )
+            points = [points[i] for i in selected]
+        return [self._to_document(point) for point in points[:k]]
+    
+    @staticmethod
+    def _build_sparse_index(points: List) -> BM25Index:
+        """Qdrant 포인트 payload로 BM25 색인 생성"""
+        entries = []
+        for point in points:
+            payload = point.payload or {}
+            content = payload.get(CONTENT_PAYLOAD_KEY, "")
+            metadata = VectorStoreService._payload_metadata(payload)
+            # 제목도 색인에 포함해 정확한 용어 매칭 강화
+            text = f"{metadata.get('title', '')}\n{content}"
+            entries.append((point.id, text, (content, metadata)))
+        index = BM25Index().build(entries)
+        logger.info(f"Built BM25 index over {len(index)} chunks")
+        return index
+    
+    async def _scroll_points(self, with_vectors: bool = False) -> List:
+        """컬렉션의 모든 포인트 (기본은 payload만)"""
+        if self.local_index is not None:
+            return self.local_index.scroll(with_vectors=with_vectors)
+        
+        points = []
+        offset = None
+        while True:
+            with QDRANT_SECONDS.time("scroll"):
+                batch, offset = await self.async_client.scroll(
+                    collection_name=settings.collection_name,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=with_vectors
+                )
+            points.extend(batch)
+            if offset is None:
+                return points
+    
+    def _scroll_points_sync(self) -> List:
+        """컬렉션의 모든 포인트 (동기 버전)"""
+        if self.local_index is not None:
+            return self.local_index.scroll()
+        
+        points = []
+        offset = None
+        while True:
+            with QDRANT_SECONDS.time("scroll"):
+                batch, offset = self.client.scroll(
+                    collection_name=settings.collection_name,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False
+                )
+            points.extend(batch)
+            if offset is None:
+                return points
+    
+    async def get_corpus_version(self) -> str:
+        """현재 코퍼스 버전 (캐시 키에 포함)"""
+        return await self.corpus_version.get()
+    
+    async def _get_sparse_index(self) -> BM25Index:
+        """BM25 색인 반환 - 없거나 코퍼스가 바뀌었으면 컬렉션 전체를 스크롤해 생성"""
+        # 다른 워커/수집 스크립트가 문서를 바꿨으면 버전이 달라짐
+        version = await self.corpus_version.get()
+        if self.sparse_index is not None and self._sparse_index_version == version:
+            return self.sparse_index
+        
+        async with self._sparse_index_lock:
+            if self.sparse_index is None or self._sparse_index_version != version:
+                self.sparse_index = self._build_sparse_index(await self._scroll_points())
+                self._sparse_index_version = version
+            return self.sparse_index
+    
+    def _get_sparse_index_sync(self) -> BM25Index:
+        """BM25 색인 반환 (동기 버전 - 마지막으로 조회한 코퍼스 버전 기준)"""
+        version = self.corpus_version.current
+        if self.sparse_index is None or self._sparse_index_version != version:
+            self.sparse_index = self._build_sparse_index(self._scroll_points_sync())
+            self._sparse_index_version = version
+        return self.sparse_index
+    
+    @staticmethod
+    def _filter_sparse_hits(sparse_hits: List, query_filter) -> List:
+        """BM25 후보에도 메타데이터 필터 적용 (밀집 검색은 DB에서 필터링)"""
+        if not isinstance(query_filter, dict) or not query_filter:
+            return sparse_hits
+        return [
+            (point_id, (content, metadata), score)
+            for point_id, (content, metadata), score in sparse_hits
+            if matches_metadata_filter(metadata, query_filter)
+        ]
+    
+    def _fuse_results(self, dense_points: List, sparse_hits: List, k: int) -> List[Document]:
+        """밀집 / BM25 순위를 RRF로 결합"""
+        dense_by_id = {point.id: point for point in dense_points}
+        sparse_by_id = {point_id: (item, score) for point_id, item, score in sparse_hits}
+        
+        fused = reciprocal_rank_fusion(
+            [[point.id for point in dense_points], [point_id for point_id, _, _ in sparse_hits]],
+            k=settings.hybrid_rrf_k
+        )
+        
+        documents = []
+        for point_id, rrf_score in fused[:k]:
+            if point_id in dense_by_id:
+                doc = self._to_document(dense_by_id[point_id])
+            else:
+                (content, metadata), _ = sparse_by_id[point_id]
+                doc = Document(page_content=content, metadata={**metadata, "_id": point_id, "score": 0.0})
+            
+            doc.metadata["rrf_score"] = rrf_score
+            if point_id in sparse_by_id:
+                doc.metadata["bm25_score"] = sparse_by_id[point_id][1]
+            documents.append(doc)
+        return documents
+    
+    async def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None):
+        """문서 추가 - ids를 주면 같은 ID의 포인트를 덮어씀 (upsert)"""
         try:
-            # 동기 메서드 사용 (LangChain Qdrant는 async를 완전히 지원하지 않음)
-            self.vector_store.add_documents(documents)
+            if not self._uses_points:
+                # 동기 메서드 사용 (Chroma/FAISS)
+                self.vector_store.add_documents(documents, ids=ids)
+                self._save_faiss()
+                logger.info(f"Added {len(documents)} documents to vector store")
+                await self.corpus_version.bump()
+                return
+            
+            ids = ids or [str(uuid.uuid4()) for _ in documents]
+            embeddings = await self.embeddings.aembed_documents([doc.page_content for doc in documents])
+            payloads = [
+                {
+                    CONTENT_PAYLOAD_KEY: doc.page_content,
+                    METADATA_PAYLOAD_KEY: doc.metadata,
+                    # 검색 후 관련성 검증에서 재사용할 n-gram 집합
+                    **build_ngram_features(doc.metadata.get("title", ""), doc.page_content)
+                }
+                for doc in documents
+            ]
+            
+            if self.local_index is not None:
+                # 파일 쓰기는 스레드에서 (검색은 이전 스냅샷으로 계속 처리)
+                await asyncio.to_thread(self.local_index.upsert, ids, embeddings, payloads)
+            else:
+                points = [
+                    PointStruct(id=point_id, vector=embedding, payload=payload)
+                    for point_id, embedding, payload in zip(ids, embeddings, payloads)
+                ]
+                batch_size = settings.qdrant_upsert_batch_size
+                for start in range(0, len(points), batch_size):
+                    with QDRANT_SECONDS.time("upsert"):
+                        await self.async_client.upsert(
+                            collection_name=settings.collection_name,
+                            points=points[start:start + batch_size],
+                            wait=True
+                        )
             logger.info(f"Added {len(documents)} documents to vector store")
+            self.sparse_index = None  # 코퍼스 변경 - 다음 하이브리드 검색 시 재생성
+            await self.corpus_version.bump()
         except Exception as e:
             logger.error(f"Error adding documents: {str(e)}")
             raise
     
-    async def search(self, query: str, k: int = 5) -> List[Document]:
-        """유사도 검색"""
-        # 동기 메서드 사용
-        return self.vector_store.similarity_search(query, k=k)
+    async def delete_documents(self, ids: List[str]):
+        """ID로 문서 삭제"""
+        if not ids:
+            return
+        try:
+            if self.local_index is not None:
+                await asyncio.to_thread(self.local_index.delete, ids)
+            elif self.async_client is None:
+                self.vector_store.delete(ids=ids)
+                self._save_faiss()
+            else:
+                with QDRANT_SECONDS.time("delete"):
+                    await self.async_client.delete(
+                        collection_name=settings.collection_name,
+                        points_selector=PointIdsList(points=ids),
+                        wait=True
+                    )
+            logger.info(f"Deleted {len(ids)} documents from vector store")
+            self.sparse_index = None
+            await self.corpus_version.bump()
+        except Exception as e:
+            logger.error(f"Error deleting documents: {str(e)}")
+            raise
+    
+    async def migrate_collection(self, target_collection: str, dimension: int, output_dtype: str = "float") -> int:
+        """현재 컬렉션의 벡터를 재투영해 새 컬렉션에 복사 (재임베딩 없이 Matryoshka 차원 축소)
+
+        원본 컬렉션은 그대로 두므로, 확인 후 COLLECTION_NAME을 새 컬렉션으로 바꾸면 됩니다.
+        """
+        if not self._uses_points:
+            raise ValueError(f"Migration is not supported for vector_store_type={settings.vector_store_type}")
+        if target_collection == settings.collection_name:
+            raise ValueError("Target collection must differ from the current collection")
+        
+        points = await self._scroll_points(with_vectors=True)
+        if not points:
+            logger.warning(f"Collection {settings.collection_name} is empty, nothing to migrate")
+            return 0
+        vectors = reproject_embeddings(np.asarray([point.vector for point in points]), dimension, output_dtype)
+        ids = [point.id for point in points]
+        payloads = [point.payload for point in points]
+        
+        if self.local_index is not None:
+            target = LocalVectorIndex(
+                settings.local_index_path,
+                target_collection,
+                quantization=settings.vector_quantization,
+                oversampling=settings.quantization_oversampling
+            )
+            await asyncio.to_thread(target.upsert, ids, vectors.tolist(), payloads)
+        else:
+            self._create_collection(target_collection, dimension, output_dtype)
+            batch_size = settings.qdrant_upsert_batch_size
+            for start in range(0, len(points), batch_size):
+                with QDRANT_SECONDS.time("upsert"):
+                    await self.async_client.upsert(
+                        collection_name=target_collection,
+                        points=[
+                            PointStruct(id=point_id, vector=vector.tolist(), payload=payload)
+                            for point_id, vector, payload in zip(
+                                ids[start:start + batch_size],
+                                vectors[start:start + batch_size],
+                                payloads[start:start + batch_size]
+                            )
+                        ],
+                        wait=True
+                    )
+        logger.info(
+            f"Migrated {len(points)} points: {settings.collection_name} -> {target_collection} "
+            f"({dimension} dims, {output_dtype})"
+        )
+        return len(points)
+    
+    @staticmethod
+    def _qdrant_filter(query_filter):
+        """메타데이터 필터 dict를 Qdrant Filter로 변환 (Filter는 그대로)
+
+        필드끼리는 AND, 리스트 값은 OR이며 None은 필드가 없거나 빈 문서와 일치합니다.
+        """
+        if not isinstance(query_filter, dict):
+            return query_filter
+        conditions = []
+        for field, value in query_filter.items():
+            key = f"{METADATA_PAYLOAD_KEY}.{field}"
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            allow_empty = None in values
+            values = [item for item in values if item is not None]
+            
+            options = []
+            if len(values) == 1:
+                options.append(FieldCondition(key=key, match=MatchValue(value=values[0])))
+            elif values:
+                options.append(FieldCondition(key=key, match=MatchAny(any=values)))
+            if allow_empty:
+                options.append(IsEmptyCondition(is_empty=PayloadField(key=key)))
+            conditions.append(options[0] if len(options) == 1 else Filter(should=options))
+        return Filter(must=conditions) if conditions else None
+    
+    def _query_local(self, query, limit, query_filter=None, score_threshold=None, with_vectors=False, **kwargs) -> List:
+        """로컬 색인 검색 - _query_kwargs와 같은 인자 (행렬-벡터 곱 한 번이라 이벤트 루프에서 바로 실행)"""
+        if query_filter is not None and not isinstance(query_filter, dict):
+            raise ValueError("Local vector index supports dict metadata filters only")
+        return self.local_index.query(
+            query, limit, score_threshold=score_threshold, query_filter=query_filter, with_vectors=with_vectors
+        )
+    
+    async def _query_points(self, **kwargs) -> List:
+        """벡터 검색 결과 포인트 (Qdrant는 지연 시간 기록)"""
+        if self.local_index is not None:
+            return self._query_local(**kwargs)
+        kwargs["query_filter"] = self._qdrant_filter(kwargs["query_filter"])
+        with QDRANT_SECONDS.time("query"):
+            return (await self.async_client.query_points(**kwargs)).points
+    
+    def _query_points_sync(self, **kwargs) -> List:
+        """벡터 검색 결과 포인트 (동기 버전)"""
+        if self.local_index is not None:
+            return self._query_local(**kwargs)
+        kwargs["query_filter"] = self._qdrant_filter(kwargs["query_filter"])
+        with QDRANT_SECONDS.time("query"):
+            return self.client.query_points(**kwargs).points
+    
+    async def search(
+        self,
+        query: str,
+        k: int = 5,
+        search_type: str = "similarity",
+        score_threshold: Optional[float] = None,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter=None,
+        relax_filter: bool = False,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """유사도 검색 - Qdrant는 비동기 클라이언트, 로컬 색인은 프로세스 내에서 직접 검색
+
+        filter는 메타데이터 필드 dict ({"category": "boss_guide"}, 리스트 값은 OR) 또는 Qdrant Filter.
+        relax_filter면 필터에 맞는 문서가 없을 때 같은 임베딩으로 필터 없이 다시 검색합니다.
+        query_vector는 이미 계산한 같은 질문의 임베딩 (답변 캐시 조회용 벡터 재사용).
+        """
+        if not self._uses_points:
+            # 동기 메서드 사용
+            with stage_span(STAGE_VECTOR_SEARCH):
+                return self.vector_store.similarity_search(query, k=k)
+        
+        embedding = query_vector
+        if embedding is None:
+            with stage_span(STAGE_QUERY_EMBEDDING):
+                embedding = await self.embeddings.aembed_query(query)
+        
+        if search_type == "hybrid":
+            with stage_span(STAGE_VECTOR_SEARCH):
+                points, sparse_index = await asyncio.gather(
+                    self._query_points(**self._query_kwargs(embedding, "similarity", fetch_k, None, fetch_k, filter)),
+                    self._get_sparse_index()
+                )
+                if not points and filter and relax_filter:
+                    points = await self._query_points(**self._query_kwargs(embedding, "similarity", fetch_k, None, fetch_k, None))
+                    filter = None
+                return self._fuse_results(points, self._filter_sparse_hits(sparse_index.search(query, fetch_k), filter), k)
+        
+        with stage_span(STAGE_VECTOR_SEARCH):
+            points = await self._query_points(
+                **self._query_kwargs(embedding, search_type, k, score_threshold, fetch_k, filter)
+            )
+            if not points and filter and relax_filter:
+                logger.debug(f"No documents match filter {filter}, searching without it")
+                points = await self._query_points(
+                    **self._query_kwargs(embedding, search_type, k, score_threshold, fetch_k, None)
+                )
+        return self._select_results(embedding, points, search_type, k, lambda_mult)
+    
+    def search_sync(
+        self,
+        query: str,
+        k: int = 5,
+        search_type: str = "similarity",
+        score_threshold: Optional[float] = None,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter=None,
+        relax_filter: bool = False,
+        query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """동기 유사도 검색 (스크립트 등 이벤트 루프 밖에서 사용)"""
+        if not self._uses_points:
+            return self.vector_store.similarity_search(query, k=k)
+        
+        embedding = query_vector if query_vector is not None else self.embeddings.embed_query(query)
+        
+        if search_type == "hybrid":
+            points = self._query_points_sync(**self._query_kwargs(embedding, "similarity", fetch_k, None, fetch_k, filter))
+            if not points and filter and relax_filter:
+                points = self._query_points_sync(**self._query_kwargs(embedding, "similarity", fetch_k, None, fetch_k, None))
+                filter = None
+            sparse_hits = self._get_sparse_index_sync().search(query, fetch_k)
+            return self._fuse_results(points, self._filter_sparse_hits(sparse_hits, filter), k)
+        
+        points = self._query_points_sync(**self._query_kwargs(embedding, search_type, k, score_threshold, fetch_k, filter))
+        if not points and filter and relax_filter:
+            points = self._query_points_sync(**self._query_kwargs(embedding, search_type, k, score_threshold, fetch_k, None))
+        return self._select_results(embedding, points, search_type, k, lambda_mult)
+    
+    async def aclose(self):
+        """클라이언트 연결 종료"""
+        if self.async_client is not None:
+            await self.async_client.close()
+        if self.client is not None:
+            self.client.close()
     
     def get_collection_info(self):
         """컬렉션 정보 반환"""
+        if self.local_index is not None:
+            self.local_index.refresh()
+            return {
+                "name": settings.collection_name,
+                "vectors_count": len(self.local_index),
+                "points_count": len(self.local_index),
+                "status": "local",
+                "quantization": self.local_index.quantization,
+                "vector_bytes": self.local_index.vector_bytes
+            }
         if self.client:
             try:
                 collection_info = self.client.get_collection(settings.collection_name)
@@ -1,18 +1,79 @@
-from functools import lru_cache
+from collections import OrderedDict, defaultdict
+from typing import Optional, Any, Dict, List, Tuple, Callable, Awaitable
+import asyncio
 import hashlib
 import json
+import threading
+import time
 import redis
-from typing import Optional, Any
+import redis.asyncio as aioredis
 from app.config import settings
+from app.utils.embedding_cache import normalize_query
 import logging
 
 logger = logging.getLogger(__name__)
 
+# L1에 저장하는 "Redis에도 없음" 표시 (negative caching)
+_NEGATIVE = object()
+
+class LocalTTLCache:
+    """프로세스 내 TTL + LRU 캐시 (L1)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        """만료되지 않은 값 반환 (없으면 None, negative 항목은 _NEGATIVE)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
 class CacheService:
-    """Redis 기반 캐시 서비스"""
-    
+    """2단계 캐시 서비스 - L1 프로세스 메모리(TTL/LRU) + L2 Redis
+
+    비동기 메서드(aget/aset/amget/amset/get_or_set)는 redis.asyncio 커넥션 풀을 사용해
+    이벤트 루프를 막지 않습니다. 풀은 실행 중인 이벤트 루프에서 처음 사용할 때 만들어
+    그 루프에 묶입니다 (TestClient, 스크립트의 asyncio.run 등 루프가 바뀌면 새로 생성).
+    동기 메서드(get/set/delete)와 redis_client는
+    스레드에서 실행되는 동기 코드(대화 기록 저장소 등)용입니다.
+    키는 "네임스페이스:..." 형식이며 통계는 네임스페이스별로 집계합니다.
+    """
+
     def __init__(self):
-        self.redis_client = None
+        self.redis_client = None  # 동기 클라이언트 (스레드/시작 시점용)
+        self._async_client = None  # 비동기 클라이언트 (요청 처리용, 첫 사용 시 생성)
+        self._async_loop = None  # _async_client가 묶인 이벤트 루프
+        self.l1 = LocalTTLCache(settings.cache_l1_max_entries)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
         if settings.redis_url:
             try:
                 self.redis_client = redis.from_url(settings.redis_url)
@@ -21,42 +82,250 @@ class CacheService:
             except Exception as e:
                 logger.warning(f"Redis 연결 실패: {e}")
                 self.redis_client = None
-    
+
+    @property
+    def async_client(self):
+        """현재 이벤트 루프용 비동기 클라이언트 (Redis가 없거나 루프 밖이면 None)"""
+        if self.redis_client is None:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        if self._async_client is None or self._async_loop is not loop:
+            # 다른 루프에서 만든 커넥션은 이 루프에서 쓸 수 없으므로 새 풀 생성
+            self._async_client = aioredis.Redis(
+                connection_pool=aioredis.ConnectionPool.from_url(
+                    settings.redis_url, max_connections=settings.redis_max_connections
+                )
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    def get_async_client(self):
+        """async_client 조회 함수 (생성 시점이 아닌 사용 시점에 클라이언트가 필요한 객체용)"""
+        return self.async_client
+
     def _generate_key(self, prefix: str, data: Any) -> str:
         """캐시 키 생성"""
         data_str = json.dumps(data, sort_keys=True)
         hash_key = hashlib.md5(data_str.encode()).hexdigest()
         return f"{prefix}:{hash_key}"
-    
-    def get(self, key: str) -> Optional[str]:
-        """캐시에서 값 조회"""
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    def _count(self, key: str, event: str, amount: int = 1) -> None:
+        self._stats[self._namespace(key)][event] += amount
+
+    def _l1_ttl(self, ttl: Optional[int]) -> float:
+        """L1 TTL은 L2보다 짧게 - 다른 워커의 갱신/삭제가 늦어도 l1_ttl 안에 반영"""
+        return min(ttl or settings.cache_ttl, settings.cache_l1_ttl)
+
+    def _from_l1(self, key: str) -> Tuple[bool, Optional[Any]]:
+        """L1 조회 - (찾음 여부, 값)"""
+        value = self.l1.get(key)
+        if value is None:
+            return False, None
+        if value is _NEGATIVE:
+            self._count(key, "negative_hits")
+            return True, None
+        self._count(key, "l1_hits")
+        return True, value
+
+    def _fill_l1(self, key: str, value: Optional[Any], ttl: Optional[int] = None) -> None:
+        """L2 조회 결과를 L1에 채움 - 없는 키는 짧은 TTL로 negative 캐싱"""
+        if value is None:
+            self.l1.set(key, _NEGATIVE, settings.cache_negative_ttl)
+            self._count(key, "misses")
+        else:
+            self.l1.set(key, value, self._l1_ttl(ttl))
+            self._count(key, "l2_hits")
+
+    # --- 비동기 API ---
+
+    async def aget(self, key: str, use_l1: bool = True) -> Optional[Any]:
+        """캐시에서 값 조회 (L1 → Redis)"""
+        if use_l1:
+            found, value = self._from_l1(key)
+            if found:
+                return value
+
+        if not self.async_client:
+            self._count(key, "misses")
+            return None
+
+        try:
+            value = await self.async_client.get(key)
+        except Exception as e:
+            logger.error(f"캐시 조회 실패: {e}")
+            self._count(key, "errors")
+            return None
+
+        if use_l1:
+            self._fill_l1(key, value)
+        else:
+            self._count(key, "l2_hits" if value is not None else "misses")
+        return value
+
+    async def aset(self, key: str, value: Any, ttl: int = None, use_l1: bool = True) -> bool:
+        """캐시에 값 저장 (L1 + Redis)"""
+        ttl = ttl or settings.cache_ttl
+        if use_l1:
+            self.l1.set(key, value, self._l1_ttl(ttl))
+        self._count(key, "sets")
+
+        if not self.async_client:
+            return False
+        try:
+            await self.async_client.setex(key, ttl, value)
+            return True
+        except Exception as e:
+            logger.error(f"캐시 저장 실패: {e}")
+            self._count(key, "errors")
+            return False
+
+    async def amget(self, keys: List[str]) -> List[Optional[Any]]:
+        """여러 키 일괄 조회 - L1에 없는 키만 한 번의 MGET으로 조회"""
+        results: List[Optional[Any]] = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            found, value = self._from_l1(key)
+            if found:
+                results[i] = value
+            else:
+                missing.append(i)
+
+        if not missing:
+            return results
+        if not self.async_client:
+            for i in missing:
+                self._count(keys[i], "misses")
+            return results
+
+        try:
+            values = await self.async_client.mget([keys[i] for i in missing])
+        except Exception as e:
+            logger.error(f"캐시 일괄 조회 실패: {e}")
+            for i in missing:
+                self._count(keys[i], "errors")
+            return results
+
+        for i, value in zip(missing, values):
+            self._fill_l1(keys[i], value)
+            results[i] = value
+        return results
+
+    async def amset(self, items: Dict[str, Any], ttl: int = None) -> bool:
+        """여러 키 일괄 저장 - 파이프라인으로 SETEX를 한 번에 전송"""
+        if not items:
+            return True
+        ttl = ttl or settings.cache_ttl
+        for key, value in items.items():
+            self.l1.set(key, value, self._l1_ttl(ttl))
+            self._count(key, "sets")
+
+        if not self.async_client:
+            return False
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"캐시 일괄 저장 실패: {e}")
+            for key in items:
+                self._count(key, "errors")
+            return False
+
+    async def adelete(self, key: str) -> bool:
+        """캐시에서 값 삭제"""
+        self.l1.delete(key)
+        if not self.async_client:
+            return False
+        try:
+            await self.async_client.delete(key)
+            return True
+        except Exception as e:
+            logger.error(f"캐시 삭제 실패: {e}")
+            return False
+
+    async def get_or_set(self, key: str, factory: Callable[[], Awaitable[Any]], ttl: int = None) -> Any:
+        """캐시에 없으면 factory로 생성해 저장 - 같은 키의 동시 요청은 한 번만 생성 (single-flight)"""
+        value = await self.aget(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._count(key, "coalesced")
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+            if value is not None:
+                await self.aset(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # 대기자가 없으면 "exception was never retrieved" 경고 방지
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    # --- 동기 API (스레드에서 실행되는 코드용) ---
+
+    def get(self, key: str, use_l1: bool = True) -> Optional[Any]:
+        """캐시에서 값 조회 (동기)"""
+        if use_l1:
+            found, value = self._from_l1(key)
+            if found:
+                return value
         if not self.redis_client:
+            self._count(key, "misses")
             return None
-        
+
         try:
-            return self.redis_client.get(key)
+            value = self.redis_client.get(key)
         except Exception as e:
             logger.error(f"캐시 조회 실패: {e}")
+            self._count(key, "errors")
             return None
-    
-    def set(self, key: str, value: str, ttl: int = None) -> bool:
-        """캐시에 값 저장"""
+        if use_l1:
+            self._fill_l1(key, value)
+        else:
+            self._count(key, "l2_hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: Any, ttl: int = None, use_l1: bool = True) -> bool:
+        """캐시에 값 저장 (동기)"""
+        ttl = ttl or settings.cache_ttl
+        if use_l1:
+            self.l1.set(key, value, self._l1_ttl(ttl))
+        self._count(key, "sets")
         if not self.redis_client:
             return False
-        
+
         try:
-            ttl = ttl or settings.cache_ttl
             self.redis_client.setex(key, ttl, value)
             return True
         except Exception as e:
             logger.error(f"캐시 저장 실패: {e}")
+            self._count(key, "errors")
             return False
-    
+
     def delete(self, key: str) -> bool:
-        """캐시에서 값 삭제"""
+        """캐시에서 값 삭제 (동기)"""
+        self.l1.delete(key)
         if not self.redis_client:
             return False
-        
+
         try:
             self.redis_client.delete(key)
             return True
@@ -64,15 +333,37 @@ class CacheService:
             logger.error(f"캐시 삭제 실패: {e}")
             return False
 
+    def stats(self) -> Dict[str, Dict]:
+        """네임스페이스별 캐시 통계"""
+        result = {}
+        for namespace, counters in list(self._stats.items()):
+            counters = dict(counters)
+            hits = counters.get("l1_hits", 0) + counters.get("l2_hits", 0)
+            lookups = hits + counters.get("negative_hits", 0) + counters.get("misses", 0)
+            counters["hit_rate"] = hits / lookups if lookups else 0.0
+            result[namespace] = counters
+        return result
+
+    async def aclose(self) -> None:
+        """현재 루프의 비동기 Redis 풀 정리 (다음 사용 시 다시 생성)"""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.aclose()
+
 # 전역 캐시 인스턴스
 cache_service = CacheService()
 
-@lru_cache(maxsize=100)
-def get_cached_response(query_hash: str):
-    """메모리 캐시를 사용한 응답 조회"""
-    return cache_service.get(f"response:{query_hash}")
+def _response_key(query: str, corpus_version: str) -> str:
+    """정규화된 질문 + 코퍼스 버전 기준 응답 캐시 키 (문서가 바뀌면 키가 달라짐)"""
+    return f"response:{corpus_version}:{hashlib.md5(normalize_query(query).encode()).hexdigest()}"
+
+async def get_cached_response(query: str, corpus_version: str) -> Optional[str]:
+    """캐시된 응답 조회 (L1 → Redis)"""
+    value = await cache_service.aget(_response_key(query, corpus_version))
+    return value.decode() if isinstance(value, bytes) else value
 
-def cache_response(query: str, response: str) -> None:
+async def cache_response(query: str, response: str, corpus_version: str) -> None:
     """응답을 캐시에 저장"""
-    query_hash = hashlib.md5(query.encode()).hexdigest()
-    cache_service.set(f"response:{query_hash}", response) 
\ No newline at end of file
+    await cache_service.aset(_response_key(query, corpus_version), response)
@@ -0,0 +1,311 @@
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import logging
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(text: str) -> str:
+    """캐시 키용 질문 정규화 (유니코드 정규화, 소문자, 공백 정리)"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class QueryEmbeddingCache:
+    """질문 임베딩 LRU 캐시 - 메모리(바이트 한도 + TTL) 1차, Redis 2차"""
+
+    def __init__(
+        self,
+        model: str,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: int = 86400,
+        cache_service=None
+    ):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_service = cache_service  # 선택적 Redis 2차 캐시
+
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 통계
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _make_key(self, text: str) -> str:
+        """모델명 + 정규화된 질문 해시로 키 생성"""
+        digest = hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()
+        return f"qemb:{self.model}:{digest}"
+
+    def _get_local(self, key: str) -> Optional[List[float]]:
+        """메모리 캐시 조회"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector.tolist()
+                # 만료된 항목 제거
+                self._remove(key)
+        return None
+
+    def _from_redis(self, key: str, raw: Optional[bytes]) -> Optional[List[float]]:
+        """Redis 조회 결과 처리 (적중 시 메모리에 채움)"""
+        if raw:
+            vector = np.frombuffer(raw, dtype=np.float32)
+            self._store(key, vector)
+            with self._lock:
+                self.redis_hits += 1
+            return vector.tolist()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """캐시된 임베딩 조회 (없으면 None)"""
+        key = self._make_key(text)
+        cached = self._get_local(key)
+        if cached is not None:
+            return cached
+
+        # 2차 캐시 (Redis) 조회 - 메모리 캐시가 L1 역할이므로 CacheService의 L1은 사용하지 않음
+        raw = self.cache_service.get(key, use_l1=False) if self.cache_service is not None else None
+        return self._from_redis(key, raw)
+
+    async def aget(self, text: str) -> Optional[List[float]]:
+        """비동기 버전 - Redis 조회가 이벤트 루프를 막지 않음"""
+        key = self._make_key(text)
+        cached = self._get_local(key)
+        if cached is not None:
+            return cached
+
+        raw = await self.cache_service.aget(key, use_l1=False) if self.cache_service is not None else None
+        return self._from_redis(key, raw)
+
+    def set(self, text: str, embedding: List[float]) -> None:
+        """임베딩 저장 (float32로 보관)"""
+        key = self._make_key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._store(key, vector)
+
+        if self.cache_service is not None:
+            self.cache_service.set(key, vector.tobytes(), ttl=self.ttl, use_l1=False)
+
+    async def aset(self, text: str, embedding: List[float]) -> None:
+        """비동기 버전"""
+        key = self._make_key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._store(key, vector)
+
+        if self.cache_service is not None:
+            await self.cache_service.aset(key, vector.tobytes(), ttl=self.ttl, use_l1=False)
+
+    def _store(self, key: str, vector: np.ndarray) -> None:
+        """메모리 캐시에 저장하고 바이트 한도를 넘으면 오래된 항목부터 제거"""
+        if vector.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._bytes += vector.nbytes
+
+            while self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def _remove(self, key: str) -> None:
+        """항목 제거 (lock을 잡은 상태에서 호출)"""
+        _, vector = self._entries.pop(key)
+        self._bytes -= vector.nbytes
+
+    def reset(self, model: Optional[str] = None) -> None:
+        """메모리 캐시 비우기 - 모델이 바뀌면 새 모델명으로 키 공간 교체"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if model is not None and model != self.model:
+                logger.info(f"Query embedding cache invalidated: {self.model} -> {model}")
+                self.model = model
+
+    def stats(self) -> Dict:
+        """캐시 통계 반환"""
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "model": self.model,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0
+            }
+
+class DocumentEmbeddingCache:
+    """문서 청크 임베딩 영구 캐시 - (provider, model, sha256(청크)) 키로 float32 벡터를 SQLite에 저장"""
+
+    # SQLite 바인딩 변수 한도를 넘지 않도록 조회를 나눔
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (provider, model, text_hash)
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """청크 내용 해시"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, provider: str, model: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """여러 해시의 벡터를 한 번에 조회 (없는 해시는 결과에서 제외)"""
+        found = {}
+        unique_hashes = list(dict.fromkeys(text_hashes))
+
+        with self._lock:
+            for start in range(0, len(unique_hashes), self._LOOKUP_BATCH):
+                batch = unique_hashes[start:start + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE provider = ? AND model = ? AND text_hash IN ({placeholders})",
+                    [provider, model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+        return found
+
+    def put_many(self, provider: str, model: str, items: Dict[str, List[float]]) -> None:
+        """해시 → 벡터 저장"""
+        if not items:
+            return
+
+        rows = []
+        for text_hash, embedding in items.items():
+            vector = np.asarray(embedding, dtype=np.float32)
+            rows.append((provider, model, text_hash, vector.shape[0], vector.tobytes()))
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (provider, model, text_hash, dim, vector) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def count(self, provider: Optional[str] = None, model: Optional[str] = None) -> int:
+        """저장된 벡터 수"""
+        query = "SELECT COUNT(*) FROM embeddings"
+        params = []
+        if provider and model:
+            query += " WHERE provider = ? AND model = ?"
+            params = [provider, model]
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def close(self) -> None:
+        """DB 연결 종료"""
+        with self._lock:
+            self._conn.close()
+
+class CachedDocumentEmbeddings(Embeddings):
+    """문서 임베딩 캐시를 거치는 임베딩 래퍼 - 변경된 청크만 실제 API 호출"""
+
+    def __init__(self, embeddings: Embeddings, cache: DocumentEmbeddingCache, provider: str, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.provider = provider
+        self.model_key = model
+
+        # 통계
+        self.cached_count = 0
+        self.embedded_count = 0
+
+    def __getattr__(self, name):
+        # model, query_cache 등 원본 임베딩 속성은 그대로 노출
+        return getattr(self.__dict__["embeddings"], name)
+
+    def _split_cached(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        """캐시 적중 벡터와 새로 임베딩할 텍스트 분리"""
+        text_hashes = [self.cache.hash_text(text) for text in texts]
+        cached = self.cache.get_many(self.provider, self.model_key, text_hashes)
+
+        # 캐시에 없는 텍스트 (중복 청크는 한 번만 임베딩)
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        return text_hashes, cached, list(missing.items())
+
+    def _merge(self, text_hashes: List[str], cached: Dict[str, List[float]],
+               missing: List[Tuple[str, str]], new_embeddings: List[List[float]]) -> List[List[float]]:
+        """새 벡터를 캐시에 저장하고 입력 순서대로 결과 조립"""
+        new_items = {text_hash: embedding for (text_hash, _), embedding in zip(missing, new_embeddings)}
+        self.cache.put_many(self.provider, self.model_key, new_items)
+
+        self.cached_count += len(text_hashes) - len(missing)
+        self.embedded_count += len(missing)
+        if text_hashes:
+            logger.info(
+                f"Document embeddings: {len(text_hashes) - len(missing)} cached, "
+                f"{len(missing)} embedded"
+            )
+
+        vectors = {**cached, **new_items}
+        return [vectors[text_hash] for text_hash in text_hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """캐시에 없는 청크만 임베딩"""
+        text_hashes, cached, missing = self._split_cached(texts)
+        new_embeddings = self.embeddings.embed_documents([text for _, text in missing]) if missing else []
+        return self._merge(text_hashes, cached, missing, new_embeddings)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """비동기 버전 - SQLite 조회/저장은 스레드에서 (서버 이벤트 루프를 막지 않음)"""
+        text_hashes, cached, missing = await asyncio.to_thread(self._split_cached, texts)
+        new_embeddings = await self.embeddings.aembed_documents([text for _, text in missing]) if missing else []
+        return await asyncio.to_thread(self._merge, text_hashes, cached, missing, new_embeddings)
+
+    def embed_query(self, text: str) -> List[float]:
+        """질문 임베딩은 원본에 위임 (질문 캐시는 별도)"""
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
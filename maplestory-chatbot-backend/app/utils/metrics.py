@@ -0,0 +1,226 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 지연 시간 히스토그램 기본 구간 (초) - 임베딩 수 ms부터 LLM 생성 수십 초까지
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _ShardedMetric:
+    """스레드별 샤드에 기록하는 메트릭 - 기록 경로에 lock이 없음
+
+    각 스레드는 자기 샤드(dict)만 수정하고, 스크랩 시 모든 샤드를 합산합니다.
+    lock은 스레드가 처음 기록할 때 샤드를 등록하는 순간에만 사용합니다.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _snapshots(self) -> List[Dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.copy()는 GIL 아래에서 원자적이라 기록 중인 샤드도 안전하게 복사됨
+        return [shard.copy() for shard in shards]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_ShardedMetric):
+    """단조 증가 카운터"""
+
+    type_name = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return sum(snapshot.get(labelvalues, 0) for snapshot in self._snapshots())
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for snapshot in self._snapshots():
+            for labelvalues, value in snapshot.items():
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return [
+            f"{self.name}_total{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(totals.items())
+        ]
+
+class Histogram(_ShardedMetric):
+    """레이블별 누적 구간 히스토그램 (Prometheus histogram 형식)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """관측값 기록"""
+        shard = self._shard()
+        # 레이블 값 -> [구간별 개수..., +Inf 개수, 합계]
+        series = shard.get(labelvalues)
+        if series is None:
+            series = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """with 블록의 소요 시간(초) 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self) -> List[str]:
+        merged: Dict[Tuple[str, ...], List[float]] = {}
+        for snapshot in self._snapshots():
+            for labelvalues, series in snapshot.items():
+                total = merged.setdefault(labelvalues, [0] * len(series))
+                for i, value in enumerate(list(series)):
+                    total[i] += value
+
+        lines = []
+        for labelvalues, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge:
+    """스크랩 시점에 collect 함수로 값을 읽는 게이지 (세션 수, 캐시 적중률 등)"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        if self.collect is None:
+            return []
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.warning(f"Metric collection failed for {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(values.items())
+        ]
+
+class MetricsRegistry:
+    """프로세스 내 메트릭 저장소 - /metrics에서 Prometheus 텍스트 형식으로 노출"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, factory: Callable[[], object]):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """카운터 등록 (같은 이름이면 기존 것 반환)"""
+        return self._register(name, lambda: Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """히스토그램 등록 (같은 이름이면 기존 것 반환)"""
+        return self._register(name, lambda: Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+        """게이지 등록 - 이미 있으면 collect 함수만 교체 (서비스 재생성 시 최신 인스턴스 기준)"""
+        gauge = self._register(name, lambda: Gauge(name, documentation, labelnames))
+        if collect is not None:
+            gauge.collect = collect
+        return gauge
+
+    def render(self) -> str:
+        """Prometheus 텍스트 노출 형식 (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# 전역 메트릭 저장소
+metrics_registry = MetricsRegistry()
+
+RAG_STAGE_SECONDS = metrics_registry.histogram(
+    "rag_stage_duration_seconds",
+    "RAG 파이프라인 단계별 소요 시간",
+    labelnames=("stage",),
+)
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP 요청 처리 시간 (라우트별)",
+    labelnames=("method", "route", "status"),
+)
+LLM_TOKENS = metrics_registry.counter(
+    "llm_tokens",
+    "LLM 토큰 사용량",
+    labelnames=("model", "type"),
+)
+EMBEDDING_API_CALLS = metrics_registry.counter(
+    "embedding_api_calls",
+    "임베딩 API 호출 수 (캐시 적중 제외)",
+    labelnames=("provider", "input_type"),
+)
+QDRANT_SECONDS = metrics_registry.histogram(
+    "qdrant_request_duration_seconds",
+    "Qdrant 요청 처리 시간",
+    labelnames=("operation",),
+)
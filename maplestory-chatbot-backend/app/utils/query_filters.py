@@ -0,0 +1,50 @@
+from typing import Any, Dict, List
+
+from app.config.metadata_config import metadata_config
+
+# 직업은 긴 이름부터 찾아 "아크메이지" 안의 "아크" 같은 부분 일치를 막음
+_CLASSES_BY_LENGTH = sorted(metadata_config.available_classes, key=len, reverse=True)
+
+def _find_classes(text: str) -> List[str]:
+    """질문에 나온 직업명 (등장 순서)"""
+    found = []
+    remaining = text
+    for class_name in _CLASSES_BY_LENGTH:
+        if class_name in remaining:
+            found.append((text.find(class_name), class_name))
+            remaining = remaining.replace(class_name, " ")
+    return [class_name for _, class_name in sorted(found)]
+
+def extract_metadata_filter(question: str) -> Dict[str, Any]:
+    """질문에서 직업/서버를 찾아 검색 필터 구성
+
+    값 목록은 OR, 필드끼리는 AND로 적용합니다. 목록의 None은 해당 필드가 없는 문서도
+    포함한다는 뜻으로, 특정 직업 질문에서도 직업 구분 없는 공용 가이드는 검색됩니다.
+    카테고리는 수집된 문서에서 자유 형식("게임 가이드", "game_update_review" 등)이라
+    별칭과 맞지 않으므로 필터에 넣지 않습니다 (관련 문서가 빠지거나 재검색만 늘어남).
+    """
+    query_filter: Dict[str, Any] = {}
+
+    classes = _find_classes(question)
+    if classes:
+        query_filter["class"] = classes + [None]
+
+    for alias, server_type in metadata_config.server_type_aliases.items():
+        if alias in question:
+            # 서버 구분 없는 문서는 "both" (수집 시 기본값)
+            query_filter["server_type"] = [server_type, "both", None]
+            break
+
+    return query_filter
+
+def matches_metadata_filter(metadata: Dict[str, Any], query_filter: Dict[str, Any]) -> bool:
+    """메타데이터가 필터 조건을 만족하는지 (BM25 후보 등 벡터 검색 밖의 결과용)"""
+    for field, expected in query_filter.items():
+        expected_values = expected if isinstance(expected, (list, tuple, set)) else [expected]
+        value = metadata.get(field)
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if not values:
+            values = [None]
+        if not any(item in expected_values for item in values):
+            return False
+    return True
@@ -0,0 +1,119 @@
+from typing import List, Dict, Iterable
+import re
+
+import numpy as np
+from langchain.schema import Document
+
+from app.utils.sparse_index import tokenize_korean
+
+# 메이플스토리 특화 키워드 패턴 (모듈 로드 시 한 번만 컴파일)
+MAPLE_KEYWORD_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in [
+        r'[가-힣]+\s*(?:보스|스킬|큐브|코인|포인트|이벤트|직업|클래스)',
+        r'(?:하드|이지|헬|카오스)\s*[가-힣]+',
+        r'[가-힣]+\s*(?:샵|상점)',
+        r'챌린저스?\s*[가-힣]*',
+        r'[가-힣]{2,}(?:렌|제로|카데나|일리움|호영|아델|카인|라라|아크)',
+    ]
+]
+GENERAL_KEYWORD_PATTERN = re.compile(r'[가-힣]{2,}')
+
+# 청크 payload에 저장하는 사전 계산 n-gram 필드
+CONTENT_NGRAMS_KEY = "search_ngrams"
+TITLE_NGRAMS_KEY = "title_ngrams"
+
+def extract_keywords(query: str) -> List[str]:
+    """질문에서 핵심 키워드 추출"""
+    keywords = []
+
+    # 패턴 매칭으로 키워드 추출
+    for pattern in MAPLE_KEYWORD_PATTERNS:
+        keywords.extend(pattern.findall(query))
+
+    # 일반 명사 추출 (2글자 이상 한글)
+    keywords.extend(GENERAL_KEYWORD_PATTERN.findall(query))
+
+    # 중복 제거 및 소문자 변환
+    unique_keywords = list(set([kw.strip().lower() for kw in keywords if len(kw.strip()) > 1]))
+
+    return unique_keywords[:10]  # 최대 10개로 제한
+
+def build_ngram_features(title: str, content: str) -> Dict[str, List[str]]:
+    """수집 시점에 청크별 n-gram 집합 계산 (payload 저장용)"""
+    return {
+        TITLE_NGRAMS_KEY: sorted(set(tokenize_korean(title or ""))),
+        CONTENT_NGRAMS_KEY: sorted(set(tokenize_korean(content))),
+    }
+
+def _document_ngrams(doc: Document, key: str, text: str) -> Iterable[str]:
+    """사전 계산된 n-gram 사용 (이전에 수집된 청크는 즉석 계산)"""
+    ngrams = doc.metadata.get(key)
+    if ngrams is None:
+        ngrams = tokenize_korean(text)
+    return ngrams
+
+def score_documents(query: str, documents: List[Document], query_keywords: List[str]) -> Dict[str, np.ndarray]:
+    """질문-문서 관련성을 한 번의 행렬 연산으로 계산
+
+    키워드는 모든 bigram이 청크에 있으면 포함된 것으로 보고(부분 문자열 매칭 근사),
+    제목 직접 매칭은 질문/제목 bigram Dice 계수로 계산합니다.
+    """
+    n_docs = len(documents)
+    query_grams = list(dict.fromkeys(tokenize_korean(query)))
+    keyword_grams = [set(tokenize_korean(kw)) for kw in query_keywords]
+
+    # 질문에 등장하는 n-gram만으로 어휘 구성
+    vocabulary = {}
+    for gram in query_grams:
+        vocabulary.setdefault(gram, len(vocabulary))
+    for grams in keyword_grams:
+        for gram in grams:
+            vocabulary.setdefault(gram, len(vocabulary))
+
+    content_matrix = np.zeros((n_docs, len(vocabulary)), dtype=np.float32)
+    title_matrix = np.zeros((n_docs, len(vocabulary)), dtype=np.float32)
+    title_sizes = np.zeros(n_docs, dtype=np.float32)
+
+    for i, doc in enumerate(documents):
+        title = doc.metadata.get("title", "") or ""
+        title_ngrams = _document_ngrams(doc, TITLE_NGRAMS_KEY, title)
+        title_sizes[i] = len(set(title_ngrams))
+        for gram in title_ngrams:
+            j = vocabulary.get(gram)
+            if j is not None:
+                title_matrix[i, j] = 1.0
+        for gram in _document_ngrams(doc, CONTENT_NGRAMS_KEY, doc.page_content):
+            j = vocabulary.get(gram)
+            if j is not None:
+                content_matrix[i, j] = 1.0
+
+    # 키워드 x 어휘 행렬
+    keyword_matrix = np.zeros((len(keyword_grams), len(vocabulary)), dtype=np.float32)
+    for k, grams in enumerate(keyword_grams):
+        for gram in grams:
+            keyword_matrix[k, vocabulary[gram]] = 1.0
+    keyword_sizes = keyword_matrix.sum(axis=1)
+    n_keywords = max(len(keyword_grams), 1)
+
+    # 키워드 포함 여부 (문서 x 키워드)
+    valid_keywords = keyword_sizes > 0
+    content_hits = ((content_matrix @ keyword_matrix.T) >= keyword_sizes) & valid_keywords
+    title_hits = ((title_matrix @ keyword_matrix.T) >= keyword_sizes) & valid_keywords
+    content_relevance = content_hits.sum(axis=1) / n_keywords
+    keyword_score = title_hits.sum(axis=1) / n_keywords
+
+    # 제목 직접 매칭 (Dice 계수)
+    query_vector = np.zeros(len(vocabulary), dtype=np.float32)
+    for gram in query_grams:
+        query_vector[vocabulary[gram]] = 1.0
+    overlap = title_matrix @ query_vector
+    denominator = title_sizes + len(query_grams)
+    direct_match = np.divide(2 * overlap, denominator, out=np.zeros(n_docs, dtype=np.float32), where=denominator > 0)
+
+    # 최종 점수 (직접 매칭 70% + 키워드 매칭 30%), 제목이 없으면 0
+    title_relevance = np.where(title_sizes > 0, np.minimum(direct_match * 0.7 + keyword_score * 0.3, 1.0), 0.0)
+
+    return {
+        "title_relevance": title_relevance,
+        "content_relevance": content_relevance,
+    }
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
+import copy
+import json
+import threading
+import time
+import uuid
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """질문 임베딩 유사도 기반 답변 캐시
+
+    (정규화된 질문 벡터, 응답, 코퍼스 버전)을 보관하고, 새 질문과의 코사인 유사도가
+    threshold 이상이고 코퍼스 버전이 같으면 캐시된 응답을 반환합니다.
+    벡터는 연속된 float32 행렬에 두고 한 번의 행렬-벡터 곱으로 최근접 항목을 찾습니다.
+    만료되었거나 코퍼스 버전이 다른 항목은 최근접 후보에서 제외(제거)합니다.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        threshold: float = 0.95,
+        max_entries: int = 2000,
+        ttl: int = 86400,
+        redis_client=None
+    ):
+        self.namespace = namespace  # 임베딩 모델별로 분리 (모델이 다르면 벡터 비교 불가)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_client = redis_client  # 선택적 영구 저장 (워커 재시작 후 복원)
+
+        # entry_id -> (행 번호, 만료 시각, 코퍼스 버전, 질문, 응답), LRU 순서
+        self._entries: "OrderedDict[str, Tuple[int, float, str, str, Dict]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._row_ids: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._lock = threading.Lock()
+
+        # 통계
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # 유사 질문은 있었으나 코퍼스 버전이 달라 무효
+        self.evictions = 0
+
+    @property
+    def _redis_key(self) -> str:
+        return f"semantic_answer:{self.namespace}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _allocate_row(self, dim: int) -> int:
+        """벡터 행 할당 (lock을 잡은 상태에서 호출) - 빈 행 재사용, 부족하면 두 배로 확장"""
+        if self._matrix is None:
+            self._matrix = np.zeros((min(64, self.max_entries), dim), dtype=np.float32)
+            self._row_ids = [None] * self._matrix.shape[0]
+            self._free_rows = list(range(self._matrix.shape[0] - 1, -1, -1))
+        if not self._free_rows:
+            old_rows = self._matrix.shape[0]
+            new_rows = min(old_rows * 2, self.max_entries)
+            self._matrix = np.vstack([self._matrix, np.zeros((new_rows - old_rows, dim), dtype=np.float32)])
+            self._row_ids.extend([None] * (new_rows - old_rows))
+            self._free_rows = list(range(new_rows - 1, old_rows - 1, -1))
+        return self._free_rows.pop()
+
+    def _remove(self, entry_id: str) -> None:
+        """항목 제거 (lock을 잡은 상태에서 호출)"""
+        row = self._entries.pop(entry_id)[0]
+        self._matrix[row] = 0.0
+        self._row_ids[row] = None
+        self._free_rows.append(row)
+
+    def lookup(self, vector: List[float], corpus_version: str) -> Optional[Tuple[Dict, float]]:
+        """가장 유사한 캐시 응답과 유사도 반환 (없으면 None)"""
+        query = self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            if not self._entries or self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            # 빈 행은 0 벡터라 유사도 0
+            similarities = self._matrix @ query
+
+            # 임계값을 넘는 행 중 만료/이전 코퍼스 항목은 제거하고, 남은 유효한 행에서 최근접 항목 선택
+            best_id, similarity = None, 0.0
+            for row in np.flatnonzero(similarities >= self.threshold):
+                entry_id = self._row_ids[row]
+                if entry_id is None:
+                    continue
+                _, expires_at, version, _, _ = self._entries[entry_id]
+                if expires_at <= now or version != corpus_version:
+                    if version != corpus_version:
+                        # 코퍼스가 바뀐 뒤의 답변은 다시 생성
+                        self.stale += 1
+                    self._remove(entry_id)
+                elif similarities[row] > similarity:
+                    best_id, similarity = entry_id, float(similarities[row])
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return copy.deepcopy(self._entries[best_id][4]), similarity
+
+    def store(self, query: str, vector: List[float], response: Dict, corpus_version: str,
+              entry_id: Optional[str] = None, expires_at: Optional[float] = None, persist: bool = True) -> str:
+        """응답 저장 - 한도를 넘으면 가장 오래 사용하지 않은 항목부터 제거"""
+        normalized = self._normalize(vector)
+        entry_id = entry_id or uuid.uuid4().hex
+        expires_at = expires_at or time.time() + self.ttl
+        evicted = []
+
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != normalized.shape[0]:
+                # 벡터 차원이 바뀌면 (모델 변경) 전체 초기화
+                self._entries.clear()
+                self._matrix = None
+            if entry_id in self._entries:
+                self._remove(entry_id)
+            while len(self._entries) >= self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                evicted.append(oldest_id)
+                self.evictions += 1
+
+            row = self._allocate_row(normalized.shape[0])
+            self._matrix[row] = normalized
+            self._row_ids[row] = entry_id
+            self._entries[entry_id] = (row, expires_at, corpus_version, query, copy.deepcopy(response))
+
+        if persist and self.redis_client is not None:
+            self._persist(entry_id, query, normalized, response, corpus_version, expires_at, evicted)
+        return entry_id
+
+    def _persist(self, entry_id: str, query: str, vector: np.ndarray, response: Dict,
+                 corpus_version: str, expires_at: float, evicted: List[str]) -> None:
+        """Redis 해시에 항목 저장"""
+        try:
+            record = json.dumps({
+                "query": query,
+                "vector": vector.tolist(),
+                "response": response,
+                "corpus_version": corpus_version,
+                "expires_at": expires_at,
+            }, ensure_ascii=False)
+            pipe = self.redis_client.pipeline()
+            pipe.hset(self._redis_key, entry_id, record)
+            if evicted:
+                pipe.hdel(self._redis_key, *evicted)
+            pipe.expire(self._redis_key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Semantic cache persist failed: {e}")
+
+    def load(self) -> int:
+        """Redis에 저장된 항목 복원 (만료된 항목 제외), 복원한 수 반환"""
+        if self.redis_client is None:
+            return 0
+        try:
+            records = self.redis_client.hgetall(self._redis_key)
+        except Exception as e:
+            logger.warning(f"Semantic cache load failed: {e}")
+            return 0
+
+        now = time.time()
+        loaded = []
+        for entry_id, raw in records.items():
+            record = json.loads(raw)
+            if record["expires_at"] > now:
+                loaded.append((entry_id.decode() if isinstance(entry_id, bytes) else entry_id, record))
+
+        # 만료가 늦은 항목이 LRU 뒤쪽에 오도록 정렬 후 최근 max_entries개만 복원
+        loaded.sort(key=lambda item: item[1]["expires_at"])
+        for entry_id, record in loaded[-self.max_entries:]:
+            self.store(record["query"], record["vector"], record["response"], record["corpus_version"],
+                       entry_id=entry_id, expires_at=record["expires_at"], persist=False)
+        if loaded:
+            logger.info(f"Loaded {min(len(loaded), self.max_entries)} semantic cache entries from Redis")
+        return min(len(loaded), self.max_entries)
+
+    def clear(self) -> None:
+        """캐시 비우기"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._row_ids = []
+            self._free_rows = []
+        if self.redis_client is not None:
+            try:
+                self.redis_client.delete(self._redis_key)
+            except Exception as e:
+                logger.warning(f"Semantic cache clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """캐시 통계 반환"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from typing import List, Tuple, Dict, Any, Iterable
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+# 한글 음절 덩어리 또는 영문/숫자 토큰
+_TOKEN_PATTERN = re.compile(r"[가-힣]+|[a-z0-9]+")
+
+def tokenize_korean(text: str) -> List[str]:
+    """한국어 문자 n-gram 토큰화
+
+    한글 덩어리는 글자 bigram으로 나누고(1글자는 그대로), 띄어쓰기가 달라도
+    매칭되도록 인접한 한글 덩어리 사이의 bigram도 추가합니다.
+    예) "하드 스우" -> ["하드", "드스", "스우"]
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    prev_hangul = None
+
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        if "가" <= token[0] <= "힣":
+            if prev_hangul is not None:
+                tokens.append(prev_hangul[-1] + token[0])
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+            prev_hangul = token
+        else:
+            tokens.append(token)
+            prev_hangul = None
+
+    return tokens
+
+class BM25Index:
+    """메모리 내 BM25 역색인 - 질문 용어의 posting만 순회해 점수 계산"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[Any] = []
+        self.items: List[Any] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        self._doc_len_norm = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, entries: Iterable[Tuple[Any, str, Any]]) -> "BM25Index":
+        """(id, 텍스트, 원본 객체) 목록으로 색인 생성"""
+        postings = defaultdict(lambda: ([], []))
+        doc_lengths = []
+        self.ids = []
+        self.items = []
+
+        for doc_idx, (item_id, text, item) in enumerate(entries):
+            tokens = tokenize_korean(text)
+            self.ids.append(item_id)
+            self.items.append(item)
+            doc_lengths.append(len(tokens))
+
+            term_counts = defaultdict(int)
+            for token in tokens:
+                term_counts[token] += 1
+            for term, count in term_counts.items():
+                doc_indices, tfs = postings[term]
+                doc_indices.append(doc_idx)
+                tfs.append(count)
+
+        n_docs = len(self.ids)
+        lengths = np.asarray(doc_lengths, dtype=np.float32)
+        avg_len = float(lengths.mean()) if n_docs else 0.0
+        self._doc_len_norm = self.k1 * (1 - self.b + self.b * lengths / avg_len) if avg_len else lengths
+
+        self._postings = {}
+        self._idf = {}
+        for term, (doc_indices, tfs) in postings.items():
+            self._postings[term] = (
+                np.asarray(doc_indices, dtype=np.int32),
+                np.asarray(tfs, dtype=np.float32)
+            )
+            df = len(doc_indices)
+            self._idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        return self
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Any, Any, float]]:
+        """BM25 상위 k개 (id, 원본 객체, 점수) 반환"""
+        if not self.ids:
+            return []
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize_korean(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_indices, tfs = posting
+            norm = self._doc_len_norm[doc_indices]
+            scores[doc_indices] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + norm)
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return []
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        return [(self.ids[i], self.items[i], float(scores[i])) for i in candidates]
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], k: int = 60) -> List[Tuple[Any, float]]:
+    """여러 순위 목록을 RRF로 결합 - score = Σ 1 / (k + rank)"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            fused[item_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from uuid import UUID
+import time
+import logging
+
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+
+from app.utils.metrics import LLM_TOKENS, RAG_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# RAG 파이프라인 단계 이름
+STAGE_QUERY_EMBEDDING = "query_embedding"
+STAGE_VECTOR_SEARCH = "vector_search"
+STAGE_RELEVANCE_FILTER = "relevance_filter"
+STAGE_CONDENSE_REWRITE = "condense_rewrite"
+STAGE_LLM_TTFT = "llm_ttft"
+STAGE_LLM_TOTAL = "llm_total"
+STAGE_RESPONSE_VALIDATION = "response_validation"
+
+class StageTimings:
+    """요청 하나의 단계별 소요 시간 (같은 단계가 여러 번 실행되면 합산)"""
+
+    def __init__(self):
+        self._seconds: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """단계별 밀리초"""
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self._seconds.items()}
+
+# 현재 요청의 타이밍 (하위 서비스가 인자 전달 없이 기록)
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+def record_stage(stage: str, seconds: float) -> None:
+    """단계 소요 시간을 현재 요청과 /metrics 히스토그램에 기록"""
+    RAG_STAGE_SECONDS.observe(seconds, stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.record(stage, seconds)
+
+@contextmanager
+def stage_span(stage: str) -> Iterator[None]:
+    """with 블록의 소요 시간을 단계로 기록"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+@contextmanager
+def trace_stages() -> Iterator[StageTimings]:
+    """블록 안에서 기록되는 단계를 모으는 요청 단위 타이밍"""
+    timings = StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        try:
+            _current_timings.reset(token)
+        except ValueError:
+            # 스트리밍 제너레이터가 다른 컨텍스트에서 정리되는 경우
+            pass
+
+def _usage_from_result(response) -> Dict[str, int]:
+    """LLMResult의 usage_metadata 합계"""
+    usage: Dict[str, int] = {}
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                usage[key] = usage.get(key, 0) + metadata.get(key, 0)
+    return usage
+
+class LLMUsageMetricsCallback(BaseCallbackHandler):
+    """모든 LLM 호출(답변/질문 재작성/기록 요약)의 토큰 사용량을 /metrics 카운터에 기록"""
+
+    run_inline = True  # 카운터 증가만 하므로 스레드 풀로 보내지 않음
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        usage = _usage_from_result(response)
+        LLM_TOKENS.inc(self.model, "input", amount=usage.get("input_tokens", 0))
+        LLM_TOKENS.inc(self.model, "output", amount=usage.get("output_tokens", 0))
+
+class LLMTimingCallback(AsyncCallbackHandler):
+    """지정한 태그가 붙은 LLM 호출의 첫 토큰 시간/총 시간과 토큰 사용량 기록"""
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.usage: Dict[str, int] = {}
+        self._started: Dict[UUID, float] = {}
+        self._first_token: Dict[UUID, float] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID,
+                                  tags: Optional[list] = None, **kwargs: Any) -> None:
+        if tags and self.tag in tags:
+            self._started[run_id] = time.perf_counter()
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self._started and run_id not in self._first_token:
+            self._first_token[run_id] = time.perf_counter()
+            record_stage(STAGE_LLM_TTFT, self._first_token[run_id] - self._started[run_id])
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+        if started is None:
+            return
+        record_stage(STAGE_LLM_TOTAL, time.perf_counter() - started)
+
+        for key, value in _usage_from_result(response).items():
+            self.usage[key] = self.usage.get(key, 0) + value
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# scripts/benchmark_rag.py
+
+"""
+RAG 파이프라인 오프라인 부하 테스트
+- 외부 API 없이 결정적인 가짜 LLM / 임베딩과 로컬 벡터 색인(vector_store_type=local)으로 LangChainService 전체 경로 실행
+- N개의 동시 클라이언트가 FastAPI 앱(ASGI, 네트워크 없음)을 호출
+- RPS, p50/p95/p99 지연, 이벤트 루프 지연, RSS를 측정해 JSON으로 저장 (커밋 간 비교용)
+
+사용 예:
+    python scripts/benchmark_rag.py --clients 50 --requests 2000 --output benchmark_results/baseline.json
+    python scripts/benchmark_rag.py --stream --llm-ttft-ms 500 --compare benchmark_results/baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 프로젝트 루트를 Python 경로에 추가
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+logger = logging.getLogger("benchmark_rag")
+
+# 합성 코퍼스 / 질문 생성용 주제
+TOPICS = [
+    "하드 스우", "검은 마법사", "챌린저스 월드", "하이퍼 버닝", "솔 에르다", "메이플 패스",
+    "렌", "아델", "카인", "칼리", "유니온", "링크 스킬", "심볼", "스타포스", "큐브", "코어 강화",
+]
+ASPECTS = ["보상", "공략", "획득 방법", "추천 세팅"]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="오프라인 RAG 부하 테스트")
+    parser.add_argument("--clients", type=int, default=20, help="동시 클라이언트 수")
+    parser.add_argument("--requests", type=int, default=500, help="전체 요청 수 (워밍업 제외)")
+    parser.add_argument("--warmup", type=int, default=20, help="측정 전 워밍업 요청 수")
+    parser.add_argument("--stream", action="store_true", help="/api/chat/stream 사용 (TTFT 측정)")
+    parser.add_argument("--questions", type=int, default=len(TOPICS) * len(ASPECTS),
+                        help="서로 다른 질문 수 (적을수록 캐시 적중 증가)")
+    parser.add_argument("--multi-turn", action="store_true", help="클라이언트별 세션 유지 (대화 기록 사용)")
+    parser.add_argument("--docs-per-topic", type=int, default=8, help="주제/관점별 합성 문서 수")
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0, help="가짜 LLM 첫 토큰 지연")
+    parser.add_argument("--llm-token-ms", type=float, default=5.0, help="가짜 LLM 토큰 간 지연")
+    parser.add_argument("--answer-tokens", type=int, default=80, help="가짜 LLM 답변 토큰 수")
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0, help="가짜 임베딩 API 지연")
+    parser.add_argument("--search-latency-ms", type=float, default=0.0,
+                        help="벡터 검색마다 추가할 지연 (원격 벡터 DB 왕복 흉내, 기본: 로컬 색인 그대로)")
+    parser.add_argument("--quantization", choices=["none", "scalar", "binary"], default="none",
+                        help="로컬 벡터 색인 양자화 방식")
+    parser.add_argument("--disable-semantic-cache", action="store_true")
+    parser.add_argument("--disable-coalescing", action="store_true")
+    parser.add_argument("--use-redis", action="store_true", help="설정된 REDIS_URL 사용 (기본: Redis 없이 실행)")
+    parser.add_argument("--output", type=str, default=None, help="결과 JSON 경로")
+    parser.add_argument("--compare", type=str, default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--log-level", type=str, default="WARNING")
+    return parser.parse_args()
+
+def _load_app_modules():
+    """설정을 조정한 뒤 앱 모듈 로드 (캐시/Redis 연결이 import 시점에 만들어지므로)"""
+    global settings, LangChainService, get_langchain_service, app, user_log_service
+    global BaseChatModel, AIMessage, AIMessageChunk, ChatGeneration, ChatGenerationChunk, ChatResult
+    global agenerate_from_stream, Embeddings, Document, VectorStoreService
+    global tokenize_korean, estimate_tokens
+
+    from app.config import settings
+    from app.services.langchain_service import LangChainService, get_langchain_service
+    from app.services.user_log_service import user_log_service
+    from app.main import app
+    from app.utils.sparse_index import tokenize_korean
+    from app.services.vector_store import VectorStoreService
+    from app.chains.history_compactor import estimate_tokens
+    from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+    from langchain_core.embeddings import Embeddings
+    from langchain.schema import Document
+
+def _define_fakes():
+    """langchain 기반 가짜 백엔드 클래스 정의 (모듈 로드 후)"""
+    global FakeChatModel, FakeEmbeddings, BenchmarkVectorStore
+
+    class FakeChatModel(BaseChatModel):
+        """고정된 TTFT/토큰 지연으로 결정적인 답변을 스트리밍하는 LLM"""
+        ttft: float = 0.3
+        token_delay: float = 0.005
+        answer_tokens: int = 80
+        calls: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "benchmark-fake"
+
+        def _tokens(self, messages) -> List[str]:
+            question = str(messages[-1].content)[:40]
+            return [f"## {question}\n\n"] + [f"설명{i} " for i in range(self.answer_tokens)]
+
+        def _usage(self, messages, tokens: List[str]) -> Dict[str, int]:
+            input_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+            output_tokens = len(tokens)
+            return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens}
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            self.calls += 1
+            tokens = self._tokens(messages)
+            time.sleep(self.ttft + self.token_delay * (len(tokens) - 1))
+            message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, tokens))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            self.calls += 1
+            tokens = self._tokens(messages)
+            usage = self._usage(messages, tokens)
+            await asyncio.sleep(self.ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(self.token_delay)
+                last = i == len(tokens) - 1
+                chunk = ChatGenerationChunk(
+                    message=AIMessageChunk(content=token, usage_metadata=usage if last else None)
+                )
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            # ChatAnthropic(streaming=True)처럼 ainvoke도 스트리밍으로 생성
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    class FakeEmbeddings(Embeddings):
+        """문자 n-gram 해시 기반 결정적 임베딩 - 비슷한 문장은 비슷한 벡터"""
+
+        def __init__(self, dim: int, latency: float):
+            self.dim = dim
+            self.latency = latency
+            self.model = "benchmark-fake"
+            self.calls = 0
+
+        def _vector(self, text: str) -> List[float]:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in tokenize_korean(text):
+                vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            return (vector / norm if norm > 0 else vector).tolist()
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            # 첫 줄(제목)만 임베딩 - 짧은 질문과의 유사도가 실제 임베딩처럼 점수 임계값을 넘도록
+            return [self._vector(text.split("\n", 1)[0]) for text in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            self.calls += 1
+            time.sleep(self.latency)
+            return self._vector(text)
+
+        async def aembed_query(self, text: str) -> List[float]:
+            self.calls += 1
+            await asyncio.sleep(self.latency)
+            return self._vector(text)
+
+    class BenchmarkVectorStore(VectorStoreService):
+        """로컬 벡터 색인 + 선택적인 고정 지연 (원격 벡터 DB 왕복 흉내)"""
+
+        search_latency = 0.0
+
+        async def _query_points(self, **kwargs):
+            if self.search_latency:
+                await asyncio.sleep(self.search_latency)
+            return await super()._query_points(**kwargs)
+
+def build_corpus(docs_per_topic: int) -> List:
+    """주제 × 관점별 합성 문서 (관련성 검증을 통과하도록 제목/본문에 키워드 포함)"""
+    documents = []
+    for topic, aspect in itertools.product(TOPICS, ASPECTS):
+        for i in range(docs_per_topic):
+            title = f"{topic} {aspect} 가이드 {i}"
+            content = (
+                f"# {topic} {aspect}\n\n## {title}\n\n{topic}의 {aspect}에 대한 정리입니다. "
+                + " ".join(f"{topic} {aspect} 관련 설명 {j}번 항목입니다." for j in range(12))
+                + f"\n\nURL: https://maplestory.nexon.com/guide/{zlib.crc32(title.encode())}"
+            )
+            metadata = {"title": title, "source": f"{topic}_{aspect}.md", "chunk_index": i, "category": aspect}
+            documents.append(Document(page_content=content, metadata=metadata))
+    return documents
+
+def build_questions(count: int) -> List[str]:
+    questions = [f"{topic} {aspect} 알려줘" for topic, aspect in itertools.product(TOPICS, ASPECTS)]
+    return questions[:max(1, min(count, len(questions)))]
+
+async def build_service(args: argparse.Namespace, index_dir: str):
+    """가짜 백엔드를 쓰는 LangChainService (합성 코퍼스를 로컬 색인에 수집)"""
+    settings.vector_store_type = "local"
+    settings.local_index_path = index_dir
+    settings.vector_quantization = args.quantization
+    settings.enable_semantic_cache = not args.disable_semantic_cache
+    settings.enable_request_coalescing = not args.disable_coalescing
+    settings.session_history_backend = "memory"
+
+    class BenchmarkLangChainService(LangChainService):
+        def _initialize_llm(self):
+            return FakeChatModel(
+                ttft=args.llm_ttft_ms / 1000,
+                token_delay=args.llm_token_ms / 1000,
+                answer_tokens=args.answer_tokens,
+            )
+
+        def _initialize_embeddings(self):
+            return FakeEmbeddings(args.embedding_dim, args.embed_latency_ms / 1000)
+
+        def _initialize_vector_store(self):
+            vector_store = BenchmarkVectorStore(self.embeddings)
+            vector_store.search_latency = args.search_latency_ms / 1000
+            return vector_store
+
+    service = BenchmarkLangChainService()
+    await service.add_documents(build_corpus(args.docs_per_topic))
+    return service
+
+class LoopLagMonitor:
+    """이벤트 루프 지연 측정 - 주기적으로 sleep해 예정보다 늦게 깨어난 시간 기록"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(time.perf_counter() - start - self.interval, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+def current_rss_mb() -> float:
+    """현재 RSS (MB) - /proc가 없으면 최대 RSS로 대체"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """밀리초 단위 분포 요약"""
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000
+    return {
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+async def send_request(client, args: argparse.Namespace, question: str, session_id: str) -> Optional[float]:
+    """요청 하나 전송 - 스트리밍이면 done 이벤트의 서버 측 TTFT(초) 반환
+
+    ASGITransport는 응답 본문을 모두 받은 뒤 반환하므로 클라이언트에서 잰 첫 토큰 시간은
+    전체 지연과 같아집니다. 그래서 서비스가 done 이벤트에 기록한 ttft_ms를 사용합니다.
+    """
+    payload = {"message": question, "session_id": session_id, "context": {"user_id": "benchmark"}}
+    if not args.stream:
+        response = await client.post("/api/chat/", json=payload)
+        response.raise_for_status()
+        return None
+
+    ttft = None
+    event = None
+    async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "error":
+                    raise RuntimeError("stream error event")
+            elif event == "done" and line.startswith("data: "):
+                ttft_ms = json.loads(line[len("data: "):]).get("ttft_ms")
+                ttft = ttft_ms / 1000 if ttft_ms is not None else None
+    return ttft
+
+async def run_load(client, args: argparse.Namespace, questions: List[str], total: int, prefix: str) -> Dict[str, Any]:
+    """clients개의 작업자가 total개의 요청을 나눠 전송"""
+    counter = itertools.count()
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors: List[str] = []
+
+    async def worker(worker_id: int):
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            question = questions[index % len(questions)]
+            session_id = f"{prefix}-{worker_id}" if args.multi_turn else f"{prefix}-{index}"
+            start = time.perf_counter()
+            try:
+                ttft = await send_request(client, args, question, session_id)
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(args.clients)])
+    return {"duration": time.perf_counter() - start, "latencies": latencies, "ttfts": ttfts, "errors": errors}
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    index_dir = tempfile.TemporaryDirectory(prefix="rag-benchmark-index-")
+    service = await build_service(args, index_dir.name)
+    app.dependency_overrides[get_langchain_service] = lambda: service
+    app.state.langchain_service = service
+    questions = build_questions(args.questions)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        if args.warmup:
+            await run_load(client, args, questions, args.warmup, "warmup")
+
+        llm_calls_before = service.llm.calls
+        embedding_calls_before = service.embeddings.calls
+        rss_start = current_rss_mb()
+        monitor = LoopLagMonitor()
+        monitor.start()
+        load = await run_load(client, args, questions, args.requests, "bench")
+        await monitor.stop()
+
+    completed = len(load["latencies"])
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "requests": completed,
+        "errors": len(load["errors"]),
+        "error_samples": load["errors"][:5],
+        "duration_s": round(load["duration"], 3),
+        "rps": round(completed / load["duration"], 2) if load["duration"] > 0 else 0.0,
+        "latency_ms": summarize(load["latencies"]),
+        "ttft_ms": summarize(load["ttfts"]),
+        "loop_lag_ms": summarize(monitor.samples),
+        "rss_mb": {
+            "start": round(rss_start, 1),
+            "end": round(current_rss_mb(), 1),
+            "peak": round(peak_rss_mb(), 1),
+        },
+        "llm_calls": service.llm.calls - llm_calls_before,
+        "embedding_calls": service.embeddings.calls - embedding_calls_before,
+        "caches": service.cache_stats(),
+    }
+    app.dependency_overrides.clear()
+    index_dir.cleanup()
+    return result
+
+def print_summary(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """결과 요약 출력 (이전 결과가 있으면 변화율 표시)"""
+    def delta(path: List[str]) -> str:
+        if baseline is None:
+            return ""
+        old, new = baseline, result
+        for key in path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if not old or new is None:
+            return ""
+        return f" ({(new - old) / old * 100:+.1f}%)"
+
+    print("\n" + "=" * 60)
+    print(f"RAG 벤치마크 ({result['git_commit'] or 'unknown'}) - {result['requests']}건, 오류 {result['errors']}건")
+    print("=" * 60)
+    print(f"RPS: {result['rps']}{delta(['rps'])}")
+    for key in ("p50", "p95", "p99"):
+        print(f"지연 {key}: {result['latency_ms'].get(key)} ms{delta(['latency_ms', key])}")
+    if result["ttft_ms"]:
+        print(f"TTFT p50/p95: {result['ttft_ms']['p50']} / {result['ttft_ms']['p95']} ms{delta(['ttft_ms', 'p95'])}")
+    print(f"이벤트 루프 지연 p99/max: {result['loop_lag_ms'].get('p99')} / {result['loop_lag_ms'].get('max')} ms"
+          f"{delta(['loop_lag_ms', 'p99'])}")
+    print(f"RSS 시작/종료/최대: {result['rss_mb']['start']} / {result['rss_mb']['end']} / {result['rss_mb']['peak']} MB")
+    print(f"LLM 호출: {result['llm_calls']}{delta(['llm_calls'])}, 임베딩 호출: {result['embedding_calls']}")
+
+def main():
+    args = parse_args()
+
+    # 외부 서비스 없이 실행 (키는 가짜 LLM을 쓰므로 사용되지 않음)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    if not args.use_redis:
+        os.environ["REDIS_URL"] = ""
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    _load_app_modules()
+    _define_fakes()
+    logging.getLogger().setLevel(args.log_level)  # app.main의 basicConfig 이후 다시 적용
+
+    # 사용자 로그는 임시 디렉터리에 기록
+    log_dir = tempfile.TemporaryDirectory(prefix="rag-benchmark-logs-")
+    user_log_service.log_dir = Path(log_dir.name)
+
+    result = asyncio.run(run_benchmark(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(result, baseline)
+
+    output = Path(args.output or project_root / "benchmark_results" / f"rag_{result['git_commit'] or 'local'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    print(f"\n결과 저장: {output}")
+    log_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
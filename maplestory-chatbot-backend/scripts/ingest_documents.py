@@ -5,6 +5,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.document_processor import DocumentProcessor
 from app.services.langchain_service import LangChainService
+from app.services.ingestion_manifest import IngestionManifest, make_chunk_id, manifest_path
 from app.config import settings
 import logging
 from rich.console import Console
@@ -51,12 +52,12 @@ async def scan_documents(directories: dict) -> dict:
     
     return file_counts, file_list
 
-async def main():
-    """문서를 벡터 스토어에 수집 (PDF + Markdown 지원)"""
+async def main(full_rebuild: bool = False):
+    """문서를 벡터 스토어에 수집 (PDF + Markdown 지원) - 변경된 파일만 증분 수집"""
     console.print("[bold blue]메이플스토리 문서 수집 시작[/bold blue]")
     
-    # 1. Qdrant 연결 확인
-    if not await check_qdrant_connection():
+    # 1. Qdrant 연결 확인 (local 벡터 스토어는 파일만 사용)
+    if settings.vector_store_type == "qdrant" and not await check_qdrant_connection():
         console.print("Qdrant를 먼저 실행해주세요: docker run -p 6333:6333 qdrant/qdrant", style="yellow")
         return
     
@@ -145,29 +146,75 @@ async def main():
         console.print("취소되었습니다.", style="red")
         return
     
-    # 6. 문서 처리
+    # 6. 변경된 파일만 처리 (매니페스트 기준)
+    manifest = IngestionManifest(manifest_path(settings.vector_store_type, settings.collection_name))
+    if collection_info is not None and not collection_info.get("points_count") and manifest.files:
+        # 컬렉션이 비었거나 없는데 기록이 남아 있으면 모든 파일을 건너뛰게 되므로 전체 재수집
+        console.print("⚠️ 컬렉션이 비어 있어 매니페스트를 무시하고 전체 재수집합니다.", style="yellow")
+        manifest.reset()
+        full_rebuild = True
     all_documents = []
+    all_ids = []
+    stale_ids = []
+    skipped_files = 0
     
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         console=console
     ) as progress:
-        # Markdown 처리 (우선)
-        if file_counts["markdown"] > 0:
-            task = progress.add_task(f"Markdown 파일 {file_counts['markdown']}개 처리 중...", total=None)
-            md_docs = await processor.process_directory(directories["markdown"], ['.md'])
-            all_documents.extend(md_docs)
-            console.print(f"✅ Markdown: {len(md_docs)} 청크 생성", style="green")
-        
-        # PDF 처리
-        if file_counts["pdf"] > 0:
-            task = progress.add_task(f"PDF 파일 {file_counts['pdf']}개 처리 중...", total=None)
-            pdf_docs = await processor.process_directory(directories["pdf"], ['.pdf'])
-            all_documents.extend(pdf_docs)
-            console.print(f"✅ PDF: {len(pdf_docs)} 청크 생성", style="blue")
+        for doc_type in ["markdown", "pdf"]:  # Markdown 우선
+            if file_counts[doc_type] == 0:
+                continue
+            
+            task = progress.add_task(f"{doc_type.upper()} 파일 {file_counts[doc_type]}개 확인 중...", total=None)
+            base_dir = directories[doc_type]
+            file_keys = []
+            
+            for relative_path in file_list[doc_type]:
+                file_path = os.path.join(base_dir, relative_path)
+                file_key = f"{doc_type}/{relative_path}"
+                file_keys.append(file_key)
+                
+                if not full_rebuild and manifest.is_unchanged(file_key, file_path):
+                    skipped_files += 1
+                    continue
+                
+                try:
+                    documents = await processor.process_file(file_path)
+                except Exception as e:
+                    console.print(f"❌ {relative_path} 처리 실패: {str(e)}", style="red")
+                    continue
+                
+                # 결정적 청크 ID - 내용이 같은 청크는 같은 ID
+                chunk_ids = []
+                for doc in documents:
+                    chunk_id = make_chunk_id(file_key, doc.metadata.get("chunk_index", 0), doc.page_content)
+                    doc.metadata["chunk_id"] = chunk_id
+                    chunk_ids.append(chunk_id)
+                
+                previous_ids = set(manifest.get_chunk_ids(file_key))
+                for doc, chunk_id in zip(documents, chunk_ids):
+                    if full_rebuild or chunk_id not in previous_ids:
+                        all_documents.append(doc)
+                        all_ids.append(chunk_id)
+                stale_ids.extend(previous_ids - set(chunk_ids))
+                
+                manifest.update(file_key, file_path, chunk_ids)
+            
+            # 디스크에서 삭제된 파일의 청크 정리
+            for file_key in manifest.stale_files(file_keys, prefix=f"{doc_type}/"):
+                stale_ids.extend(manifest.remove(file_key))
+    
+    console.print(
+        f"\n📄 변경 없음 {skipped_files}개 파일 건너뜀 / 업서트 {len(all_documents)}개 청크 / 삭제 {len(stale_ids)}개 청크",
+        style="green"
+    )
     
-    console.print(f"\n📄 총 {len(all_documents)} 개의 청크 생성 완료", style="green")
+    if not all_documents and not stale_ids:
+        manifest.save()
+        console.print("✅ 변경된 문서가 없습니다.", style="green")
+        return
     
     # 7. 문서 메타데이터 요약
     if all_documents:
@@ -182,7 +229,7 @@ async def main():
         for key, count in sorted(metadata_summary.items()):
             console.print(f"  {key}: {count}개")
     
-    # 8. 벡터 스토어에 추가
+    # 8. 벡터 스토어에 반영 (변경 청크 업서트, 사라진 청크 삭제)
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -190,10 +237,24 @@ async def main():
     ) as progress:
         task = progress.add_task("벡터 스토어에 업로드 중...", total=None)
         
-        await service.add_documents(all_documents)
+        if all_documents:
+            await service.add_documents(all_documents, ids=all_ids)
+        if stale_ids:
+            await service.delete_documents(stale_ids)
+        
+        # 벡터 스토어 반영이 끝난 뒤에만 매니페스트 저장
+        manifest.save()
         
         console.print("✅ 문서 업로드 완료!", style="green")
     
+    # 임베딩 캐시 재사용 현황
+    if hasattr(service.embeddings, "cached_count"):
+        console.print(
+            f"♻️ 임베딩 캐시: {service.embeddings.cached_count}개 재사용, "
+            f"{service.embeddings.embedded_count}개 새로 임베딩",
+            style="cyan"
+        )
+    
     # 9. 최종 상태 확인
     final_info = service.vector_store.get_collection_info()
     if final_info:
@@ -204,4 +265,10 @@ async def main():
     console.print("🧪 테스트 실행: [dim]python scripts/test_rag.py[/dim]")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="문서 수집 (기본: 변경된 파일만 증분 수집)")
+    parser.add_argument("--full", action="store_true", help="매니페스트를 무시하고 모든 청크를 다시 업서트")
+    args = parser.parse_args()
+    
+    asyncio.run(main(full_rebuild=args.full)) 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.vector_store import VectorStoreService
+from app.services.embedding_service import get_embeddings
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def migrate_embeddings(dimension: int, output_dtype: str, target_collection: str):
+    """기존 벡터를 줄어든 차원/타입으로 재투영해 새 컬렉션 생성 (Voyage Matryoshka 모델용)"""
+    # 원본 컬렉션은 이전 차원이므로 시작 시 차원 검사를 건너뜀
+    vector_store_service = VectorStoreService(get_embeddings(), verify_vector_size=False)
+    try:
+        logger.info(f"Vector store type: {settings.vector_store_type}")
+        logger.info(f"Source collection: {settings.collection_name} -> target: {target_collection}")
+
+        count = await vector_store_service.migrate_collection(target_collection, dimension, output_dtype)
+
+        logger.info(f"✅ Migrated {count} points to {target_collection}")
+        logger.info(
+            f"Set COLLECTION_NAME={target_collection}, VOYAGE_OUTPUT_DIMENSION={dimension}, "
+            f"VOYAGE_OUTPUT_DTYPE={output_dtype} in .env and restart the server"
+        )
+    except Exception as e:
+        logger.error(f"❌ Error migrating embeddings: {str(e)}")
+        raise
+    finally:
+        await vector_store_service.aclose()
+
+async def main():
+    """메인 함수"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Re-project stored embeddings to a smaller Voyage output dimension "
+                    "(increasing the dimension requires re-ingesting documents)"
+    )
+    parser.add_argument("--dimension", type=int, default=settings.voyage_output_dimension,
+                        help="Target dimension (default: VOYAGE_OUTPUT_DIMENSION)")
+    parser.add_argument("--dtype", choices=["float", "int8", "binary"], default=settings.voyage_output_dtype,
+                        help="Target output dtype (default: VOYAGE_OUTPUT_DTYPE)")
+    parser.add_argument("--target", help="Target collection name (default: <collection>_<dimension>)")
+    args = parser.parse_args()
+
+    if args.dimension is None:
+        parser.error("--dimension is required when VOYAGE_OUTPUT_DIMENSION is not set")
+
+    target = args.target or f"{settings.collection_name}_{args.dimension}"
+    await migrate_embeddings(args.dimension, args.dtype, target)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,6 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.config import settings
 from app.services.vector_store import VectorStoreService
 from app.services.embedding_service import get_embeddings
+from app.services.ingestion_manifest import IngestionManifest, manifest_path
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -56,6 +57,10 @@ async def clear_vectorstore():
             except:
                 logger.info(f"Collection {settings.collection_name} does not exist")
             
+            # 수집 기록도 삭제 - 남아 있으면 다음 증분 수집이 모든 파일을 건너뜀
+            IngestionManifest(manifest_path(settings.vector_store_type, settings.collection_name)).reset()
+            logger.info("Deleted ingestion manifest")
+            
             # 새 컬렉션 생성은 벡터 스토어 서비스에서 자동으로 처리됨
             
         logger.info("✅ Vector store cleared successfully!")
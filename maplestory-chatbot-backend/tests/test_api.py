@@ -1,12 +1,23 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 import json
 
 from app.main import app
+from app.services.langchain_service import get_langchain_service
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def mock_service():
+    """공유 LangChain 서비스를 Mock으로 주입"""
+    mock = Mock()
+    mock.chat = AsyncMock()
+    mock.add_documents = AsyncMock()
+    app.dependency_overrides[get_langchain_service] = lambda: mock
+    yield mock
+    app.dependency_overrides.clear()
+
 class TestHealthAPI:
     """헬스체크 API 테스트"""
     
@@ -20,7 +31,6 @@ class TestHealthAPI:
 class TestChatAPI:
     """채팅 API 테스트"""
     
-    @patch('app.api.chat.langchain_service')
     def test_chat_endpoint(self, mock_service):
         """채팅 엔드포인트 테스트"""
         # Mock 응답 설정
@@ -44,7 +54,6 @@ class TestChatAPI:
         assert "sources" in data
         assert "metadata" in data
     
-    @patch('app.api.chat.langchain_service')
     def test_chat_with_session_id(self, mock_service):
         """세션 ID를 포함한 채팅 테스트"""
         mock_service.chat.return_value = {
@@ -70,24 +79,38 @@ class TestChatAPI:
         response = client.post("/api/chat/", json={})
         assert response.status_code == 422  # Validation error
     
-    @patch('app.api.chat.langchain_service')
     def test_chat_stream_endpoint(self, mock_service):
-        """스트리밍 채팅 엔드포인트 테스트"""
-        async def mock_stream():
-            yield "안녕하세요"
-            yield " 메이플스토리"
-            yield " 도우미입니다."
+        """스트리밍 채팅 엔드포인트 테스트 - 타입이 있는 SSE 이벤트"""
+        async def mock_stream(**kwargs):
+            yield {"event": "retrieval", "data": {"sources": [], "scores": []}}
+            yield {"event": "token", "data": {"text": "안녕하세요"}}
+            yield {"event": "token", "data": {"text": " 메이플스토리 도우미입니다."}}
+            yield {"event": "usage", "data": {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}}
+            yield {"event": "done", "data": {
+                "response": "안녕하세요 메이플스토리 도우미입니다.",
+                "metadata": {"model": "claude-3-5-haiku-20241022", "tokens_used": 15},
+                "ttft_ms": 1,
+                "total_ms": 2
+            }}
         
-        mock_service.chat.return_value = mock_stream()
+        mock_service.stream_chat = mock_stream
         
         request_data = {
             "message": "안녕하세요",
+            "session_id": "test-stream",
             "stream": True
         }
         
         response = client.post("/api/chat/stream", json=request_data)
         assert response.status_code == 200
         assert response.headers["content-type"] == "text/event-stream; charset=utf-8"
+        
+        events = [
+            line.split(": ", 1)[1]
+            for line in response.text.splitlines() if line.startswith("event: ")
+        ]
+        assert events == ["session", "retrieval", "token", "token", "usage", "done"]
+        assert '"session_id": "test-stream"' in response.text
     
     def test_clear_session(self):
         """세션 초기화 테스트"""
@@ -96,16 +119,31 @@ class TestChatAPI:
         assert response.status_code == 200
         assert "message" in response.json()
 
+class TestMetricsAPI:
+    """메트릭 API 테스트"""
+    
+    def test_metrics_endpoint(self):
+        """Prometheus 텍스트 형식으로 단계별 지연 시간 노출"""
+        from app.utils.tracing import record_stage
+        record_stage("vector_search", 0.03)
+        
+        client.get("/api/health/")
+        
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'rag_stage_duration_seconds_count{stage="vector_search"}' in response.text
+        # 라우트 템플릿 기준 요청 지연 시간
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/health/",status="200"}' in response.text
+
 class TestDocumentsAPI:
     """문서 관리 API 테스트"""
     
-    @patch('app.services.document_processor.DocumentProcessor')
-    @patch('app.services.langchain_service.LangChainService')
-    def test_upload_document(self, mock_service, mock_processor):
+    @patch('app.api.documents.document_processor')
+    def test_upload_document(self, mock_processor, mock_service):
         """문서 업로드 테스트"""
         # Mock 파일 업로드
-        mock_processor.return_value.process_pdf.return_value = []
-        mock_service.return_value.add_documents.return_value = None
+        mock_processor.process_pdf = AsyncMock(return_value=[])
         
         # 테스트 파일 생성
         test_file_content = b"PDF file content"
@@ -30,6 +30,24 @@ class TestQAChain:
         call_args = mock_load_qa.call_args
         assert call_args[1]['prompt'] == MAPLESTORY_QA_PROMPT
 
+    def test_create_qa_chain_with_validated_documents(self):
+        """검증된 문서를 context로 직접 받는 QA 체인 테스트"""
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        
+        llm = FakeListChatModel(responses=["렌은 신규 직업입니다."])
+        qa_chain = create_qa_chain(llm)
+        
+        documents = [Document(page_content="렌 가이드", metadata={"source": "렌.md"})]
+        result = qa_chain.invoke({
+            "input": "렌 스킬 알려줘",
+            "chat_history": [],
+            "context": documents
+        })
+        
+        # 검색 없이 전달한 문서가 그대로 유지되어야 함
+        assert result["answer"] == "렌은 신규 직업입니다."
+        assert result["context"] is documents
+
 class TestPrompts:
     """프롬프트 테스트"""
     
@@ -150,6 +168,392 @@ class TestLangChainService:
         assert "metadata" in result
         assert result["response"] == "테스트 응답"
 
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    def test_chains_built_once(self, mock_vector, mock_embeddings, mock_claude):
+        """체인 캐시 테스트 - 설정이 같으면 재사용, 바뀌면 다시 빌드"""
+        from langchain_core.runnables import RunnableLambda
+        
+        mock_vector.return_value.get_retriever.return_value = RunnableLambda(lambda q: [])
+        service = LangChainService()
+        
+        chains1 = service._get_chains()
+        chains2 = service._get_chains()
+        assert chains1 is chains2
+        mock_vector.return_value.get_retriever.assert_called_once()
+        
+        with patch('app.services.langchain_service.settings') as mock_settings:
+            mock_settings.max_retrieval_docs = 10
+            chains3 = service._get_chains()
+        assert chains3 is not chains1
+        
+        # retriever 교체 시 체인도 교체
+        new_retriever = RunnableLambda(lambda q: [])
+        service.retriever = new_retriever
+        assert service.retriever is new_retriever
+        
+        # 설정이 바뀌어 재빌드돼도 지정한 retriever 유지
+        with patch('app.services.langchain_service.settings') as mock_settings:
+            mock_settings.max_retrieval_docs = 3
+            chains4 = service._get_chains()
+        assert chains4.settings_key != chains3.settings_key
+        assert chains4.retriever is new_retriever
+        
+        service.retriever = None
+        assert service.retriever is mock_vector.return_value.get_retriever.return_value
+    
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_semantic_cache_skips_llm(self, mock_vector, mock_embeddings, mock_claude):
+        """같은 질문을 다시 하면 검색/LLM 호출 없이 캐시된 답변 반환"""
+        from langchain_core.runnables import RunnableLambda
+        from app.services.langchain_service import ChainBundle
+        from app.utils.semantic_cache import SemanticAnswerCache
+        
+        mock_embeddings.return_value.aembed_query = AsyncMock(return_value=[1.0, 0.0])
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = SemanticAnswerCache(namespace="test")
+        
+        retrieved = []
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상"})
+        retriever = RunnableLambda(lambda q: retrieved.append(q) or [document])
+        qa_chain = Mock()
+        qa_chain.ainvoke = AsyncMock(return_value={"answer": "하드 스우 보상은 ..."})
+        chains = ChainBundle(settings_key=(), retriever=retriever, qa_chain=qa_chain)
+        
+        first = await service._enhanced_regular_chat(chains, "하드 스우 보상 알려줘", "s1", None)
+        second = await service._enhanced_regular_chat(chains, "하드 스우 보상 알려줘", "s2", None)
+        
+        assert qa_chain.ainvoke.await_count == 1
+        assert len(retrieved) == 1
+        assert second["response"] == first["response"]
+        assert second["metadata"]["cache_hit"] is True
+        assert [m.type for m in service.get_session_history("s2").messages] == ["human", "ai"]
+        
+        # 대화 기록이 있는 세션은 독립적인 질문이라도 캐시를 쓰지 않음
+        third = await service._enhanced_regular_chat(chains, "하드 스우 보상 알려줘", "s2", None)
+        assert qa_chain.ainvoke.await_count == 2
+        assert not third["metadata"].get("cache_hit")
+        
+        # 코퍼스가 바뀌면 다시 생성
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="1")
+        await service._enhanced_regular_chat(chains, "하드 스우 보상 알려줘", "s3", None)
+        assert qa_chain.ainvoke.await_count == 3
+
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_cache_probe_vector_reused_for_search(self, mock_vector, mock_embeddings, mock_claude):
+        """캐시 미스 시 캐시 조회에 쓴 질문 벡터로 검색 (질문 임베딩은 요청당 한 번)"""
+        from app.services.langchain_service import ChainBundle
+        from app.services.vector_store import VectorStoreRetriever
+        from app.utils.semantic_cache import SemanticAnswerCache
+        
+        mock_embeddings.return_value.aembed_query = AsyncMock(return_value=[1.0, 0.0])
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = SemanticAnswerCache(namespace="test")
+        
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상"})
+        vector_store_service = Mock()
+        vector_store_service.search = AsyncMock(return_value=[document])
+        qa_chain = Mock()
+        qa_chain.ainvoke = AsyncMock(return_value={"answer": "하드 스우 보상은 ..."})
+        chains = ChainBundle(
+            settings_key=(),
+            retriever=VectorStoreRetriever(vector_store_service=vector_store_service),
+            qa_chain=qa_chain,
+        )
+        
+        await service._enhanced_regular_chat(chains, "하드 스우 보상 알려줘", "s1", None)
+        assert mock_embeddings.return_value.aembed_query.await_count == 1
+        assert vector_store_service.search.await_args.kwargs["query_vector"] == [1.0, 0.0]
+
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_identical_requests_coalesced(self, mock_vector, mock_embeddings, mock_claude):
+        """대화 기록 없는 동일 질문의 동시 요청은 파이프라인을 한 번만 실행"""
+        import asyncio
+        from langchain_core.runnables import RunnableLambda
+        from app.services.langchain_service import ChainBundle
+        
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = None
+        
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상"})
+        
+        async def answer(inputs, config=None):
+            await asyncio.sleep(0.05)
+            return {"answer": "하드 스우 보상은 ..."}
+        
+        qa_chain = Mock()
+        qa_chain.ainvoke = AsyncMock(side_effect=answer)
+        service._chains = ChainBundle(
+            settings_key=service._chain_settings_key(),
+            retriever=RunnableLambda(lambda q: [document]),
+            qa_chain=qa_chain,
+        )
+        
+        results = await asyncio.gather(
+            service.chat("하드 스우 보상 알려줘", "s1"),
+            service.chat("하드 스우  보상 알려줘", "s2"),
+            service.chat("하드 스우 보상 알려줘", "s3"),
+        )
+        
+        assert qa_chain.ainvoke.await_count == 1
+        assert service.coalesced_requests == 2
+        assert len({result["response"] for result in results}) == 1
+        assert sum(1 for result in results if result["metadata"].get("coalesced")) == 2
+        # 공유받은 요청도 각자의 대화 기록에 턴이 남음
+        for session_id in ("s2", "s3"):
+            assert [m.type for m in service.get_session_history(session_id).messages] == ["human", "ai"]
+        assert not service._inflight
+
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_history_read_once_per_turn(self, mock_vector, mock_embeddings, mock_claude):
+        """대화 기록은 요청당 한 번만 조회해 재작성/QA 단계가 공유하고, 턴은 응답 후 추가"""
+        from langchain_core.messages import HumanMessage, AIMessage
+        from langchain_core.runnables import RunnableLambda
+        from app.services.langchain_service import ChainBundle
+        
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = None
+        history = [HumanMessage(content="하드 스우 공략"), AIMessage(content="하드 스우는 ...")]
+        await service.get_session_history("s1").aadd_messages(history)
+        service.question_rewriter.arewrite = AsyncMock(return_value="하드 스우 보상")
+        
+        reads = []
+        get_session_history = service.get_session_history
+        def counting_history(session_id):
+            session_history = get_session_history(session_id)
+            aget_messages = session_history.aget_messages
+            async def counted():
+                reads.append(session_id)
+                return await aget_messages()
+            session_history.aget_messages = counted
+            return session_history
+        service.get_session_history = counting_history
+        
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상"})
+        qa_chain = Mock()
+        qa_chain.ainvoke = AsyncMock(return_value={"answer": "하드 스우 보상은 ..."})
+        service._chains = ChainBundle(
+            settings_key=service._chain_settings_key(),
+            retriever=RunnableLambda(lambda q: [document]),
+            qa_chain=qa_chain,
+        )
+        
+        await service.chat("하드 스우 보상은?", "s1")
+        assert reads == ["s1"]
+        assert qa_chain.ainvoke.call_args[0][0]["chat_history"] == history
+        assert service.question_rewriter.arewrite.await_args[0][1] == history
+        assert [m.type for m in get_session_history("s1").messages] == ["human", "ai", "human", "ai"]
+
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_history_compacted_once_per_turn(self, mock_vector, mock_embeddings, mock_claude):
+        """기록 압축은 턴당 한 번 - 요약이 실패해도 다시 시도하지 않고 재작성/QA가 같은 결과 사용"""
+        from langchain_core.messages import HumanMessage, AIMessage
+        from langchain_core.runnables import RunnableLambda
+        from app.chains.history_compactor import HistoryCompactor
+        from app.services.langchain_service import ChainBundle
+        
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = None
+        summary_calls = []
+        def failing_summary(inputs):
+            summary_calls.append(inputs)
+            raise RuntimeError("summary failed")
+        service.history_compactor = HistoryCompactor(token_budget=200, keep_turns=2)
+        service.history_compactor.summary_chain = RunnableLambda(failing_summary)
+        history = []
+        for i in range(4):
+            history += [HumanMessage(content=f"하드 스우 질문 {i} " * 10), AIMessage(content=f"답변 {i} " * 20)]
+        await service.get_session_history("s1").aadd_messages(history)
+        service.question_rewriter.arewrite = AsyncMock(return_value="하드 스우 보상")
+        
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상"})
+        qa_chain = Mock()
+        qa_chain.ainvoke = AsyncMock(return_value={"answer": "하드 스우 보상은 ..."})
+        service._chains = ChainBundle(
+            settings_key=service._chain_settings_key(),
+            retriever=RunnableLambda(lambda q: [document]),
+            qa_chain=qa_chain,
+        )
+        
+        result = await service.chat("하드 스우 보상은?", "s1")
+        compacted = qa_chain.ainvoke.call_args[0][0]["chat_history"]
+        assert len(summary_calls) == 1
+        assert compacted == history[-len(compacted):] and len(compacted) < len(history)
+        assert service.question_rewriter.arewrite.await_args[0][1] == compacted
+        assert result["metadata"]["history_tokens_saved"] > 0
+
+    @patch('app.services.langchain_service.ChatAnthropic')
+    @patch('app.services.langchain_service.get_embeddings')
+    @patch('app.services.langchain_service.VectorStoreService')
+    @pytest.mark.asyncio
+    async def test_stream_chat_events(self, mock_vector, mock_embeddings, mock_claude):
+        """스트리밍은 retrieval → token → usage → done 순서이고 답변 LLM 토큰만 전달"""
+        from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+        from langchain_core.messages import AIMessage
+        from langchain_core.runnables import RunnableLambda
+        
+        mock_vector.return_value.get_corpus_version = AsyncMock(return_value="0")
+        service = LangChainService()
+        service.answer_cache = None
+        service.llm = GenericFakeChatModel(messages=iter([AIMessage(content="하드 스우 보상은 ...")]))
+        
+        document = Document(page_content="하드 스우 보상 목록", metadata={"title": "하드 스우 보상", "score": 0.9})
+        service.refresh_chains(RunnableLambda(lambda q: [document]))
+        
+        events = [event async for event in service.stream_chat("하드 스우 보상 알려줘", "s1")]
+        kinds = [event["event"] for event in events]
+        
+        assert kinds[0] == "retrieval"
+        assert events[0]["data"]["scores"] == [0.9]
+        assert set(kinds[1:-2]) == {"token"}
+        assert kinds[-2:] == ["usage", "done"]
+        assert "".join(event["data"]["text"] for event in events if event["event"] == "token") == "하드 스우 보상은 ..."
+        assert events[-1]["data"]["ttft_ms"] is not None
+        assert events[-1]["data"]["total_ms"] >= events[-1]["data"]["ttft_ms"]
+        timings = events[-1]["data"]["metadata"]["timings_ms"]
+        assert {"condense_rewrite", "relevance_filter", "llm_ttft", "llm_total", "response_validation"} <= set(timings)
+        assert [m.type for m in service.get_session_history("s1").messages] == ["human", "ai"]
+
+class TestHistoryCompactor:
+    """대화 기록 압축 테스트"""
+    
+    def _history(self, turns: int):
+        from langchain_core.messages import HumanMessage, AIMessage
+        messages = []
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"질문 {i} " + "스우 " * 20))
+            messages.append(AIMessage(content=f"답변 {i} " + "보상 " * 40))
+        return messages
+    
+    def _summarizer(self, calls: list):
+        from langchain_core.runnables import RunnableLambda
+        
+        def summarize(prompt_value):
+            calls.append(prompt_value.to_string())
+            return f"요약 {len(calls)}"
+        return RunnableLambda(summarize)
+    
+    def test_short_history_unchanged(self):
+        """예산 안이면 그대로 유지"""
+        from app.chains.history_compactor import HistoryCompactor
+        
+        history = self._history(2)
+        result = HistoryCompactor(token_budget=10000, keep_turns=6).compact(history)
+        assert result.messages == history
+        assert result.tokens_saved == 0
+    
+    def test_rolling_summary_cached(self):
+        """오래된 턴은 요약으로 대체, 다음 턴은 캐시된 요약 재사용 후 이어서 요약"""
+        from langchain_core.messages import HumanMessage, AIMessage
+        from app.chains.history_compactor import HistoryCompactor, SUMMARY_PREFIX
+        
+        calls = []
+        compactor = HistoryCompactor(llm=self._summarizer(calls), token_budget=400, keep_turns=4)
+        history = self._history(6)
+        
+        result = compactor.compact(history)
+        assert result.messages[0].content.startswith(SUMMARY_PREFIX)
+        assert result.messages[-1] == history[-1]
+        assert result.compacted_tokens <= 400
+        assert result.tokens_saved > 0
+        assert len(calls) == 1
+        
+        # 같은 기록은 LLM 호출 없이 캐시 사용
+        assert compactor.compact(history).messages == result.messages
+        assert len(calls) == 1
+        
+        # 턴이 계속 쌓이면 직전 요약에 이어서 요약
+        for i in range(6, 12):
+            history = history + [HumanMessage(content=f"질문 {i}"), AIMessage(content="답변 " * 60)]
+            result = compactor.compact(history)
+            assert result.compacted_tokens <= 400
+        assert 1 < len(calls) < 7
+        assert "요약 1" in "".join(calls[1:])
+    
+    def test_truncate_without_llm(self):
+        """요약 LLM이 없으면 오래된 턴을 잘라냄"""
+        from app.chains.history_compactor import HistoryCompactor
+        
+        history = self._history(6)
+        result = HistoryCompactor(token_budget=400, keep_turns=4).compact(history)
+        assert result.messages == history[-len(result.messages):]
+        assert result.messages[0].type == "human"
+        assert result.summarized_messages == len(history) - len(result.messages)
+    
+    @pytest.mark.asyncio
+    async def test_acompact_reports_tokens_saved(self):
+        """비동기 압축 결과의 절약 토큰 수"""
+        from app.chains.history_compactor import HistoryCompactor
+        
+        result = await HistoryCompactor(token_budget=400, keep_turns=4).acompact(self._history(6))
+        assert result.summarized_messages > 0
+        assert result.tokens_saved == result.original_tokens - result.compacted_tokens > 0
+
+class TestQuestionRewriter:
+    """검색 질문 재작성 fast path / 캐시 테스트"""
+    
+    def _rewriter(self, calls: list):
+        from langchain_core.runnables import RunnableLambda
+        from app.chains.question_rewriter import QuestionRewriter
+        
+        def condense(prompt_value):
+            calls.append(prompt_value)
+            return "하드 스우 보상"
+        return QuestionRewriter(RunnableLambda(condense))
+    
+    def test_is_self_contained(self):
+        """지시어가 없고 키워드가 충분하면 독립 질문"""
+        from app.chains.question_rewriter import is_self_contained
+        
+        assert is_self_contained("하드 스우 보상 알려줘")
+        assert is_self_contained("렌 스킬 트리 추천")
+        assert not is_self_contained("그 보스 보상은?")
+        assert not is_self_contained("그거 더 자세히 알려줘")
+        assert not is_self_contained("보상은?")
+    
+    @pytest.mark.asyncio
+    async def test_skip_and_cache(self):
+        """기록이 없거나 독립 질문이면 LLM 호출 생략, 같은 (기록, 질문)은 캐시"""
+        from langchain_core.messages import HumanMessage, AIMessage
+        
+        calls = []
+        rewriter = self._rewriter(calls)
+        history = [HumanMessage(content="하드 스우 공략"), AIMessage(content="하드 스우는...")]
+        
+        assert await rewriter.arewrite("보상은?", []) == "보상은?"
+        assert await rewriter.arewrite("챌린저스 포인트 보상 알려줘", history) == "챌린저스 포인트 보상 알려줘"
+        assert calls == []
+        
+        assert await rewriter.arewrite("보상은?", history) == "하드 스우 보상"
+        assert await rewriter.arewrite(" 보상은? ", history) == "하드 스우 보상"
+        assert len(calls) == 1
+        
+        stats = rewriter.stats()
+        assert stats["skipped"] == 2
+        assert stats["cache_hits"] == 1
+        assert stats["rewritten"] == 1
+
 class TestKoreanTextSplitter:
     """한국어 텍스트 분할기 테스트"""
     
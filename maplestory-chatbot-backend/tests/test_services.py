@@ -0,0 +1,523 @@
+import pytest
+import pytest_asyncio
+import asyncio
+import os
+
+from app.services.ingestion_manifest import IngestionManifest, make_chunk_id, manifest_path
+
+class TestIngestionManifest:
+    """증분 수집 매니페스트 테스트"""
+
+    def test_chunk_id_is_deterministic(self):
+        """같은 파일, 같은 위치, 같은 내용이면 같은 ID"""
+        chunk_id = make_chunk_id("markdown/렌_가이드.md", 0, "렌 스킬")
+        assert chunk_id == make_chunk_id("markdown/렌_가이드.md", 0, "렌 스킬")
+        assert chunk_id != make_chunk_id("markdown/렌_가이드.md", 0, "렌 스킬 (수정)")
+        assert chunk_id != make_chunk_id("markdown/렌_가이드.md", 1, "렌 스킬")
+
+    def test_detects_changed_and_removed_files(self, tmp_path):
+        """변경/삭제된 파일 감지"""
+        guide = tmp_path / "렌_가이드.md"
+        guide.write_text("렌 스킬", encoding="utf-8")
+
+        manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+        assert not manifest.is_unchanged("markdown/렌_가이드.md", str(guide))
+
+        manifest.update("markdown/렌_가이드.md", str(guide), ["id-1"])
+        manifest.save()
+
+        reloaded = IngestionManifest(str(tmp_path / "manifest.json"))
+        assert reloaded.is_unchanged("markdown/렌_가이드.md", str(guide))
+
+        guide.write_text("렌 스킬 (수정)", encoding="utf-8")
+        os.utime(guide, (0, 0))
+        assert not reloaded.is_unchanged("markdown/렌_가이드.md", str(guide))
+
+        assert reloaded.stale_files([], prefix="markdown/") == ["markdown/렌_가이드.md"]
+        assert reloaded.remove("markdown/렌_가이드.md") == ["id-1"]
+
+    def test_manifest_scoped_per_collection(self, tmp_path):
+        """백엔드/컬렉션마다 별도 매니페스트, reset은 파일까지 삭제"""
+        guide = tmp_path / "렌_가이드.md"
+        guide.write_text("렌 스킬", encoding="utf-8")
+
+        qdrant_path = manifest_path("qdrant", "maplestory_docs", str(tmp_path))
+        assert qdrant_path != manifest_path("local", "maplestory_docs", str(tmp_path))
+        assert qdrant_path != manifest_path("qdrant", "maplestory_docs_512", str(tmp_path))
+
+        manifest = IngestionManifest(qdrant_path)
+        manifest.update("markdown/렌_가이드.md", str(guide), ["id-1"])
+        manifest.save()
+        assert not IngestionManifest(manifest_path("local", "maplestory_docs", str(tmp_path))).is_unchanged(
+            "markdown/렌_가이드.md", str(guide)
+        )
+
+        manifest.reset()
+        assert not os.path.exists(qdrant_path)
+        assert not IngestionManifest(qdrant_path).is_unchanged("markdown/렌_가이드.md", str(guide))
+
+class TestVoyageEmbeddingsBatching:
+    """Voyage AI 문서 임베딩 배치 테스트"""
+
+    def _make_embeddings(self, **kwargs):
+        from unittest.mock import Mock
+        from app.services.embedding_service import VoyageEmbeddings
+
+        embeddings = VoyageEmbeddings(api_key="test-key", **kwargs)
+        embeddings._backoff = lambda attempt: 0
+        embeddings.client = Mock()
+        embeddings.client.embed.side_effect = lambda texts, **kw: Mock(
+            embeddings=[[float(len(t))] for t in texts]
+        )
+        return embeddings
+
+    def test_batches_respect_count_and_token_limits(self):
+        """청크 수 / 토큰 한도에 맞춰 배치 분할"""
+        embeddings = self._make_embeddings(batch_max_texts=2, batch_max_tokens=10)
+        texts = ["렌", "스우", "챌린저스 포인트 이벤트", "하드"]
+
+        batches = embeddings._make_batches(texts)
+        assert all(len(batch) <= 2 for batch in batches)
+        assert [i for batch in batches for i in batch] == [0, 1, 2, 3]
+
+        # 결과는 입력 순서 유지
+        assert embeddings.embed_documents(texts) == [[float(len(t))] for t in texts]
+        assert embeddings.client.embed.call_count == len(batches)
+
+    def test_transient_failure_retried_per_batch(self):
+        """일시적 실패는 해당 배치만 재시도"""
+        from unittest.mock import Mock
+
+        embeddings = self._make_embeddings(batch_max_texts=1, concurrency=1, max_retries=2)
+        calls = {"count": 0}
+
+        def flaky_embed(texts, **kwargs):
+            calls["count"] += 1
+            if calls["count"] == 2:
+                raise RuntimeError("rate limited")
+            return Mock(embeddings=[[1.0] for _ in texts])
+
+        embeddings.client.embed.side_effect = flaky_embed
+        assert embeddings.embed_documents(["렌", "스우", "하드"]) == [[1.0], [1.0], [1.0]]
+        assert calls["count"] == 4
+        assert embeddings.last_throughput > 0
+
+    def test_output_dimension_and_dtype_passthrough(self):
+        """출력 차원/타입을 API에 전달하고 binary 응답은 ±1 벡터로 복원"""
+        from unittest.mock import Mock
+
+        embeddings = self._make_embeddings(output_dimension=16, output_dtype="binary")
+        # offset binary: 0b10000001 → 1 - 128, 0b01111111 → 127 - 128
+        embeddings.client.embed.side_effect = lambda texts, **kw: Mock(embeddings=[[1, -1]])
+
+        vector = embeddings.embed_query("렌 스킬")
+        assert vector == [1.0] + [-1.0] * 6 + [1.0, -1.0] + [1.0] * 7
+        kwargs = embeddings.client.embed.call_args.kwargs
+        assert kwargs["output_dimension"] == 16 and kwargs["output_dtype"] == "binary"
+        assert embeddings.cache_model == "voyage-3.5-lite:16:binary"
+
+        with pytest.raises(ValueError):
+            self._make_embeddings(output_dtype="float16")
+
+class TestVectorStoreServiceAsync:
+    """AsyncQdrantClient 기반 검색/업서트 테스트 (로컬 메모리 모드)"""
+
+    @pytest_asyncio.fixture
+    async def vector_store_service(self):
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from qdrant_client import AsyncQdrantClient
+        from qdrant_client.models import Distance, VectorParams
+        from app.config import settings
+        from app.services.vector_store import VectorStoreService
+        from app.services.corpus_version import CorpusVersionStore
+
+        service = VectorStoreService.__new__(VectorStoreService)
+        service.embeddings = DeterministicFakeEmbedding(size=16)
+        service.client = None
+        service.vector_store = None
+        service.local_index = None
+        service.sparse_index = None
+        service._sparse_index_lock = asyncio.Lock()
+        service._sparse_index_version = None
+        service.async_client = AsyncQdrantClient(location=":memory:")
+        service.corpus_version = CorpusVersionStore(
+            settings.collection_name, qdrant_client=service.async_client, refresh_interval=0
+        )
+        await service.async_client.create_collection(
+            collection_name=settings.collection_name,
+            vectors_config=VectorParams(size=16, distance=Distance.COSINE)
+        )
+        yield service
+        await service.async_client.close()
+
+    @pytest.mark.asyncio
+    async def test_upsert_search_delete(self, vector_store_service):
+        """업서트 → 검색 → 삭제"""
+        from langchain.schema import Document
+
+        documents = [
+            Document(page_content="하드 스우 공략", metadata={"title": "스우"}),
+            Document(page_content="챌린저스 포인트 보상", metadata={"title": "챌린저스"}),
+        ]
+        ids = [make_chunk_id("a.md", i, doc.page_content) for i, doc in enumerate(documents)]
+
+        await vector_store_service.add_documents(documents, ids=ids)
+        await vector_store_service.add_documents(documents, ids=ids)  # 같은 ID는 덮어씀
+
+        results = await vector_store_service.search("하드 스우 공략", k=5)
+        assert len(results) == 2
+        assert results[0].page_content == "하드 스우 공략"
+        assert results[0].metadata["score"] == pytest.approx(1.0, abs=1e-4)
+        assert "스우" in results[0].metadata["search_ngrams"]
+        assert results[0].metadata["title_ngrams"] == ["스우"]
+
+        retriever = vector_store_service.get_retriever(k=1, search_type="mmr")
+        assert len(await retriever.ainvoke("챌린저스 포인트 보상")) == 1
+
+        await vector_store_service.delete_documents([ids[0]])
+        results = await vector_store_service.search("하드 스우 공략", k=5)
+        assert [doc.page_content for doc in results] == ["챌린저스 포인트 보상"]
+
+    @pytest.mark.asyncio
+    async def test_hybrid_search(self, vector_store_service):
+        """하이브리드 검색 - 정확한 용어 매칭이 RRF 결과 상위, 업서트 후 색인 갱신"""
+        from langchain.schema import Document
+
+        documents = [
+            Document(page_content="노말 스우 공략", metadata={"title": "노말 스우"}),
+            Document(page_content="하드 스우 패턴 정리", metadata={"title": "하드 스우"}),
+        ]
+        await vector_store_service.add_documents(documents)
+
+        results = await vector_store_service.search("하드 스우", k=2, search_type="hybrid", fetch_k=10)
+        assert results[0].metadata["title"] == "하드 스우"
+        assert "rrf_score" in results[0].metadata
+
+        await vector_store_service.add_documents([
+            Document(page_content="챌린저스 포인트 보상", metadata={"title": "챌린저스"})
+        ])
+        assert vector_store_service.sparse_index is None
+        results = await vector_store_service.search("챌린저스 포인트", k=1, search_type="hybrid", fetch_k=10)
+        assert results[0].metadata["title"] == "챌린저스"
+
+    @pytest.mark.asyncio
+    async def test_metadata_filter_pushdown(self, vector_store_service):
+        """질문의 직업으로 payload 필터 - 다른 직업 문서 제외, 직업 없는 공용 문서 포함"""
+        from langchain.schema import Document
+
+        documents = [
+            Document(page_content="나이트로드 6차 스킬", metadata={"title": "나이트로드", "class": "나이트로드"}),
+            Document(page_content="섀도어 6차 스킬", metadata={"title": "섀도어", "class": "섀도어"}),
+            Document(page_content="6차 스킬 공용 코어", metadata={"title": "공용"}),
+        ]
+        await vector_store_service.add_documents(documents)
+
+        results = await vector_store_service.search("6차 스킬", k=5, filter={"class": ["섀도어", None]})
+        assert sorted(doc.metadata["title"] for doc in results) == ["공용", "섀도어"]
+        assert await vector_store_service.search("6차 스킬", k=5, filter={"class": "아란"}) == []
+        assert len(await vector_store_service.search("6차 스킬", k=5, filter={"class": "아란"}, relax_filter=True)) == 3
+
+        retriever = vector_store_service.get_retriever(k=5, search_type="similarity", metadata_filtering=True)
+        titles = [doc.metadata["title"] for doc in await retriever.ainvoke("섀도어 6차 스킬")]
+        assert "나이트로드" not in titles and "섀도어" in titles
+
+    @pytest.mark.asyncio
+    async def test_quantized_search_params(self, vector_store_service, monkeypatch):
+        """양자화 설정 시 재점수/oversampling 검색 파라미터 사용"""
+        from langchain.schema import Document
+        from qdrant_client.models import ScalarQuantization
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "vector_quantization", "scalar")
+        assert isinstance(vector_store_service._quantization_config(), ScalarQuantization)
+        kwargs = vector_store_service._query_kwargs([0.0] * 16, "similarity", 5, None, 20, None)
+        assert kwargs["search_params"].quantization.rescore is True
+
+        await vector_store_service.add_documents([Document(page_content="하드 스우 공략", metadata={})])
+        results = await vector_store_service.search("하드 스우 공략", k=1)
+        assert results[0].metadata["score"] == pytest.approx(1.0, abs=1e-4)
+
+    def test_dimension_mismatch_fails_at_startup(self, monkeypatch):
+        """기존 컬렉션 차원이 VOYAGE_OUTPUT_DIMENSION과 다르면 시작 시 ValueError"""
+        from qdrant_client import QdrantClient
+        from app.config import settings
+        from app.services.vector_store import VectorStoreService
+
+        monkeypatch.setattr(settings, "embedding_provider", "voyage")
+        monkeypatch.setattr(settings, "voyage_output_dimension", 256)
+        service = VectorStoreService.__new__(VectorStoreService)
+        service.client = QdrantClient(location=":memory:")
+        service.verify_vector_size = True
+        service._create_collection(settings.collection_name, 256)
+        service._check_vector_size()
+
+        monkeypatch.setattr(settings, "voyage_output_dimension", 512)
+        with pytest.raises(ValueError, match="migrate_embeddings"):
+            service._ensure_collection_exists()
+
+        # 마이그레이션은 이전 차원 컬렉션을 읽으므로 검사를 끔
+        service.verify_vector_size = False
+        service._ensure_collection_exists()
+        service.client.close()
+
+    def test_collection_datatype_follows_output_dtype(self, monkeypatch):
+        """저장 타입은 전역 설정이 아니라 생성할 컬렉션의 출력 타입을 따름"""
+        from qdrant_client import QdrantClient
+        from qdrant_client.models import Datatype
+        from app.config import settings
+        from app.services.vector_store import VectorStoreService
+
+        monkeypatch.setattr(settings, "embedding_provider", "voyage")
+        monkeypatch.setattr(settings, "voyage_output_dtype", "float")
+        service = VectorStoreService.__new__(VectorStoreService)
+        service.client = QdrantClient(location=":memory:")
+        service._create_collection("docs_int8", 8, output_dtype="int8")
+        service._create_collection("docs_float", 8)
+
+        assert service.client.get_collection("docs_int8").config.params.vectors.datatype == Datatype.FLOAT16
+        assert service.client.get_collection("docs_float").config.params.vectors.datatype is None
+        service.client.close()
+
+    @pytest.mark.asyncio
+    async def test_corpus_version_shared(self, vector_store_service):
+        """다른 프로세스가 버전을 올리면 BM25 색인도 다시 생성"""
+        from langchain.schema import Document
+        from app.config import settings
+        from app.services.corpus_version import CorpusVersionStore
+
+        assert await vector_store_service.get_corpus_version() == "0"
+        await vector_store_service.add_documents([Document(page_content="하드 스우", metadata={})])
+        version = await vector_store_service.get_corpus_version()
+        assert int(version) > 0
+
+        index = await vector_store_service._get_sparse_index()
+        assert await vector_store_service._get_sparse_index() is index
+
+        # 수집 스크립트 등 다른 프로세스의 버전 증가
+        other = CorpusVersionStore(settings.collection_name, qdrant_client=vector_store_service.async_client)
+        assert int(await other.bump()) > int(version)
+        assert await vector_store_service._get_sparse_index() is not index
+
+class TestLocalVectorIndex:
+    """NumPy/mmap 로컬 벡터 색인 테스트 (Qdrant 없이 실행)"""
+
+    def _payload(self, title, **metadata):
+        return {"page_content": title, "metadata": {"title": title, **metadata}}
+
+    def test_query_filter_and_persistence(self, tmp_path):
+        """정확한 top-k, 메타데이터 필터, 덮어쓰기/삭제, 다른 프로세스의 쓰기 반영"""
+        from app.services.local_vector_index import LocalVectorIndex
+
+        index = LocalVectorIndex(str(tmp_path), "docs")
+        index.upsert(
+            ["a", "b", "c"],
+            [[1.0, 0.0], [0.6, 0.8], [0.0, 2.0]],
+            [
+                self._payload("렌", category="직업", tags=["5차", "6차"]),
+                self._payload("스우", category="보스"),
+                self._payload("윌", category="보스", tags=["6차"]),
+            ],
+        )
+        points = index.query([1.0, 0.0], limit=2)
+        assert [p.id for p in points] == ["a", "b"]
+        assert points[0].score == pytest.approx(1.0)
+        assert points[1].score == pytest.approx(0.6)
+        assert index.query([1.0, 0.0], limit=5, score_threshold=0.5)[-1].id == "b"
+
+        assert [p.id for p in index.query([1.0, 0.0], 5, query_filter={"category": "보스"})] == ["b", "c"]
+        assert [p.id for p in index.query([1.0, 0.0], 5, query_filter={"tags": "6차"})] == ["a", "c"]
+        assert [p.id for p in index.query([1.0, 0.0], 5, query_filter={"category": ["직업", "없음"]})] == ["a"]
+        assert [p.id for p in index.query([1.0, 0.0], 5, query_filter={"tags": ["5차", None]})] == ["a", "b"]
+        assert index.query([1.0, 0.0], 5, query_filter={"category": "보스", "tags": "5차"}) == []
+
+        # 같은 ID는 덮어쓰고 버전 증가
+        version = index.version
+        index.upsert(["b"], [[-1.0, 0.0]], [self._payload("스우 (수정)", category="보스")])
+        assert len(index) == 3 and index.version == version + 1
+        assert index.query([1.0, 0.0], limit=3)[-1].payload["page_content"] == "스우 (수정)"
+
+        # 다른 인스턴스(워커)는 파일에서 로드, 이후 쓰기도 refresh로 반영
+        other = LocalVectorIndex(str(tmp_path), "docs")
+        assert len(other) == 3 and other.version == index.version
+        index.delete(["a"])
+        assert len(other.refresh()) == 2
+        assert [p.id for p in other.query([1.0, 0.0], 5)] == ["c", "b"]
+        assert other.query([0.0, 1.0], 1, with_vectors=True)[0].vector == pytest.approx([0.0, 1.0])
+
+    @pytest.mark.parametrize("quantization, ratio", [("scalar", 4), ("binary", 32)])
+    def test_quantized_search_rescored(self, tmp_path, quantization, ratio):
+        """양자화 벡터로 후보 선정 후 원본 벡터로 재점수 - 정확한 검색과 같은 결과"""
+        import numpy as np
+        from app.services.local_vector_index import LocalVectorIndex
+
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(500, 128)).astype(np.float32)
+        ids = [str(i) for i in range(len(vectors))]
+        payloads = [{"page_content": str(i), "metadata": {"group": i % 2}} for i in range(len(vectors))]
+
+        exact = LocalVectorIndex(str(tmp_path / "exact"), "docs")
+        exact.upsert(ids, vectors, payloads)
+        index = LocalVectorIndex(str(tmp_path / quantization), "docs", quantization=quantization, oversampling=4)
+        index.upsert(ids, vectors, payloads)
+        assert exact.vector_bytes == index.vector_bytes * ratio
+
+        query = vectors[42] + rng.normal(scale=0.1, size=128).astype(np.float32)
+        expected = exact.query(query, limit=3)
+        points = index.query(query, limit=3)
+        assert points[0].id == "42"
+        assert points[0].score == pytest.approx(expected[0].score, abs=1e-5)
+        assert index.query(query, limit=3, query_filter={"group": 1})[0].id != "42"
+
+        # 설정을 바꿔 다시 열면 원본 벡터에서 양자화 파일 생성
+        (tmp_path / quantization / f"docs.{quantization}.npy").unlink()
+        reopened = LocalVectorIndex(str(tmp_path / quantization), "docs", quantization=quantization, oversampling=4)
+        assert reopened.query(query, limit=1)[0].id == "42"
+
+    @pytest.mark.asyncio
+    async def test_vector_store_service_local_backend(self, tmp_path, monkeypatch):
+        """vector_store_type=local - 업서트, 필터 검색, 하이브리드, 코퍼스 버전"""
+        from langchain.schema import Document
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from app.config import settings
+        from app.services.vector_store import VectorStoreService
+
+        monkeypatch.setattr(settings, "vector_store_type", "local")
+        monkeypatch.setattr(settings, "local_index_path", str(tmp_path))
+        monkeypatch.setattr(settings, "corpus_version_refresh_interval", 0)
+        service = VectorStoreService(DeterministicFakeEmbedding(size=16))
+        assert service.local_index is not None and service.client is None
+
+        documents = [
+            Document(page_content="하드 스우 공략", metadata={"title": "하드 스우", "category": "보스"}),
+            Document(page_content="챌린저스 포인트 보상", metadata={"title": "챌린저스", "category": "이벤트"}),
+        ]
+        assert await service.get_corpus_version() == "0"
+        await service.add_documents(documents, ids=["1", "2"])
+        assert await service.get_corpus_version() == "1"
+
+        results = await service.search("하드 스우 공략", k=5)
+        assert results[0].page_content == "하드 스우 공략"
+        assert results[0].metadata["score"] == pytest.approx(1.0, abs=1e-4)
+        assert results[0].metadata["title_ngrams"]
+
+        results = await service.search("하드 스우 공략", k=5, filter={"category": "이벤트"})
+        assert [doc.metadata["title"] for doc in results] == ["챌린저스"]
+
+        results = await service.search("챌린저스 포인트", k=1, search_type="hybrid", fetch_k=10)
+        assert results[0].metadata["title"] == "챌린저스"
+        assert len(await service.get_retriever(k=1, search_type="mmr").ainvoke("하드 스우")) == 1
+
+        await service.delete_documents(["1"])
+        assert [doc.metadata["title"] for doc in service.search_sync("하드 스우 공략", k=5)] == ["챌린저스"]
+        assert service.get_collection_info()["points_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_migrate_collection_reprojects(self, tmp_path, monkeypatch):
+        """재임베딩 없이 앞 차원만 남겨 새 색인으로 마이그레이션"""
+        import numpy as np
+        from langchain.schema import Document
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from app.config import settings
+        from app.services.local_vector_index import LocalVectorIndex
+        from app.services.vector_store import VectorStoreService, CONTENT_PAYLOAD_KEY
+
+        monkeypatch.setattr(settings, "vector_store_type", "local")
+        monkeypatch.setattr(settings, "local_index_path", str(tmp_path))
+        service = VectorStoreService(DeterministicFakeEmbedding(size=16))
+        await service.add_documents(
+            [Document(page_content=f"문서 {i}", metadata={"title": str(i)}) for i in range(5)],
+            ids=[str(i) for i in range(5)]
+        )
+
+        assert await service.migrate_collection("docs_8", dimension=8) == 5
+        target = LocalVectorIndex(str(tmp_path), "docs_8")
+        assert target.dimension == 8 and len(target) == 5
+        source = {point.id: point.vector for point in service.local_index.scroll(with_vectors=True)}
+        for point in target.scroll(with_vectors=True):
+            expected = np.asarray(source[point.id][:8])
+            assert np.allclose(point.vector, expected / np.linalg.norm(expected), atol=1e-6)
+            assert point.payload[CONTENT_PAYLOAD_KEY] == f"문서 {point.id}"
+
+        with pytest.raises(ValueError):
+            await service.migrate_collection("docs_32", dimension=32)
+
+class TestSessionHistory:
+    """세션 대화 기록 저장소 테스트"""
+
+    def _turn(self, i: int):
+        from langchain_core.messages import HumanMessage, AIMessage
+        return [HumanMessage(content=f"질문 {i}"), AIMessage(content=f"답변 {i}")]
+
+    def test_memory_backend_bounds(self):
+        """턴 수 제한 + 세션 수 LRU 제한"""
+        from app.services.session_history import InMemoryHistoryBackend, SessionChatMessageHistory
+
+        backend = InMemoryHistoryBackend(max_sessions=2, max_turns=2)
+        history = SessionChatMessageHistory("a", backend)
+        for i in range(3):
+            history.add_messages(self._turn(i))
+        assert [m.content for m in history.messages] == ["질문 1", "답변 1", "질문 2", "답변 2"]
+
+        backend.add_messages("b", self._turn(0))
+        backend.get_messages("a")  # a를 최근 사용으로 갱신
+        backend.add_messages("c", self._turn(0))
+        assert len(backend) == 2
+        assert backend.active_sessions() == 2
+        assert backend.get_messages("b") == []
+        assert len(backend.get_messages("a")) == 4
+
+    def test_memory_backend_ttl(self):
+        """TTL이 지난 세션은 비어 있음"""
+        from app.services.session_history import InMemoryHistoryBackend
+
+        backend = InMemoryHistoryBackend(ttl=0)
+        backend.add_messages("a", self._turn(0))
+        assert backend.get_messages("a") == []
+        assert len(backend) == 0
+
+    def test_redis_backend_active_sessions(self):
+        """Redis 저장소는 키 스캔 없이 만료 시각 정렬 집합으로 활성 세션 수 조회"""
+        import time
+        from unittest.mock import Mock
+        from app.services.session_history import RedisHistoryBackend
+
+        sessions = {}
+        redis_client = Mock()
+        pipe = redis_client.pipeline.return_value
+        pipe.zadd.side_effect = lambda key, mapping: sessions.update(mapping)
+        pipe.zrem.side_effect = lambda key, *members: [sessions.pop(member, None) for member in members]
+        pipe.zremrangebyscore.side_effect = lambda key, low, high: [
+            sessions.pop(member) for member, score in list(sessions.items()) if score <= high
+        ]
+        pipe.execute.side_effect = lambda: [len(sessions)]
+
+        backend = RedisHistoryBackend(redis_client, ttl=60)
+        backend.add_messages("a", self._turn(0))
+        backend.add_messages("b", self._turn(0))
+        backend.add_messages("a", self._turn(1))
+        sessions["expired"] = time.time() - 1
+        assert backend.active_sessions() == 2
+
+        backend.clear("b")
+        assert backend.active_sessions() == 1
+        redis_client.scan_iter.assert_not_called()
+
+    def test_sqlite_backend_shared(self, tmp_path):
+        """SQLite 저장소는 연결(워커) 간 기록 공유, 턴 수 제한"""
+        from app.services.session_history import SQLiteHistoryBackend
+
+        path = str(tmp_path / "history.sqlite3")
+        worker1 = SQLiteHistoryBackend(path, max_turns=2)
+        worker2 = SQLiteHistoryBackend(path, max_turns=2)
+
+        for i in range(3):
+            worker1.add_messages("a", self._turn(i))
+        messages = worker2.get_messages("a")
+        assert [m.content for m in messages] == ["질문 1", "답변 1", "질문 2", "답변 2"]
+        assert messages[0].type == "human"
+        assert worker2.active_sessions() == 1
+
+        worker2.clear("a")
+        assert worker1.get_messages("a") == []
+        worker1.close()
+        worker2.close()
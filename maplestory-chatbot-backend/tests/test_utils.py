@@ -0,0 +1,488 @@
+import pytest
+import time
+from unittest.mock import Mock
+
+from app.utils.embedding_cache import (
+    QueryEmbeddingCache, DocumentEmbeddingCache, CachedDocumentEmbeddings, normalize_query
+)
+
+class TestQueryEmbeddingCache:
+    """질문 임베딩 캐시 테스트"""
+
+    def test_normalized_key_hit(self):
+        """정규화된 질문은 같은 캐시 항목을 사용"""
+        cache = QueryEmbeddingCache(model="voyage-3.5-lite")
+        cache.set("렌 스킬", [0.1, 0.2, 0.3])
+
+        assert normalize_query("  렌   스킬 ") == "렌 스킬"
+        assert cache.get("  렌   스킬 ") == pytest.approx([0.1, 0.2, 0.3])
+        assert cache.get("챌린저스 코인샵") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_byte_bound_eviction(self):
+        """바이트 한도를 넘으면 오래된 항목부터 제거"""
+        # float32 4차원 = 16바이트, 두 개까지만 보관
+        cache = QueryEmbeddingCache(model="m", max_bytes=32)
+        cache.set("a", [1.0] * 4)
+        cache.set("b", [2.0] * 4)
+        cache.get("a")  # a를 최근 사용으로 갱신
+        cache.set("c", [3.0] * 4)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats()["bytes"] == 32
+
+    def test_ttl_expiry(self):
+        """TTL이 지난 항목은 반환하지 않음"""
+        cache = QueryEmbeddingCache(model="m", ttl=0)
+        cache.set("렌 스킬", [0.1])
+        assert cache.get("렌 스킬") is None
+
+    def test_model_change_invalidates(self):
+        """모델 변경 시 캐시 무효화"""
+        cache = QueryEmbeddingCache(model="voyage-3.5-lite")
+        cache.set("렌 스킬", [0.1])
+        cache.reset("voyage-3.5")
+
+        assert cache.model == "voyage-3.5"
+        assert cache.get("렌 스킬") is None
+
+    def test_redis_second_tier(self):
+        """메모리에 없으면 Redis에서 조회 후 메모리에 채움"""
+        store = {}
+        redis_cache = Mock()
+        redis_cache.get.side_effect = lambda key, use_l1=True: store.get(key)
+        redis_cache.set.side_effect = lambda key, value, ttl=None, use_l1=True: store.__setitem__(key, value)
+
+        QueryEmbeddingCache(model="m", cache_service=redis_cache).set("렌 스킬", [0.5, 0.25])
+
+        cache = QueryEmbeddingCache(model="m", cache_service=redis_cache)
+        assert cache.get("렌 스킬") == pytest.approx([0.5, 0.25])
+        assert cache.get("렌 스킬") == pytest.approx([0.5, 0.25])
+        assert cache.stats()["redis_hits"] == 1
+        assert cache.stats()["hits"] == 1
+
+class TestDocumentEmbeddingCache:
+    """문서 임베딩 영구 캐시 테스트"""
+
+    def test_only_changed_chunks_embedded(self, tmp_path):
+        """재수집 시 변경된 청크만 임베딩"""
+        base = Mock()
+        base.embed_documents.side_effect = lambda texts: [[float(len(t)), 1.0] for t in texts]
+
+        cache = DocumentEmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        embeddings = CachedDocumentEmbeddings(base, cache, provider="voyage", model="voyage-3.5-lite")
+
+        first = embeddings.embed_documents(["렌 가이드", "하드 스우", "렌 가이드"])
+        assert first[0] == first[2]
+        assert base.embed_documents.call_args[0][0] == ["렌 가이드", "하드 스우"]
+
+        second = embeddings.embed_documents(["렌 가이드", "챌린저스 포인트"])
+        assert base.embed_documents.call_args[0][0] == ["챌린저스 포인트"]
+        assert second[0] == first[0]
+        assert embeddings.embedded_count == 3
+
+    @pytest.mark.asyncio
+    async def test_async_lookup_off_event_loop(self, tmp_path):
+        """비동기 임베딩 시 SQLite 조회/저장은 이벤트 루프 스레드 밖에서 실행"""
+        import threading
+        from unittest.mock import AsyncMock
+
+        base = Mock()
+        base.aembed_documents = AsyncMock(side_effect=lambda texts: [[float(len(t)), 1.0] for t in texts])
+        cache = DocumentEmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        threads = []
+        for name in ("get_many", "put_many"):
+            original = getattr(cache, name)
+            def recorded(*args, _original=original):
+                threads.append(threading.get_ident())
+                return _original(*args)
+            setattr(cache, name, recorded)
+
+        embeddings = CachedDocumentEmbeddings(base, cache, provider="voyage", model="voyage-3.5-lite")
+        assert await embeddings.aembed_documents(["렌 가이드", "하드 스우"]) == [[5.0, 1.0], [5.0, 1.0]]
+        assert await embeddings.aembed_documents(["렌 가이드"]) == [[5.0, 1.0]]
+        assert base.aembed_documents.await_count == 1
+        assert threads and threading.get_ident() not in threads
+
+    def test_model_scoped_keys(self, tmp_path):
+        """모델이 다르면 캐시를 공유하지 않음"""
+        cache = DocumentEmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        text_hash = cache.hash_text("렌 가이드")
+        cache.put_many("voyage", "voyage-3.5-lite", {text_hash: [0.5, 0.25]})
+
+        assert cache.get_many("voyage", "voyage-3.5-lite", [text_hash]) == {text_hash: [0.5, 0.25]}
+        assert cache.get_many("voyage", "voyage-3.5", [text_hash]) == {}
+
+class TestSparseIndex:
+    """한국어 n-gram BM25 / RRF 테스트"""
+
+    def test_tokenize_korean_spacing_invariant(self):
+        """띄어쓰기가 달라도 같은 bigram 포함"""
+        from app.utils.sparse_index import tokenize_korean
+
+        assert tokenize_korean("하드 스우") == ["하드", "드스", "스우"]
+        assert set(tokenize_korean("하드스우")) == {"하드", "드스", "스우"}
+        assert tokenize_korean("렌 5차 skill") == ["렌", "5", "차", "skill"]
+
+    def test_bm25_exact_term_ranks_first(self):
+        """정확한 게임 용어를 포함한 청크가 상위"""
+        from app.utils.sparse_index import BM25Index
+
+        index = BM25Index().build([
+            ("a", "노말 스우 공략과 보상", None),
+            ("b", "하드 스우 공략 패턴 정리", None),
+            ("c", "챌린저스 포인트 보상 상점", None),
+        ])
+
+        results = index.search("하드 스우", k=2)
+        assert [item_id for item_id, _, _ in results] == ["b", "a"]
+        assert index.search("챌린저스 포인트", k=5)[0][0] == "c"
+        assert index.search("제로", k=5) == []
+
+    def test_reciprocal_rank_fusion(self):
+        """두 순위에 모두 있는 항목이 상위"""
+        from app.utils.sparse_index import reciprocal_rank_fusion
+
+        fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+        assert [item_id for item_id, _ in fused] == ["b", "a", "c"]
+
+class TestRelevanceScoring:
+    """검색 후 관련성 일괄 계산 테스트"""
+
+    def test_extract_keywords(self):
+        """메이플 패턴 + 일반 명사 추출"""
+        from app.utils.relevance import extract_keywords
+
+        keywords = extract_keywords("하드 스우 보상 알려줘")
+        assert "하드 스우" in keywords
+        assert "보상" in keywords
+
+    def test_score_documents(self):
+        """질문 키워드를 포함한 청크가 높은 점수"""
+        from langchain.schema import Document
+        from app.utils.relevance import extract_keywords, score_documents
+
+        query = "하드 스우 보상"
+        documents = [
+            Document(page_content="하드 스우 처치 시 보상 목록", metadata={"title": "하드 스우 보상"}),
+            Document(page_content="챌린저스 포인트 상점 안내", metadata={"title": "챌린저스"}),
+            Document(page_content="하드스우 공략", metadata={}),
+        ]
+        scores = score_documents(query, documents, extract_keywords(query))
+
+        assert scores["content_relevance"][0] == pytest.approx(1.0)
+        assert scores["title_relevance"][0] > 0.9
+        assert scores["content_relevance"][1] == 0.0
+        assert scores["title_relevance"][1] == 0.0
+        # 띄어쓰기가 달라도 매칭, 제목이 없으면 제목 점수 0
+        assert scores["content_relevance"][2] > 0.0
+        assert scores["title_relevance"][2] == 0.0
+
+    def test_precomputed_ngrams_match_on_the_fly(self):
+        """수집 시 저장한 n-gram과 즉석 계산 결과가 같음"""
+        from langchain.schema import Document
+        from app.utils.relevance import extract_keywords, score_documents, build_ngram_features
+
+        query = "렌 스킬 트리"
+        title, content = "렌 가이드", "렌 5차 스킬 트리와 코어 강화 순서"
+        plain = Document(page_content=content, metadata={"title": title})
+        precomputed = Document(
+            page_content=content,
+            metadata={"title": title, **build_ngram_features(title, content)}
+        )
+
+        keywords = extract_keywords(query)
+        expected = score_documents(query, [plain], keywords)
+        actual = score_documents(query, [precomputed], keywords)
+        assert actual["title_relevance"] == pytest.approx(expected["title_relevance"])
+        assert actual["content_relevance"] == pytest.approx(expected["content_relevance"])
+
+class TestQueryFilters:
+    """질문 기반 메타데이터 필터 추출 테스트"""
+
+    def test_extract_metadata_filter(self):
+        """직업(긴 이름 우선)/서버 추출, 필드 없는 문서는 None으로 허용"""
+        from app.utils.query_filters import extract_metadata_filter
+
+        assert extract_metadata_filter("아크메이지 불독 6차 스킬") == {"class": ["아크메이지", None]}
+        assert extract_metadata_filter("리부트 나이트로드랑 섀도어 보스 추천")["class"] == ["나이트로드", "섀도어", None]
+
+        query_filter = extract_metadata_filter("리부트 섀도어 보스 세팅")
+        assert query_filter["server_type"] == ["리부트", "both", None]
+        assert "category" not in query_filter
+        assert extract_metadata_filter("일반 몬스터 사냥 팁") == {}
+        assert extract_metadata_filter("챌린저스 포인트 보상") == {}
+
+    @pytest.mark.asyncio
+    async def test_filter_keeps_real_corpus_categories(self):
+        """실제 수집 문서의 카테고리 값(자유 형식 포함)은 필터로 제외되지 않음"""
+        import glob
+        from app.services.document_processor import DocumentProcessor
+        from app.utils.query_filters import extract_metadata_filter, matches_metadata_filter
+
+        processor = DocumentProcessor()
+        metadatas = []
+        for path in sorted(glob.glob("data/markdown/**/*.md", recursive=True)):
+            metadatas.append((await processor.process_markdown(path))[0].metadata)
+        if not metadatas:
+            pytest.skip("data/markdown 문서 없음")
+        assert len({metadata.get("category") for metadata in metadatas}) > 1
+
+        for question in ["보스 추천 직업", "스타포스 강화 비용", "사냥터 추천", "직업 가이드", "이벤트 퀘스트 보상"]:
+            query_filter = extract_metadata_filter(question)
+            assert all(matches_metadata_filter(metadata, query_filter) for metadata in metadatas), question
+
+        # 직업 질문은 다른 직업 문서만 제외하고, 카테고리와 무관하게 공용 문서는 유지
+        query_filter = extract_metadata_filter("섀도어 보스 세팅")
+        for metadata in metadatas:
+            expected = metadata.get("class") in (None, "", "섀도어")
+            assert matches_metadata_filter(metadata, query_filter) == expected
+
+    def test_matches_metadata_filter(self):
+        """필드끼리는 AND, 값은 OR, None은 필드 없음"""
+        from app.utils.query_filters import matches_metadata_filter
+
+        query_filter = {"class": ["섀도어", None], "server_type": ["리부트", "both"]}
+        assert matches_metadata_filter({"class": "섀도어", "server_type": "both"}, query_filter)
+        assert matches_metadata_filter({"server_type": "리부트"}, query_filter)
+        assert not matches_metadata_filter({"class": "나이트로드", "server_type": "both"}, query_filter)
+        assert not matches_metadata_filter({"class": "섀도어", "server_type": "일반"}, query_filter)
+        assert matches_metadata_filter({"tags": ["5차", "6차"]}, {"tags": "6차"})
+
+class TestSemanticAnswerCache:
+    """의미 기반 답변 캐시 테스트"""
+
+    def test_similar_query_hit(self):
+        """유사도가 임계값 이상이면 캐시 적중, 미만이면 미스"""
+        from app.utils.semantic_cache import SemanticAnswerCache
+
+        cache = SemanticAnswerCache(namespace="m", threshold=0.95)
+        cache.store("하드 스우 보상", [1.0, 0.0, 0.0], {"response": "보상 목록"}, corpus_version="1")
+
+        hit = cache.lookup([0.99, 0.05, 0.0], corpus_version="1")
+        assert hit is not None
+        assert hit[0] == {"response": "보상 목록"}
+        assert hit[1] > 0.95
+        assert cache.lookup([0.0, 1.0, 0.0], corpus_version="1") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_corpus_version_invalidates(self):
+        """코퍼스 버전이 바뀌면 캐시 무효"""
+        from app.utils.semantic_cache import SemanticAnswerCache
+
+        cache = SemanticAnswerCache(namespace="m")
+        cache.store("렌 스킬", [1.0, 0.0], {"response": "a"}, corpus_version="1")
+        assert cache.lookup([1.0, 0.0], corpus_version="2") is None
+        assert cache.stats()["stale"] == 1
+        assert len(cache) == 0
+
+    def test_stale_nearest_does_not_hide_fresh_match(self):
+        """가장 가까운 항목이 만료/이전 버전이어도 임계값을 넘는 유효한 항목이 있으면 적중"""
+        from app.utils.semantic_cache import SemanticAnswerCache
+
+        cache = SemanticAnswerCache(namespace="m", threshold=0.95)
+        cache.store("렌 스킬", [1.0, 0.0], {"response": "old"}, corpus_version="1")
+        cache.store("렌 스킬 추천", [1.0, 0.0], {"response": "expired"}, corpus_version="2",
+                    expires_at=time.time() - 1)
+        cache.store("렌 스킬 트리", [0.98, 0.2], {"response": "fresh"}, corpus_version="2")
+
+        hit = cache.lookup([1.0, 0.0], corpus_version="2")
+        assert hit is not None and hit[0]["response"] == "fresh"
+        assert len(cache) == 1
+        assert cache.stats()["stale"] == 1
+
+    def test_lru_eviction(self):
+        """최대 항목 수를 넘으면 오래 사용하지 않은 항목 제거"""
+        from app.utils.semantic_cache import SemanticAnswerCache
+
+        cache = SemanticAnswerCache(namespace="m", max_entries=2)
+        cache.store("a", [1.0, 0.0, 0.0], {"response": "a"}, corpus_version="1")
+        cache.store("b", [0.0, 1.0, 0.0], {"response": "b"}, corpus_version="1")
+        cache.lookup([1.0, 0.0, 0.0], corpus_version="1")  # a를 최근 사용으로 갱신
+        cache.store("c", [0.0, 0.0, 1.0], {"response": "c"}, corpus_version="1")
+
+        assert cache.lookup([0.0, 1.0, 0.0], corpus_version="1") is None
+        assert cache.lookup([1.0, 0.0, 0.0], corpus_version="1")[0]["response"] == "a"
+        assert cache.lookup([0.0, 0.0, 1.0], corpus_version="1")[0]["response"] == "c"
+        assert cache.stats()["evictions"] == 1
+
+    def test_redis_restore(self):
+        """Redis에 저장한 항목을 새 인스턴스에서 복원"""
+        from app.utils.semantic_cache import SemanticAnswerCache
+
+        store = {}
+        redis_client = Mock()
+        pipe = redis_client.pipeline.return_value
+        pipe.hset.side_effect = lambda key, field, value: store.__setitem__(field, value)
+        redis_client.hgetall.side_effect = lambda key: dict(store)
+
+        SemanticAnswerCache(namespace="m", redis_client=redis_client).store(
+            "렌 스킬", [0.6, 0.8], {"response": "렌"}, corpus_version="1"
+        )
+
+        restored = SemanticAnswerCache(namespace="m", redis_client=redis_client)
+        assert restored.load() == 1
+        assert restored.lookup([0.6, 0.8], corpus_version="1")[0] == {"response": "렌"}
+
+class TestCacheService:
+    """2단계 캐시 서비스 테스트 (Redis 없이 L1만)"""
+
+    @pytest.fixture
+    def cache(self):
+        from app.utils.cache import CacheService
+        from app.config import settings
+
+        redis_url = settings.redis_url
+        settings.redis_url = None
+        try:
+            yield CacheService()
+        finally:
+            settings.redis_url = redis_url
+
+    @pytest.mark.asyncio
+    async def test_l1_and_namespace_stats(self, cache):
+        """L1 적중과 네임스페이스별 통계"""
+        await cache.aset("response:a", "답변")
+        assert await cache.aget("response:a") == "답변"
+        assert await cache.aget("response:b") is None
+        assert await cache.amget(["response:a", "qemb:x"]) == ["답변", None]
+
+        stats = cache.stats()
+        assert stats["response"]["l1_hits"] == 2
+        assert stats["response"]["misses"] == 1
+        assert stats["qemb"]["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_negative_caching(self, cache):
+        """Redis에 없는 키는 짧은 TTL로 기억, 저장하면 덮어씀"""
+        from app.utils.cache import _NEGATIVE
+
+        cache._fill_l1("response:a", None)
+        assert cache.l1.get("response:a") is _NEGATIVE
+        assert await cache.aget("response:a") is None
+        assert cache.stats()["response"]["negative_hits"] == 1
+
+        await cache.aset("response:a", "답변")
+        assert await cache.aget("response:a") == "답변"
+
+    @pytest.mark.asyncio
+    async def test_single_flight(self, cache):
+        """같은 키의 동시 요청은 factory를 한 번만 실행"""
+        import asyncio
+
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "값"
+
+        results = await asyncio.gather(*[cache.get_or_set("response:k", factory) for _ in range(5)])
+        assert results == ["값"] * 5
+        assert len(calls) == 1
+        assert cache.stats()["response"]["coalesced"] == 4
+
+    def test_async_pool_bound_to_running_loop(self, cache, monkeypatch):
+        """비동기 풀은 루프 안에서 처음 사용할 때 생성되고 루프가 바뀌면 새로 생성"""
+        import asyncio
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "redis_url", "redis://localhost:6379")
+        cache.redis_client = Mock()  # 동기 연결 확인이 끝난 상태
+        assert cache.async_client is None  # 루프 밖에서는 만들지 않음
+
+        async def clients():
+            return cache.async_client, cache.get_async_client()
+
+        first, same = asyncio.run(clients())
+        assert first is not None and first is same
+        second, _ = asyncio.run(clients())
+        assert second is not first
+
+        async def close():
+            client = cache.async_client
+            await cache.aclose()
+            return client
+
+        asyncio.run(close())
+        assert cache._async_client is None
+
+class TestStageTracing:
+    """단계별 지연 시간 기록 테스트"""
+
+    def test_stage_spans_recorded_per_request(self):
+        """요청 범위 안의 단계만 합산되고, 히스토그램에는 항상 기록"""
+        from app.utils.metrics import MetricsRegistry
+        from app.utils.tracing import stage_span, trace_stages, record_stage
+
+        with trace_stages() as timings:
+            record_stage("vector_search", 0.2)
+            record_stage("vector_search", 0.1)
+            with stage_span("relevance_filter"):
+                pass
+        record_stage("vector_search", 5.0)  # 요청 밖 - 현재 요청에는 반영되지 않음
+
+        result = timings.as_dict()
+        assert result["vector_search"] == pytest.approx(300.0)
+        assert "relevance_filter" in result
+
+        registry = MetricsRegistry()
+        histogram = registry.histogram("stage_seconds", "테스트", labelnames=("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "llm_total")
+        histogram.observe(0.5, "llm_total")
+        histogram.observe(3.0, "llm_total")
+        text = registry.render()
+        assert '# TYPE stage_seconds histogram' in text
+        assert 'stage_seconds_bucket{stage="llm_total",le="0.1"} 1' in text
+        assert 'stage_seconds_bucket{stage="llm_total",le="1.0"} 2' in text
+        assert 'stage_seconds_bucket{stage="llm_total",le="+Inf"} 3' in text
+        assert 'stage_seconds_count{stage="llm_total"} 3' in text
+
+class TestMetricsRegistry:
+    """메트릭 저장소 테스트"""
+
+    def test_counter_shards_merged(self):
+        """스레드별 샤드에 기록한 값이 스크랩 시 합산됨"""
+        import threading
+        from app.utils.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        tokens = registry.counter("tokens", "테스트", labelnames=("type",))
+
+        def work():
+            for _ in range(1000):
+                tokens.inc("input")
+                tokens.inc("output", amount=2)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert tokens.value("input") == 4000
+        text = registry.render()
+        assert '# TYPE tokens counter' in text
+        assert 'tokens_total{type="output"} 8000' in text
+
+    def test_gauge_collects_at_scrape(self):
+        """게이지는 스크랩 시 collect 함수 값을 사용하고, 재등록하면 함수만 교체"""
+        from app.utils.metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.gauge("sessions", "테스트", collect=lambda: {(): 3})
+        assert "sessions 3" in registry.render()
+
+        registry.gauge("sessions", "테스트", collect=lambda: {(): 5})
+        assert "sessions 5" in registry.render()
+
+        registry.gauge("broken", "테스트", collect=lambda: 1 / 0)
+        assert "# TYPE broken gauge" in registry.render()